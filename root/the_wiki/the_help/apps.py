@@ -1,6 +1,20 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
 
 
 class TheHelpConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "the_help"
+
+    def ready(self):
+        from wiki.models import URLPath
+        from wiki.plugins.attachments.models import Attachment, AttachmentRevision
+
+        from the_wiki.db import configure_sqlite
+        from the_wiki.middleware import bump_page_version
+
+        connection_created.connect(configure_sqlite, dispatch_uid="the_wiki.db.configure_sqlite")
+        for model in (URLPath, Attachment, AttachmentRevision):
+            for signal in (post_save, post_delete):
+                signal.connect(bump_page_version, sender=model, dispatch_uid=f"bump_page_version_{model.__name__}")
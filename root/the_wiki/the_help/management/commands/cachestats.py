@@ -0,0 +1,22 @@
+from django.core.management import BaseCommand
+
+from the_wiki.caching import COUNTERS, get_cache_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Show the hit and miss counts of the wiki's caches, summed over every worker. Needs a cache shared with the "
+        "workers, such as memcached or redis, to see theirs, which each worker adds every 100 counts or 10 seconds"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Start counting again from zero afterwards")
+
+    def handle(self, *args, **options):
+        for name, stats in get_cache_stats().items():
+            self.stdout.write(
+                f"  {name:<8} {stats['hits']:>10} hits {stats['misses']:>10} misses {stats['hit_rate']:>7.1%}"
+            )
+        if options["reset"]:
+            for counter in COUNTERS.values():
+                counter.reset()
@@ -0,0 +1,72 @@
+import os
+import time
+
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
+
+from the_wiki.db import add_sqlite_database, copy_database
+
+SOURCE_ALIAS = "copy-source"
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy a SQLite wiki into the configured database, such as PostgreSQL set up with DATABASE_URL, replacing "
+        "everything in it. The target is migrated first and the copy is one transaction, rows streamed across in "
+        "batches. Media files are not touched"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "source",
+            nargs="?",
+            default=os.environ.get("WIKI_DB_PATH", "/config/db/db.sqlite3"),
+            help="Path of the SQLite database to copy. Defaults to WIKI_DB_PATH",
+        )
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS, help="Database to copy into")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Number of rows read and written at a time")
+        parser.add_argument(
+            "--no-input",
+            action="store_false",
+            dest="interactive",
+            help="Do not ask before replacing the target's data",
+        )
+
+    def handle(self, *args, **options):
+        source, target = options["source"], options["database"]
+        if not os.path.isfile(source):
+            raise CommandError(f"No SQLite database at '{source}'")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        add_sqlite_database(SOURCE_ALIAS, source)
+        if os.path.realpath(connections[target].settings_dict["NAME"]) == os.path.realpath(source):
+            raise CommandError("The source and the target are the same database")
+
+        executor = MigrationExecutor(connections[SOURCE_ALIAS])
+        if executor.migration_plan(executor.loader.graph.leaf_nodes()):
+            raise CommandError(f"'{source}' has unapplied migrations, run `migrate` against it first")
+
+        if options["interactive"]:
+            answer = input(
+                f"Everything in the '{target}' database will be replaced by '{source}'. Type 'yes' to go on: "
+            )
+            if answer != "yes":
+                raise CommandError("Copy cancelled")
+
+        call_command("migrate", database=target, interactive=False, verbosity=0)
+
+        totals = {"tables": 0, "rows": 0}
+        started = time.perf_counter()
+
+        def progress(model, copied):
+            totals["tables"] += 1
+            totals["rows"] += copied
+            if options["verbosity"] > 1:
+                self.stdout.write(f"  {model._meta.db_table:<48} {copied:>10}")
+
+        copy_database(SOURCE_ALIAS, target, options["batch_size"], progress)
+        self.stdout.write(
+            f"Copied {totals['rows']} rows in {totals['tables']} tables from '{source}' in "
+            f"{time.perf_counter() - started:.1f}s"
+        )
@@ -0,0 +1,31 @@
+import sys
+
+from django.contrib.sites.models import Site
+from django.core.management import BaseCommand
+
+from wiki_api.export import EXPORT_FORMATS, export_ndjson, export_tar
+
+
+class Command(BaseCommand):
+    help = "Stream an export of the whole wiki as NDJSON or a tar archive of markdown and attachments"
+
+    exporters = {"ndjson": export_ndjson, "tar": export_tar}
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="ndjson", help="Export format")
+        parser.add_argument("--revisions", action="store_true", help="Include the full revision history")
+        parser.add_argument("--output", "-o", default="-", help="File to write the export to. Defaults to stdout")
+
+    def handle(self, *args, **options):
+        chunks = self.exporters[options["format"]](Site.objects.get_current(), None, options["revisions"])
+
+        if options["output"] == "-":
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+            return
+
+        with open(options["output"], "wb") as output:
+            for chunk in chunks:
+                output.write(chunk)
+        self.stderr.write(f"Wiki exported to {options['output']}")
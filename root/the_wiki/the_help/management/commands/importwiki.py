@@ -0,0 +1,44 @@
+from django.contrib.auth.models import User
+from django.contrib.sites.models import Site
+from django.core.management import BaseCommand, CommandError
+from wiki.core.exceptions import NoRootURL
+from wiki.models import URLPath
+
+from wiki_api.importer import IMPORT_CHUNK_SIZE, import_wiki, open_source
+
+
+class Command(BaseCommand):
+    help = (
+        "Import a directory or tar archive of markdown files, such as one written by exportwiki. Only the current "
+        "content of each article is imported. The wiki should not be edited while an import runs"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", help="Directory or tar archive to import")
+        parser.add_argument("--parent", default="", help="Path of the article to import under. Defaults to the root")
+        parser.add_argument("--user", help="Username owning the imported articles")
+        parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE, help="Articles per transaction")
+
+    def handle(self, *args, **options):
+        user = None
+        if options["user"]:
+            user = User.objects.filter(username=options["user"]).first()
+            if not user:
+                raise CommandError(f"User '{options['user']}' does not exist")
+
+        try:
+            parent = URLPath.get_by_path(options["parent"])
+        except NoRootURL:
+            if options["parent"]:
+                raise CommandError("The wiki has no root article yet. Import without --parent to create one")
+            parent = None
+        except URLPath.DoesNotExist:
+            raise CommandError(f"No article found at '{options['parent']}'")
+
+        source = open_source(options["source"])
+        try:
+            result = import_wiki(source, Site.objects.get_current(), parent, user, options["chunk_size"])
+        finally:
+            source.close()
+
+        self.stdout.write(f"Imported {result['created']} articles, skipped {result['skipped']} existing")
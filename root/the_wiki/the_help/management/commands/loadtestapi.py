@@ -0,0 +1,63 @@
+import asyncio
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.core.management import BaseCommand, CommandError
+
+from wiki_api.loadtest import LoadTest
+
+
+def create_session(username: str) -> str:
+    user = get_user_model().objects.filter(username=username).first()
+    if user is None:
+        raise CommandError(f"No user named '{username}'")
+
+    session = import_module(settings.SESSION_ENGINE).SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = "django.contrib.auth.backends.ModelBackend"
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.create()
+    return session.session_key
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test a running wiki: quick API requests while slow clients hold attachment downloads open, to compare "
+        "the uWSGI and ASGI serving modes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("url", help="Base URL of the server, such as http://localhost:8000")
+        parser.add_argument("--path", default="/api/articles/", help="Path requested by the quick clients")
+        parser.add_argument("--download", help="Path of an attachment download for the slow clients")
+        parser.add_argument("--username", help="User to authenticate as with HTTP basic auth")
+        parser.add_argument("--password", help="Password of --username")
+        parser.add_argument("--session", help="Session key to authenticate with instead, see --create-session")
+        parser.add_argument(
+            "--create-session",
+            metavar="USERNAME",
+            help="Log USERNAME in through this wiki's database and use the session",
+        )
+        parser.add_argument("--fast", type=int, default=10, help="Number of concurrent quick clients")
+        parser.add_argument("--slow", type=int, default=20, help="Number of concurrent slow downloads")
+        parser.add_argument("--read-rate", type=int, default=16 * 1024, help="Bytes a second each slow client reads")
+        parser.add_argument("--duration", type=float, default=20, help="Seconds to run for")
+
+    def handle(self, *args, **options):
+        session = options["session"]
+        if options["create_session"]:
+            session = create_session(options["create_session"])
+
+        test = LoadTest(
+            options["url"],
+            options["path"],
+            options["download"],
+            options["username"],
+            options["password"],
+            options["read_rate"],
+            session,
+        )
+        results = asyncio.run(test.run(options["fast"], options["slow"], options["duration"]))
+        for name, value in results.items():
+            self.stdout.write(f"  {name:<12} {value:10.1f}")
@@ -0,0 +1,127 @@
+import threading
+import time
+from typing import Dict
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from django.core.cache import caches
+
+
+CACHE_BACKENDS = {
+    "locmem": "django.core.cache.backends.locmem.LocMemCache",
+    "file": "django.core.cache.backends.filebased.FileBasedCache",
+    "memcached": "django.core.cache.backends.memcached.PyMemcacheCache",
+    "redis": "django.core.cache.backends.redis.RedisCache",
+    "rediss": "django.core.cache.backends.redis.RedisCache",
+    "dummy": "django.core.cache.backends.dummy.DummyCache",
+}
+# Query parameters of a cache URL passed on as options of the locmem and file backends
+CULLING_OPTIONS = {"max_entries": "MAX_ENTRIES", "cull_frequency": "CULL_FREQUENCY"}
+# Hit and miss counts each worker keeps to itself before adding them to the totals in the shared cache, and the most
+# seconds it keeps them for
+COUNTER_FLUSH_EVERY = 100
+COUNTER_FLUSH_INTERVAL = 10
+
+
+def cache_from_url(url: str, timeout: int = 300, key_prefix: str = "") -> dict:
+    """
+    Build an entry of the CACHES setting from a URL such as `locmem://`, `file:///config/cache`,
+    `memcached://host:11211`, `redis://host:6379/0` or `dummy://`. Several memcached servers are separated by commas.
+    `max_entries` and `cull_frequency` may be given as query parameters of the locmem and file backends
+    """
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    if scheme not in CACHE_BACKENDS:
+        raise ValueError(f"Unsupported cache URL '{url}', expected one of {', '.join(CACHE_BACKENDS)}")
+
+    config = {"BACKEND": CACHE_BACKENDS[scheme], "TIMEOUT": timeout, "KEY_PREFIX": key_prefix}
+    if scheme == "locmem":
+        config["LOCATION"] = parts.netloc or "wiki"
+    elif scheme == "file":
+        config["LOCATION"] = unquote(parts.path)
+    elif scheme == "memcached":
+        config["LOCATION"] = parts.netloc.split(",")
+    elif scheme.startswith("redis"):
+        config["LOCATION"] = url.split("?", 1)[0]
+
+    options = {}
+    for name, value in parse_qsl(parts.query):
+        if name not in CULLING_OPTIONS or scheme not in ("locmem", "file"):
+            raise ValueError(f"Unsupported option '{name}' in cache URL '{url}'")
+        options[CULLING_OPTIONS[name]] = int(value)
+    if options:
+        config["OPTIONS"] = options
+    return config
+
+
+class CacheCounter:
+    """
+    Hit and miss counts of one cache. Each worker counts in process and adds its counts to totals kept in the default
+    cache every `flush_every` counts or `flush_interval` seconds, so the totals add up across workers when the cache
+    is shared between them without a cache round trip per request. `stats` shows the totals plus this worker's
+    counts not added yet
+    """
+
+    outcomes = ("hits", "misses")
+
+    def __init__(
+        self, name: str, flush_every: int = COUNTER_FLUSH_EVERY, flush_interval: float = COUNTER_FLUSH_INTERVAL
+    ):
+        self.name = name
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.pending = dict.fromkeys(self.outcomes, 0)
+        self.flushed_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _key(self, outcome: str) -> str:
+        return f"cache-stats-{self.name}-{outcome}"
+
+    def _increment(self, outcome: str):
+        with self.lock:
+            self.pending[outcome] += 1
+            if (
+                sum(self.pending.values()) < self.flush_every
+                and time.monotonic() - self.flushed_at < self.flush_interval
+            ):
+                return
+            counts, self.pending = self.pending, dict.fromkeys(self.outcomes, 0)
+            self.flushed_at = time.monotonic()
+        self._add(counts)
+
+    def _add(self, counts: Dict[str, int]):
+        cache = caches["default"]
+        for outcome, count in counts.items():
+            if not count:
+                continue
+            key = self._key(outcome)
+            try:
+                cache.incr(key, count)
+            except ValueError:
+                # First count, or evicted since
+                if not cache.add(key, count, timeout=None):
+                    cache.incr(key, count)
+
+    def hit(self):
+        self._increment("hits")
+
+    def miss(self):
+        self._increment("misses")
+
+    def stats(self) -> Dict[str, float]:
+        keys = [self._key(outcome) for outcome in self.outcomes]
+        counts = caches["default"].get_many(keys)
+        with self.lock:
+            hits, misses = (counts.get(key, 0) + self.pending[outcome] for key, outcome in zip(keys, self.outcomes))
+        return {"hits": hits, "misses": misses, "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0}
+
+    def reset(self):
+        with self.lock:
+            self.pending = dict.fromkeys(self.outcomes, 0)
+        caches["default"].delete_many([self._key(outcome) for outcome in self.outcomes])
+
+
+COUNTERS = {name: CacheCounter(name) for name in ("pages", "html", "diffs")}
+
+
+def get_cache_stats() -> Dict[str, Dict[str, float]]:
+    return {name: counter.stats() for name, counter in COUNTERS.items()}
@@ -0,0 +1,113 @@
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
+
+# Milliseconds the database check waits for SQLite's write lock before reporting the database as locked
+SQLITE_LOCK_TIMEOUT = 1000
+
+
+def check_database():
+    """The database answers, and on SQLite its write lock can be taken, so edits would not fail as locked"""
+    connection = connections[DEFAULT_DB_ALIAS]
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+        if connection.vendor == "sqlite" and not connection.in_atomic_block:
+            cursor.execute("PRAGMA busy_timeout")
+            busy_timeout = cursor.fetchone()[0]
+            cursor.execute(f"PRAGMA busy_timeout = {SQLITE_LOCK_TIMEOUT}")
+            try:
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.execute("ROLLBACK")
+            finally:
+                cursor.execute(f"PRAGMA busy_timeout = {busy_timeout}")
+
+
+def check_cache():
+    cache = caches["default"]
+    token = str(time.monotonic())
+    cache.set("health-check", token, 30)
+    if cache.get("health-check") != token:
+        raise RuntimeError("Value written to the cache was not read back")
+
+
+def check_media():
+    with tempfile.NamedTemporaryFile(dir=settings.MEDIA_ROOT, prefix=".health-") as file:
+        file.write(b"ok")
+        file.flush()
+
+
+class MigrationsCheck:
+    """No migration is left to apply. Loading the migrations is slow, so once they are all applied it is not redone"""
+
+    def __init__(self):
+        self.applied = False
+
+    def __call__(self):
+        if self.applied:
+            return
+        executor = MigrationExecutor(connections[DEFAULT_DB_ALIAS])
+        pending = executor.migration_plan(executor.loader.graph.leaf_nodes())
+        if pending:
+            raise RuntimeError(f"{len(pending)} unapplied migrations, the first being {pending[0][0]}")
+        self.applied = True
+
+
+CHECKS: Dict[str, Callable[[], None]] = {
+    "database": check_database,
+    "cache": check_cache,
+    "media": check_media,
+    "migrations": MigrationsCheck(),
+}
+
+
+def run_checks() -> dict:
+    started = time.perf_counter()
+    results = {}
+    for name, check in CHECKS.items():
+        check_started = time.perf_counter()
+        try:
+            check()
+            results[name] = {"ok": True}
+        except Exception as e:
+            results[name] = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        results[name]["ms"] = round((time.perf_counter() - check_started) * 1000, 2)
+    return {
+        "ok": all(result["ok"] for result in results.values()),
+        "checks": results,
+        "ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+class Readiness:
+    """
+    The result of the readiness checks, run again at most every WIKI_HEALTH_READY_INTERVAL seconds by this worker.
+    While one thread runs them, the others answer with the last result
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.report: Optional[dict] = None
+        self.checked = 0.0
+
+    def get(self) -> dict:
+        interval = getattr(settings, "WIKI_HEALTH_READY_INTERVAL", 10)
+        if self.report is None or time.monotonic() - self.checked >= interval:
+            if self.lock.acquire(blocking=self.report is None):
+                try:
+                    self.report = run_checks()
+                    self.checked = time.monotonic()
+                finally:
+                    self.lock.release()
+        return {**self.report, "age": round(time.monotonic() - self.checked, 2)}
+
+    def reset(self):
+        self.report = None
+
+
+readiness = Readiness()
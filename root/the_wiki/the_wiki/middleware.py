@@ -1,14 +1,36 @@
-from django.http import HttpResponse
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import caches
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import redirect
+from django.urls import Resolver404, resolve
+from django.utils.translation import get_language
+from wiki.models import Article, URLPath
+
+from the_wiki.caching import COUNTERS
+from the_wiki.health import readiness
+from the_wiki.routers import reading_from_replicas
 
 
 class HealthCheckMiddleware:
+    """
+    Answer health checks ahead of everything else. `/health/live` (or `/health`) only shows the worker is serving.
+    `/health/ready` also checks the database, cache, media volume and migrations, see `the_wiki.health`
+    """
+
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
-        if request.path == "/health":
-            return HttpResponse("ok")
+        if request.path.startswith("/health"):
+            if request.path in ("/health", "/health/live"):
+                return HttpResponse("ok")
+            if request.path == "/health/ready":
+                report = readiness.get()
+                return JsonResponse(report, status=200 if report["ok"] else 503)
         return self.get_response(request)
 
 
@@ -26,3 +48,162 @@ class AuthEverywhereMiddleware:
             return redirect("/_accounts/login/")
 
         return self.get_response(request)
+
+
+# Bumped whenever something a page shows besides its own article changes, see `bump_page_version`
+PAGE_VERSION_KEY = "wiki-page-version"
+
+
+def bump_page_version(**kwargs):
+    """
+    Receiver for saves and deletes of URL paths, attachments and attachment revisions, which change the child pages and
+    attachments listed on pages without touching their articles. Every cached page is dropped, as the URL tree is
+    """
+    if not getattr(settings, "WIKI_PAGE_CACHE_TIMEOUT", 0):
+        return
+    cache = caches[getattr(settings, "WIKI_PAGE_CACHE", "default")]
+    try:
+        cache.incr(PAGE_VERSION_KEY)
+    except ValueError:
+        cache.set(PAGE_VERSION_KEY, time.time_ns(), None)
+
+
+class WikiPageCacheMiddleware:
+    """
+    Cache rendered wiki pages for readers who cannot change them. Anonymous readers share pages, as they all have the
+    same permissions. Signed in readers without write, delete or moderate permissions only get their own, keyed by
+    session, as pages show their name and carry their CSRF token.
+
+    Like Django's FetchFromCacheMiddleware and UpdateCacheMiddleware, a page is looked up before the rest of the
+    middleware and the view run and stored once they have. It is stored with the article's current revision and
+    modification time, which change with edits and permission changes, and with the page version bumped when child
+    pages and attachments change, and served only while they all still match. The version is read from the cache along
+    with the page, so a hit costs a single primary key lookup. The article and the reader's permissions are only
+    loaded to store a page.
+
+    Disabled while WIKI_PAGE_CACHE_TIMEOUT is 0. Must come after the authentication and messages middleware
+    """
+
+    view_name = "wiki:get"
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timeout = getattr(settings, "WIKI_PAGE_CACHE_TIMEOUT", 0)
+        cache_key = timeout and self.get_cache_key(request)
+        if not cache_key:
+            return self.get_response(request)
+
+        cache = caches[getattr(settings, "WIKI_PAGE_CACHE", "default")]
+        entries = cache.get_many([cache_key, PAGE_VERSION_KEY])
+        version = entries.get(PAGE_VERSION_KEY)
+        cached = entries.get(cache_key)
+        if cached is not None and version is not None:
+            article_id, revision_id, modified, page_version, response = cached
+            if (
+                page_version == version
+                and Article.objects.filter(pk=article_id, current_revision_id=revision_id, modified=modified).exists()
+            ):
+                COUNTERS["pages"].hit()
+                return response
+        COUNTERS["pages"].miss()
+
+        if version is None:
+            # Starting from the clock keeps pages stored before the version was evicted from matching again
+            cache.add(PAGE_VERSION_KEY, time.time_ns(), None)
+            version = cache.get(PAGE_VERSION_KEY)
+
+        response = self.get_response(request)
+        article = self.get_cacheable_article(request, response)
+        if article is not None:
+            if not getattr(response, "is_rendered", True):
+                response.render()
+            # The version read before rendering, so a change made meanwhile is not hidden behind it
+            cache.set(
+                cache_key, (article.id, article.current_revision_id, article.modified, version, response), timeout
+            )
+        return response
+
+    def get_cache_key(self, request):
+        """The key of the page for this request and reader, or None when it is not cached"""
+        if request.method != "GET":
+            return None
+        try:
+            if resolve(request.path_info, getattr(request, "urlconf", None)).view_name != self.view_name:
+                return None
+        except Resolver404:
+            return None
+        # Pages with messages to show are one-off
+        if len(messages.get_messages(request)):
+            return None
+
+        if request.user.is_authenticated:
+            if not request.session.session_key:
+                return None
+            reader = f"session-{request.session.session_key}"
+        else:
+            reader = "anonymous"
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        return f"wiki-page-{get_language()}-{reader}-{path}"
+
+    def get_cacheable_article(self, request, response):
+        """The article a response shows, when the response can be stored and served again to the same readers"""
+        if (
+            response.status_code != 200
+            or response.streaming
+            or response.cookies
+            # A token for one anonymous reader's CSRF cookie is no use to the next
+            or (not request.user.is_authenticated and request.META.get("CSRF_COOKIE_NEEDS_UPDATE"))
+        ):
+            return None
+
+        view_kwargs = request.resolver_match.kwargs
+        try:
+            if "article_id" in view_kwargs:
+                article = Article.objects.select_related("current_revision").get(pk=view_kwargs["article_id"])
+            else:
+                article = URLPath.get_by_path(view_kwargs.get("path", ""), select_related=True).article
+        except (Article.DoesNotExist, URLPath.DoesNotExist):
+            return None
+
+        user = request.user
+        if not article.can_read(user):
+            return None
+        # Anonymous readers share the permissions of the article, signed in ones may have their own
+        if user.is_authenticated and (
+            article.can_write(user) or article.can_delete(user) or article.can_moderate(user)
+        ):
+            return None
+        return article
+
+
+class ReplicaMiddleware:
+    """
+    Let safe requests to the API and to wiki pages read from a replica through `ReplicaRouter`. A session that wrote
+    anything reads from the primary for the next WIKI_DB_REPLICA_PIN seconds, so it sees its own edits before they
+    reach the replicas. Must come after the session middleware
+    """
+
+    session_key = "wiki_db_primary_until"
+    namespaces = {"wiki", "wiki_api"}
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with reading_from_replicas(allowed=False) as state:
+            request.replica_reads = state
+            response = self.get_response(request)
+        # Writes outside of views, like the session's own, are not tracked here
+        if state.wrote:
+            request.session[self.session_key] = time.time() + getattr(settings, "WIKI_DB_REPLICA_PIN", 10)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.replica_reads.allowed = (
+            request.method in ("GET", "HEAD", "OPTIONS")
+            and request.resolver_match.namespace.split(":")[0] in self.namespaces
+            and request.session.get(self.session_key, 0) <= time.time()
+        )
+        return None
@@ -0,0 +1,81 @@
+import contextlib
+import random
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+
+class ReplicaReads:
+    """
+    Where the current request reads from: a replica once `allowed` and as long as it has written nothing, otherwise
+    the primary
+    """
+
+    def __init__(self, allowed: bool = True):
+        self.allowed = allowed
+        self.replica: Optional[str] = None
+        self.wrote = False
+
+
+# Set by ReplicaMiddleware for the requests whose reads may go to a replica, unset everywhere else
+replica_reads: ContextVar[Optional[ReplicaReads]] = ContextVar("replica_reads", default=None)
+
+# Replica alias -> time.monotonic() until which it is skipped after failing to connect, per worker
+unavailable: Dict[str, float] = {}
+
+
+@contextlib.contextmanager
+def reading_from_replicas(allowed: bool = True):
+    """Track the reads and writes within the block, letting reads go to a replica while `state.allowed` is set"""
+    state = ReplicaReads(allowed)
+    token = replica_reads.set(state)
+    try:
+        yield state
+    finally:
+        replica_reads.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Send reads to one of WIKI_DB_REPLICAS within `reading_from_replicas()` and everything else to the primary. A
+    request sticks to the replica it first picked. Once it writes, which includes `select_for_update()`, it reads from
+    the primary so it sees what it wrote. Sessions are always read from the primary, which is where a login was
+    just written to. A replica that cannot be connected to is skipped for WIKI_DB_REPLICA_RETRY seconds
+    """
+
+    def pick_replica(self) -> Optional[str]:
+        now = time.monotonic()
+        replicas = [alias for alias in settings.WIKI_DB_REPLICAS if unavailable.get(alias, 0) <= now]
+        random.shuffle(replicas)
+        for alias in replicas:
+            try:
+                connections[alias].ensure_connection()
+            except DatabaseError:
+                unavailable[alias] = now + getattr(settings, "WIKI_DB_REPLICA_RETRY", 30)
+                continue
+            return alias
+        return None
+
+    def db_for_read(self, model, **hints):
+        state = replica_reads.get()
+        if state is None or not state.allowed or state.wrote or model._meta.app_label == "sessions":
+            return DEFAULT_DB_ALIAS
+        if state.replica is None:
+            state.replica = self.pick_replica() or DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = replica_reads.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -1,4 +1,9 @@
 from .settings import *
+from .caching import cache_from_url
 
 
 DATABASES = {"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}}
+CACHES = {
+    "default": cache_from_url("locmem://unittest"),
+    "template_fragments": cache_from_url("locmem://unittest", key_prefix="fragments"),
+}
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class WikiApiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "wiki_api"
+
+    def ready(self):
+        from wiki_api import signals  # noqa F401
+        from wiki_api.deltas import rebuild_on_read
+
+        rebuild_on_read()
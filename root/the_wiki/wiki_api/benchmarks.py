@@ -0,0 +1,220 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import timeit
+from typing import Callable, Dict, List, Tuple, Union
+from unittest import mock
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import Length
+from django.test import RequestFactory
+from rest_framework import serializers
+from rest_framework.request import Request
+from wiki.models import Article, ArticleRevision
+
+from the_wiki.db import apply_sqlite_pragmas
+from wiki_api.apps import WikiApiConfig
+from wiki_api.deltas import compact_article, load_contents
+from wiki_api.models import RevisionDelta
+from wiki_api.serializers import ArticleRevisionSerializer, DynamicFieldsModelSerializer, FieldCache
+
+
+# Benchmark name -> function running it `number` times over `size` objects and returning {case: seconds}, or that
+# and {case: bytes stored} for benchmarks that trade time for space
+BenchmarkResult = Union[Dict[str, float], Tuple[Dict[str, float], Dict[str, int]]]
+BENCHMARKS: Dict[str, Callable[[int, int], BenchmarkResult]] = {}
+
+
+def benchmark(name: str):
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+
+    return register
+
+
+def make_revisions(size: int):
+    """Unsaved revisions with their article attached, so neither case touches the database"""
+    revisions = []
+    for pk in range(1, size + 1):
+        revision = ArticleRevision(id=pk, revision_number=pk, title=f"Revision {pk}")
+        revision.article = Article(id=(pk % 50) + 1)
+        revisions.append(revision)
+    return revisions
+
+
+@benchmark("hyperlinks")
+def benchmark_hyperlinks(size: int, number: int) -> Dict[str, float]:
+    """Building the `url` of a list of revisions with a `reverse()` per object against the precompiled route"""
+    view_name = f"{WikiApiConfig.name}:articlerevisions-detail"
+    field = ArticleRevisionSerializer().fields["url"]
+    revisions = make_revisions(size)
+
+    def reverse_urls():
+        request = Request(RequestFactory().get("/"))
+        for revision in revisions:
+            field.reverse_url(revision, view_name, request, None)
+
+    def template_urls():
+        request = Request(RequestFactory().get("/"))
+        for revision in revisions:
+            field.get_url(revision, view_name, request, None)
+
+    return {
+        "reverse": timeit.timeit(reverse_urls, number=number),
+        "template": timeit.timeit(template_urls, number=number),
+    }
+
+
+class NoCache(FieldCache):
+    """A field cache that never keeps anything, so every serializer introspects its model again"""
+
+    def set(self, key, fields):
+        pass
+
+
+@benchmark("serializers")
+def benchmark_serializers(size: int, number: int) -> Dict[str, float]:
+    """
+    Serializing a page of revisions the way a list endpoint does, with the serializer built from scratch each time and
+    every field going through `to_representation`, against the cached field sets and the direct attribute path
+    """
+    revisions = make_revisions(size)
+
+    def serialize():
+        request = Request(RequestFactory().get("/"))
+        ArticleRevisionSerializer(revisions, many=True, context={"request": request}).data
+
+    with mock.patch.object(DynamicFieldsModelSerializer, "field_cache", NoCache()), mock.patch.object(
+        DynamicFieldsModelSerializer, "to_representation", serializers.Serializer.to_representation
+    ):
+        uncached = timeit.timeit(serialize, number=number)
+
+    return {"uncached": uncached, "cached": timeit.timeit(serialize, number=number)}
+
+
+def make_history(size: int) -> List[str]:
+    """The content of `size` revisions of a 200 line page, each changing a line and adding another"""
+    lines = [f"Line {number} of a long runbook page\n" for number in range(200)]
+    history = []
+    for number in range(size):
+        lines[(number * 7) % len(lines)] = f"Line edited by revision {number}\n"
+        lines.insert((number * 13) % len(lines), f"Line added by revision {number}\n")
+        history.append("".join(lines))
+    return history
+
+
+def stored_size(article: Article) -> int:
+    """Bytes of content and deltas the database holds for the revisions of `article`"""
+    content = ArticleRevision.objects.filter(article=article).aggregate(size=Sum(Length("content")))["size"]
+    deltas = RevisionDelta.objects.filter(revision__article=article).aggregate(size=Sum(Length("delta")))["size"]
+    return (content or 0) + (deltas or 0)
+
+
+@benchmark("deltas")
+def benchmark_deltas(size: int, number: int) -> Tuple[Dict[str, float], Dict[str, int]]:
+    """
+    Reading every revision of a page back from the database the way the revisions endpoint does, stored whole against
+    compacted by `compact_article` into deltas on a snapshot every `SNAPSHOT_INTERVAL` revisions, along with the bytes
+    stored each way. The page is written in a transaction that is rolled back
+    """
+    timings, sizes = {}, {}
+    with transaction.atomic():
+        article = Article.objects.create()
+        ArticleRevision.objects.bulk_create(
+            ArticleRevision(article=article, revision_number=position + 1, title="Runbook", content=content)
+            for position, content in enumerate(make_history(size))
+        )
+        article.current_revision = ArticleRevision.objects.filter(article=article).latest("revision_number")
+        article.save()
+
+        def read():
+            load_contents(list(ArticleRevision.objects.filter(article=article).defer("content")))
+
+        for case in ("whole", "deltas"):
+            if case == "deltas":
+                compact_article(article)
+            timings[case] = timeit.timeit(read, number=number)
+            sizes[case] = stored_size(article)
+        transaction.set_rollback(True)
+    return timings, sizes
+
+
+# Reader threads in the sqlite benchmark, and the default SQLite journal it is compared against
+SQLITE_READERS = 4
+SQLITE_DEFAULT_PRAGMAS = {"journal_mode": "DELETE", "synchronous": "FULL"}
+
+
+def time_reads_during_writes(path: str, pragmas: Dict[str, str], size: int, number: int) -> float:
+    """
+    Seconds `SQLITE_READERS` threads, each on its own connection like separate workers, take to read a page of `size`
+    rows `number` times while another connection commits a revision-sized row every millisecond. Reads that fail with
+    "database is locked" are tried again, as a worker's request would be
+    """
+
+    def connect():
+        connection = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        apply_sqlite_pragmas(connection, pragmas)
+        return connection
+
+    setup = connect()
+    setup.execute("CREATE TABLE revision (id INTEGER PRIMARY KEY, content TEXT)")
+    setup.executemany("INSERT INTO revision (content) VALUES (?)", [("x" * 2000,) for _ in range(size)])
+    setup.close()
+
+    done = threading.Event()
+
+    def write():
+        connection = connect()
+        while not done.is_set():
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute("INSERT INTO revision (content) VALUES (?)", ("y" * 2000,))
+            connection.execute("COMMIT")
+            time.sleep(0.001)
+        connection.close()
+
+    def read():
+        connection = connect()
+        for _ in range(number):
+            while True:
+                try:
+                    connection.execute(
+                        "SELECT id, length(content) FROM revision ORDER BY id LIMIT ?", (size,)
+                    ).fetchall()
+                    break
+                except sqlite3.OperationalError:
+                    pass
+        connection.close()
+
+    writer = threading.Thread(target=write)
+    readers = [threading.Thread(target=read) for _ in range(SQLITE_READERS)]
+    writer.start()
+    started = time.perf_counter()
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    writer.join()
+    return elapsed
+
+
+@benchmark("sqlite")
+def benchmark_sqlite(size: int, number: int) -> Dict[str, float]:
+    """
+    Read throughput of a file database while it is written to, with SQLite's default rollback journal against the
+    WIKI_DB_PRAGMAS the wiki tunes its connections with
+    """
+    results = {}
+    pragmas = getattr(settings, "WIKI_DB_PRAGMAS", None) or {"journal_mode": "WAL", "synchronous": "NORMAL"}
+    with tempfile.TemporaryDirectory() as directory:
+        for case, case_pragmas in (("rollback", SQLITE_DEFAULT_PRAGMAS), ("tuned", pragmas)):
+            results[case] = time_reads_during_writes(
+                os.path.join(directory, f"{case}.sqlite3"), case_pragmas, size, number
+            )
+    return results
@@ -0,0 +1,197 @@
+from typing import Dict, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.contrib.sites.shortcuts import get_current_site
+from django.db import IntegrityError, transaction
+from rest_framework import status
+from wiki.models import URLPath
+
+from wiki_api.serializers import ArticleSerializer, BulkNewArticleSerializer
+from wiki_api.types import BulkCreateArticleBody, BulkCreateArticleResult, CreateArticleBodyPermission
+
+
+BULK_CHUNK_SIZE = getattr(settings, "WIKI_API_BULK_CHUNK_SIZE", 100)
+# Most articles accepted by a single bulk request
+BULK_MAX_ITEMS = getattr(settings, "WIKI_API_BULK_MAX_ITEMS", 1000)
+
+DEFAULT_PERMISSIONS: CreateArticleBodyPermission = {
+    "group": None,
+    "group_read": True,
+    "group_write": True,
+    "other_read": True,
+    "other_write": True,
+}
+
+
+def _error(index: int, ref: Optional[str], status_code: int, errors) -> BulkCreateArticleResult:
+    return {"index": index, "ref": ref, "status": status_code, "errors": errors}
+
+
+def validate_bulk_articles(
+    items: List[dict], request
+) -> Tuple[Dict[int, BulkCreateArticleBody], Dict[int, BulkCreateArticleResult]]:
+    """
+    Validate a batch of new articles. Each item is checked on its own first, then a fixed number of set based queries
+    check parents, slugs, groups and the root article for the whole batch.
+
+    Returns the validated items and the failures, both keyed on the item's index
+    """
+    site = get_current_site(request)
+    valid: Dict[int, BulkCreateArticleBody] = {}
+    failed: Dict[int, BulkCreateArticleResult] = {}
+    refs: Dict[str, int] = {}
+
+    for index, item in enumerate(items):
+        ref = item.get("ref") if isinstance(item, dict) else None
+        serializer = BulkNewArticleSerializer(data=item, context={"request": request})
+        if not serializer.is_valid():
+            failed[index] = _error(index, ref, status.HTTP_400_BAD_REQUEST, serializer.errors)
+        elif ref in refs:
+            failed[index] = _error(index, ref, status.HTTP_400_BAD_REQUEST, ["Duplicate ref in this batch."])
+        elif serializer.validated_data.get("parent_ref") and serializer.validated_data["parent_ref"] not in refs:
+            failed[index] = _error(
+                index, ref, status.HTTP_400_BAD_REQUEST, ["parent_ref must name an earlier item in this batch."]
+            )
+        else:
+            valid[index] = serializer.validated_data
+
+        # Register the ref even on failure so children can report the failed dependency
+        if isinstance(ref, str) and ref not in refs:
+            refs[ref] = index
+
+    parent_ids: Set[int] = {data["parent"] for data in valid.values() if data["parent"] is not None}
+    slugs: Set[str] = {data["slug"] for data in valid.values()}
+    group_names: Set[str] = {
+        data["permissions"]["group"] for data in valid.values() if data.get("permissions", {}).get("group")
+    }
+
+    parents = URLPath.objects.filter(site=site).in_bulk(parent_ids) if parent_ids else {}
+    taken_slugs = (
+        set(
+            URLPath.objects.filter(site=site, parent_id__in=parent_ids, slug__in=slugs).values_list(
+                "parent_id", "slug"
+            )
+        )
+        if parent_ids
+        else set()
+    )
+    groups = Group.objects.in_bulk(group_names, field_name="name") if group_names else {}
+    has_root = any(data["parent"] is None and not data.get("parent_ref") for data in valid.values()) and (
+        URLPath.objects.filter(parent__isnull=True, site=site).exists()
+    )
+
+    batch_slugs: Set[Tuple[str, object, str]] = set()
+    for index, data in list(valid.items()):
+        ref = data.get("ref")
+        parent_ref = data.get("parent_ref")
+        group = data.get("permissions", {}).get("group")
+
+        if parent_ref:
+            slug_key = ("ref", parent_ref, data["slug"])
+        else:
+            slug_key = ("id", data["parent"], data["slug"])
+
+        if parent_ref and refs[parent_ref] in failed:
+            error = _error(index, ref, status.HTTP_424_FAILED_DEPENDENCY, [f"Parent item {refs[parent_ref]} failed."])
+        elif data["parent"] is not None and data["parent"] not in parents:
+            error = _error(index, ref, status.HTTP_404_NOT_FOUND, ["Parent URL not found."])
+        elif data["parent"] is None and not parent_ref and has_root:
+            error = _error(
+                index, ref, status.HTTP_400_BAD_REQUEST, ["A root article already exists. You must specify a parent."]
+            )
+        elif (data["parent"], data["slug"]) in taken_slugs or slug_key in batch_slugs:
+            error = _error(
+                index,
+                ref,
+                status.HTTP_400_BAD_REQUEST,
+                ["Article with this slug already exists under this parent URL."],
+            )
+        elif group and group not in groups:
+            error = _error(index, ref, status.HTTP_400_BAD_REQUEST, [f"Group '{group}' does not exist."])
+        else:
+            batch_slugs.add(slug_key)
+            if data["parent"] is None and not parent_ref:
+                # Only one root article per site
+                has_root = True
+            data["parent_object"] = parents.get(data["parent"])
+            data["group_object"] = groups.get(group)
+            continue
+
+        failed[index] = error
+        del valid[index]
+
+    return valid, failed
+
+
+def create_bulk_articles(
+    items: List[dict], request, chunk_size: int = BULK_CHUNK_SIZE
+) -> List[BulkCreateArticleResult]:
+    """
+    Create a batch of articles, committing every `chunk_size` items in a single transaction. A failing item is rolled
+    back on its own and reported in the results, which are returned in the same order as `items`
+    """
+    valid, results = validate_bulk_articles(items, request)
+    created: Dict[str, URLPath] = {}
+    pending = sorted(valid.items())
+
+    for start in range(0, len(pending), chunk_size):
+        with transaction.atomic():
+            for index, data in pending[start : start + chunk_size]:
+                ref = data.get("ref")
+                parent_ref = data.get("parent_ref")
+                if parent_ref and parent_ref not in created:
+                    results[index] = _error(
+                        index, ref, status.HTTP_424_FAILED_DEPENDENCY, ["Parent item failed to be created."]
+                    )
+                    continue
+
+                permissions = data.get("permissions", DEFAULT_PERMISSIONS)
+                try:
+                    # create_urlpath is atomic itself, so a failure only rolls back this item's savepoint
+                    url_path = URLPath.create_urlpath(
+                        parent=created[parent_ref] if parent_ref else data["parent_object"],
+                        slug=data["slug"],
+                        title=data["title"],
+                        article_kwargs={
+                            "owner": request.user,
+                            "group": data["group_object"],
+                            "group_read": permissions["group_read"],
+                            "group_write": permissions["group_write"],
+                            "other_read": permissions["other_read"],
+                            "other_write": permissions["other_write"],
+                        },
+                        request=request,
+                        article_w_permissions=None,
+                        content=data["content"],
+                        user_message=data.get("summary", ""),
+                        user=request.user,
+                        ip_address=None,
+                    )
+                except IntegrityError:
+                    results[index] = _error(
+                        index,
+                        ref,
+                        status.HTTP_409_CONFLICT,
+                        ["Failed to create article. Conflicting slug under the same parent"],
+                    )
+                    continue
+                except Exception as e:
+                    results[index] = _error(
+                        index, ref, status.HTTP_400_BAD_REQUEST, [f"Failed to create article: {e}"]
+                    )
+                    continue
+
+                if ref:
+                    created[ref] = url_path
+                results[index] = {
+                    "index": index,
+                    "ref": ref,
+                    "status": status.HTTP_201_CREATED,
+                    "urlpath": url_path.id,
+                    "article": ArticleSerializer(
+                        url_path.article, fields=["id", "url"], context={"request": request}
+                    ).data,
+                }
+
+    return [results[index] for index in range(len(items))]
@@ -0,0 +1,173 @@
+import json
+import zlib
+from typing import Dict, Iterable, List, Optional, Union
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.query_utils import DeferredAttribute
+from wiki.models import Article, ArticleRevision
+
+from wiki_api.diff import get_opcodes
+from wiki_api.models import RevisionDelta
+
+
+# Every this many revisions of an article one is kept whole, the ones in between are stored as deltas against it
+SNAPSHOT_INTERVAL = getattr(settings, "WIKI_API_REVISION_SNAPSHOT_INTERVAL", 20)
+# Edits to find line by line before a changed block is stored whole, larger than for diffs since it runs offline
+DELTA_MAX_EDITS = 10000
+
+# Lines [start, end) copied from the base revision, or text inserted as it is
+DeltaOp = Union[List[int], str]
+
+
+def deltas_enabled() -> bool:
+    """Whether compacted revisions are rebuilt when loaded. Must stay on while any revision is compacted"""
+    return getattr(settings, "WIKI_API_REVISION_DELTAS", False)
+
+
+def encode_delta(base: str, content: str) -> bytes:
+    """A compressed list of ops rebuilding `content` from `base`, copying every line the two have in common"""
+    base_lines, lines = base.splitlines(keepends=True), content.splitlines(keepends=True)
+    ops: List[DeltaOp] = []
+    for tag, i1, i2, j1, j2 in get_opcodes(base_lines, lines, max_edits=DELTA_MAX_EDITS):
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append("".join(lines[j1:j2]))
+    return zlib.compress(json.dumps(ops, separators=(",", ":")).encode(), 9)
+
+
+def apply_delta(base: str, delta: bytes) -> str:
+    base_lines = base.splitlines(keepends=True)
+    return "".join(
+        "".join(base_lines[op[0] : op[1]]) if isinstance(op, list) else op
+        for op in json.loads(zlib.decompress(bytes(delta)))
+    )
+
+
+def get_content(revision_id: int) -> Optional[str]:
+    """The content of a compacted revision, or None when it is stored whole"""
+    row = RevisionDelta.objects.filter(revision_id=revision_id).values_list("delta", "base__content").first()
+    return apply_delta(row[1], row[0]) if row else None
+
+
+class CompactedContent(DeferredAttribute):
+    """
+    `ArticleRevision.content`, rebuilt from its delta the first time it is read empty. Revisions that are loaded but
+    never read, or are stored whole, cost no extra query; `load_contents` fills in a whole page of them at once
+    """
+
+    checked = "_content_checked"
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        content = super().__get__(instance, cls)
+        if content == "" and instance.pk and self.checked not in instance.__dict__ and deltas_enabled():
+            instance.__dict__[self.checked] = True
+            rebuilt = get_content(instance.pk)
+            if rebuilt is not None:
+                instance.__dict__[self.field.attname] = content = rebuilt
+        return content
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
+def rebuild_on_read():
+    """Read compacted revisions back whole through the ORM, wherever they are loaded"""
+    ArticleRevision.content = CompactedContent(ArticleRevision._meta.get_field("content"))
+
+
+def load_contents(revisions: Iterable[ArticleRevision]):
+    """
+    Fill in the content of revisions loaded with `content` deferred, with one query for the stored content and one
+    for the deltas and snapshots of the compacted ones, instead of a reconstruction per revision
+    """
+    pending = {revision.pk: revision for revision in revisions if "content" not in revision.__dict__}
+    if not pending:
+        return
+
+    contents = dict(ArticleRevision.objects.filter(pk__in=pending).order_by().values_list("pk", "content"))
+    empty = [pk for pk, content in contents.items() if not content]
+    if empty:
+        deltas = RevisionDelta.objects.filter(revision_id__in=empty).values_list(
+            "revision_id", "delta", "base__content"
+        )
+        for pk, delta, base in deltas:
+            contents[pk] = apply_delta(base, delta)
+
+    for pk, revision in pending.items():
+        revision.content = contents.get(pk, "")
+        revision.__dict__[CompactedContent.checked] = True
+
+
+def expand_revision(revision_id: int) -> bool:
+    """Store a compacted revision whole again. Returns whether it was compacted"""
+    content = get_content(revision_id)
+    if content is None:
+        return False
+    with transaction.atomic():
+        ArticleRevision.objects.filter(pk=revision_id).update(content=content)
+        RevisionDelta.objects.filter(revision_id=revision_id).delete()
+    return True
+
+
+def compact_article(article: Article, interval: int = SNAPSHOT_INTERVAL, expand: bool = False) -> Dict[str, int]:
+    """
+    Store all but every `interval`th revision of an article, in revision order, as a delta against the last whole
+    revision before it. The current revision is always kept whole so rendering the article never needs a delta, and
+    every revision is at most one delta away from its content. With `expand` every revision is stored whole again.
+
+    Running it again only touches revisions whose place changed, such as the revision that was current last time.
+    Returns the number of revisions compacted and expanded and the bytes stored before and after
+    """
+    stats = {"compacted": 0, "expanded": 0, "before": 0, "after": 0}
+    with transaction.atomic():
+        existing = {
+            pk: (base_id, bytes(delta))
+            for pk, base_id, delta in RevisionDelta.objects.filter(revision__article=article).values_list(
+                "revision_id", "base_id", "delta"
+            )
+        }
+        bases = {base_id for base_id, _ in existing.values()}
+        revisions = (
+            ArticleRevision.objects.filter(article=article)
+            .order_by("revision_number", "pk")
+            .values_list("pk", "content")
+        )
+
+        # Whole content of the revisions deltas are, or will be, taken against
+        snapshots: Dict[int, str] = {}
+        snapshot_id = None
+        for position, (pk, stored) in enumerate(revisions.iterator()):
+            delta = existing[pk][1] if pk in existing else None
+            content = apply_delta(snapshots[existing[pk][0]], delta) if pk in existing else stored
+            stats["before"] += len(stored.encode()) + (len(delta) if delta else 0)
+
+            if pk in bases:
+                snapshots[pk] = content
+            if position % interval == 0 and not expand:
+                snapshot_id = pk
+                snapshots[pk] = content
+
+            if expand or position % interval == 0 or pk == article.current_revision_id:
+                if pk in existing:
+                    ArticleRevision.objects.filter(pk=pk).update(content=content)
+                    RevisionDelta.objects.filter(revision_id=pk).delete()
+                    stats["expanded"] += 1
+                stats["after"] += len(content.encode())
+            elif pk in existing and existing[pk][0] == snapshot_id:
+                stats["after"] += len(delta)
+            else:
+                delta = encode_delta(snapshots[snapshot_id], content)
+                if apply_delta(snapshots[snapshot_id], delta) != content:
+                    raise ValueError(f"The delta of revision {pk} does not rebuild its content")
+                RevisionDelta.objects.update_or_create(
+                    revision_id=pk, defaults={"base_id": snapshot_id, "delta": delta}
+                )
+                if stored:
+                    ArticleRevision.objects.filter(pk=pk).update(content="")
+                stats["compacted"] += 1
+                stats["after"] += len(delta)
+    return stats
@@ -0,0 +1,221 @@
+from typing import List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+from the_wiki.caching import COUNTERS
+from wiki_api.types import DiffHunk
+
+
+DIFF_CONTEXT = 3
+MAX_DIFF_CONTEXT = 100
+# Past this many inserted and deleted lines the differing middle of the two texts is reported as one replacement
+DIFF_MAX_EDITS = getattr(settings, "WIKI_API_DIFF_MAX_EDITS", 1000)
+DIFF_OUTPUTS = ("hunks", "unified")
+
+# (tag, old start, old end, new start, new end) with the tags of `difflib.SequenceMatcher.get_opcodes`
+Opcode = Tuple[str, int, int, int, int]
+
+
+def get_diff_cache():
+    return caches[getattr(settings, "WIKI_API_DIFF_CACHE", "default")]
+
+
+def _edit_script(a: Sequence[int], b: Sequence[int], max_edits: int) -> Optional[List[Tuple[str, int, int]]]:
+    """
+    Myers' O((N+M)D) greedy diff. Returns every line as ("equal", i, j), ("delete", i, j) or ("insert", i, j) in
+    order, or None when more than `max_edits` lines differ.
+
+    Only the diagonals reached at each step are kept for the walk back, so the memory is O(D²) in the number of
+    differing lines rather than in the length of the texts
+    """
+    n, m = len(a), len(b)
+    max_d = min(n + m, max_edits)
+    offset = max_d + 1
+    v = [0] * (2 * max_d + 3)
+    # Snapshot of v for diagonals -(d + 1)..(d + 1) taken before each step d
+    trace: List[List[int]] = []
+
+    for d in range(max_d + 1):
+        trace.append(v[offset - d - 1 : offset + d + 2])
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                return _walk_back(trace, n, m)
+    return None
+
+
+def _walk_back(trace: List[List[int]], n: int, m: int) -> List[Tuple[str, int, int]]:
+    script = []
+    x, y = n, m
+    for d in range(len(trace) - 1, -1, -1):
+        snapshot = trace[d]
+        k = x - y
+        if d == 0:
+            prev_x = prev_y = 0
+        else:
+            # snapshot[0] is diagonal -(d + 1)
+            def at(diagonal):
+                return snapshot[diagonal + d + 1]
+
+            prev_k = k + 1 if k == -d or (k != d and at(k - 1) < at(k + 1)) else k - 1
+            prev_x = at(prev_k)
+            prev_y = prev_x - prev_k
+
+        while x > prev_x and y > prev_y:
+            x -= 1
+            y -= 1
+            script.append(("equal", x, y))
+        if d > 0:
+            if x == prev_x:
+                script.append(("insert", x, prev_y))
+            else:
+                script.append(("delete", prev_x, y))
+        x, y = prev_x, prev_y
+
+    script.reverse()
+    return script
+
+
+def get_opcodes(old: List[str], new: List[str], max_edits: int = DIFF_MAX_EDITS) -> List[Opcode]:
+    """
+    Opcodes turning the lines of `old` into `new`. Common leading and trailing lines are skipped in one pass before
+    the middle is diffed, with every distinct line swapped for an integer so comparisons are cheap
+    """
+    prefix = 0
+    while prefix < len(old) and prefix < len(new) and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while (
+        suffix < len(old) - prefix
+        and suffix < len(new) - prefix
+        and old[len(old) - 1 - suffix] == new[len(new) - 1 - suffix]
+    ):
+        suffix += 1
+
+    ids = {}
+    a = [ids.setdefault(line, len(ids)) for line in old[prefix : len(old) - suffix]]
+    b = [ids.setdefault(line, len(ids)) for line in new[prefix : len(new) - suffix]]
+
+    opcodes: List[Opcode] = []
+    if prefix:
+        opcodes.append(("equal", 0, prefix, 0, prefix))
+
+    script = _edit_script(a, b, max_edits) if a or b else []
+    if script is None:
+        # Too many changes to be worth diffing line by line
+        tag = "replace" if a and b else "delete" if a else "insert"
+        opcodes.append((tag, prefix, prefix + len(a), prefix, prefix + len(b)))
+    else:
+        for op, i, j in script:
+            tag = "equal" if op == "equal" else "change"
+            i, j = i + prefix, j + prefix
+            i2, j2 = i + (op != "insert"), j + (op != "delete")
+            last = opcodes[-1] if opcodes else None
+            if last and last[0] == tag and last[2] == i and last[4] == j:
+                opcodes[-1] = (tag, last[1], i2, last[3], j2)
+            else:
+                opcodes.append((tag, i, i2, j, j2))
+
+        # Runs of deleted and inserted lines become the tags difflib uses
+        opcodes = [
+            (("replace" if i2 > i1 and j2 > j1 else "delete" if i2 > i1 else "insert") if tag == "change" else tag,)
+            + (i1, i2, j1, j2)
+            for tag, i1, i2, j1, j2 in opcodes
+        ]
+
+    if suffix:
+        opcodes.append(("equal", len(old) - suffix, len(old), len(new) - suffix, len(new)))
+    return opcodes
+
+
+def group_opcodes(opcodes: List[Opcode], context: int = DIFF_CONTEXT) -> List[List[Opcode]]:
+    """
+    Split opcodes into hunks with up to `context` unchanged lines around each change, the same way as
+    `difflib.SequenceMatcher.get_grouped_opcodes`
+    """
+    codes = list(opcodes) or [("equal", 0, 1, 0, 1)]
+    if codes[0][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2
+    if codes[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)
+
+    groups: List[List[Opcode]] = []
+    group: List[Opcode] = []
+    for tag, i1, i2, j1, j2 in codes:
+        # End the current hunk whenever there is a long enough run of unchanged lines
+        if tag == "equal" and i2 - i1 > 2 * context:
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            groups.append(group)
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        groups.append(group)
+    return groups
+
+
+def diff_lines(old: str, new: str, context: int = DIFF_CONTEXT) -> List[DiffHunk]:
+    """The changes from `old` to `new` as hunks of context, deleted and inserted lines"""
+    old_lines, new_lines = old.splitlines(), new.splitlines()
+    hunks: List[DiffHunk] = []
+    for group in group_opcodes(get_opcodes(old_lines, new_lines), context):
+        lines = []
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                lines += [{"type": "context", "content": line} for line in old_lines[i1:i2]]
+                continue
+            lines += [{"type": "delete", "content": line} for line in old_lines[i1:i2]]
+            lines += [{"type": "insert", "content": line} for line in new_lines[j1:j2]]
+        hunks.append(
+            {
+                "old_start": group[0][1] + 1,
+                "old_lines": group[-1][2] - group[0][1],
+                "new_start": group[0][3] + 1,
+                "new_lines": group[-1][4] - group[0][3],
+                "lines": lines,
+            }
+        )
+    return hunks
+
+
+def format_unified(hunks: List[DiffHunk], old_name: str, new_name: str) -> str:
+    prefixes = {"context": " ", "delete": "-", "insert": "+"}
+    output = [f"--- {old_name}", f"+++ {new_name}"]
+    for hunk in hunks:
+        output.append(f"@@ -{hunk['old_start']},{hunk['old_lines']} +{hunk['new_start']},{hunk['new_lines']} @@")
+        output += [prefixes[line["type"]] + line["content"] for line in hunk["lines"]]
+    return "\n".join(output) + "\n"
+
+
+def get_diff_cache_key(old_id: Optional[int], new_id: int, context: int) -> str:
+    """Revision content never changes, so a diff between two revisions is valid for good"""
+    return f"wiki_api-diff-{old_id}-{new_id}-{context}"
+
+
+def get_cached_diff(old_revision, new_revision, context: int = DIFF_CONTEXT) -> List[DiffHunk]:
+    """
+    Diff two revisions, reusing any result cached for the same pair. `old_revision` may be None to diff against an
+    empty page. The revisions' content is only read on a cache miss
+    """
+    cache = get_diff_cache()
+    cache_key = get_diff_cache_key(old_revision.id if old_revision else None, new_revision.id, context)
+
+    hunks = cache.get(cache_key)
+    if hunks is not None:
+        COUNTERS["diffs"].hit()
+    else:
+        COUNTERS["diffs"].miss()
+        hunks = diff_lines(old_revision.content if old_revision else "", new_revision.content, context)
+        cache.set(cache_key, hunks, getattr(settings, "WIKI_API_DIFF_CACHE_TIMEOUT", 60 * 60 * 24))
+    return hunks
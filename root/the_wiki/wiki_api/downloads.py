@@ -0,0 +1,227 @@
+import hashlib
+import mimetypes
+import uuid
+from typing import AsyncIterator, Iterator, List, Optional, Tuple, Union
+from urllib.parse import quote
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from rest_framework import status
+from wiki.plugins.attachments.models import AttachmentRevision
+
+from wiki_api.streaming import is_asgi
+
+
+DOWNLOAD_MODE_STREAM = "stream"
+DOWNLOAD_MODE_ACCEL = "x-accel"
+
+# More ranges than this in a single request are ignored and the whole file is sent instead
+MAX_RANGES = 16
+FILE_CHUNK_SIZE = 64 * 1024
+
+# Inclusive (first byte, last byte) of a requested range
+ByteRange = Tuple[int, int]
+# Part of a response body, either bytes sent as they are or a range of the file
+BodyPart = Union[bytes, ByteRange]
+
+
+def use_accel_redirect(revision: AttachmentRevision) -> bool:
+    """nginx can only serve files it can reach on disk below the internal location"""
+    return getattr(settings, "WIKI_API_DOWNLOAD_MODE", DOWNLOAD_MODE_STREAM) == DOWNLOAD_MODE_ACCEL and isinstance(
+        revision.file.storage, FileSystemStorage
+    )
+
+
+def get_accel_redirect(revision: AttachmentRevision) -> str:
+    prefix = getattr(settings, "WIKI_API_ACCEL_REDIRECT_PREFIX", "/protected-media/")
+    return prefix.rstrip("/") + "/" + quote(revision.file.name.lstrip("/"))
+
+
+def get_download_etag(revision: AttachmentRevision, size: int) -> str:
+    """A new file is always a new revision, so the revision and its stored file identify the content"""
+    state = f"{revision.id}-{revision.file.name}-{size}-{revision.modified.timestamp()}"
+    return quote_etag(hashlib.md5(state.encode()).hexdigest())
+
+
+def get_content_type(filename: str) -> str:
+    content_type, encoding = mimetypes.guess_type(filename or "")
+    # A compressed file is downloaded as it is stored, not decoded by the client
+    if not content_type or encoding:
+        return "application/octet-stream"
+    return content_type
+
+
+def parse_range_header(header: str, size: int) -> Optional[List[ByteRange]]:
+    """
+    Parse a `Range: bytes=...` header against a file of `size` bytes. Returns None when the header should be ignored
+    and the whole file sent, and an empty list when none of the ranges can be satisfied. Overlapping and adjacent
+    ranges are merged
+    """
+    unit, _, specs = header.partition("=")
+    if unit.strip().lower() != "bytes" or not specs or size == 0:
+        return None
+
+    ranges: List[ByteRange] = []
+    for spec in specs.split(","):
+        first, dash, last = spec.strip().partition("-")
+        if not dash or not (first.isdigit() or first == "") or not (last.isdigit() or last == ""):
+            return None
+
+        if first:
+            start, end = int(first), int(last) if last else size - 1
+            if end < start:
+                return None
+            if start >= size:
+                continue
+            ranges.append((start, min(end, size - 1)))
+        elif last:
+            # A suffix range, the last N bytes
+            if int(last) > 0:
+                ranges.append((max(size - int(last), 0), size - 1))
+        else:
+            return None
+
+    if len(ranges) > MAX_RANGES:
+        return None
+
+    merged: List[ByteRange] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def if_range_matches(request, etag: str, last_modified: int) -> bool:
+    """A Range is only honoured when `If-Range` is missing or still names the current file"""
+    if_range = request.headers.get("If-Range")
+    if not if_range:
+        return True
+    if if_range.startswith(('"', "W/")):
+        # If-Range requires a strong comparison
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def iter_file_range(revision: AttachmentRevision, start: int, end: int) -> Iterator[bytes]:
+    with revision.file.open("rb") as file:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = file.read(min(FILE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+async def aiter_file_range(revision: AttachmentRevision, start: int, end: int) -> AsyncIterator[bytes]:
+    """
+    `iter_file_range` for ASGI. Each read runs on a worker thread, so the event loop keeps serving other connections
+    while a slow client drains the file
+    """
+    file = await sync_to_async(revision.file.open, thread_sensitive=False)("rb")
+    try:
+        await sync_to_async(file.seek, thread_sensitive=False)(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await sync_to_async(file.read, thread_sensitive=False)(min(FILE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        await sync_to_async(file.close, thread_sensitive=False)()
+
+
+def iter_body(revision: AttachmentRevision, parts: List[BodyPart]) -> Iterator[bytes]:
+    for part in parts:
+        if isinstance(part, bytes):
+            yield part
+        else:
+            yield from iter_file_range(revision, *part)
+
+
+async def aiter_body(revision: AttachmentRevision, parts: List[BodyPart]) -> AsyncIterator[bytes]:
+    for part in parts:
+        if isinstance(part, bytes):
+            yield part
+        else:
+            async for chunk in aiter_file_range(revision, *part):
+                yield chunk
+
+
+def body_response(request, revision: AttachmentRevision, parts: List[BodyPart], **kwargs) -> StreamingHttpResponse:
+    body = aiter_body(revision, parts) if is_asgi(request) else iter_body(revision, parts)
+    response = StreamingHttpResponse(body, **kwargs)
+    response["Content-Length"] = sum(len(part) if isinstance(part, bytes) else part[1] - part[0] + 1 for part in parts)
+    return response
+
+
+def multipart_response(request, revision: AttachmentRevision, ranges: List[ByteRange], size: int, content_type: str):
+    boundary = uuid.uuid4().hex
+    parts: List[BodyPart] = []
+    for start, end in ranges:
+        header = f"--{boundary}\r\nContent-Type: {content_type}\r\nContent-Range: bytes {start}-{end}/{size}\r\n\r\n"
+        parts += [header.encode(), (start, end), b"\r\n"]
+    parts.append(f"--{boundary}--\r\n".encode())
+
+    return body_response(
+        request,
+        revision,
+        parts,
+        status=status.HTTP_206_PARTIAL_CONTENT,
+        content_type=f"multipart/byteranges; boundary={boundary}",
+    )
+
+
+def download_response(request, revision: AttachmentRevision, filename: str) -> HttpResponse:
+    """
+    Send the file of an attachment revision, honouring conditional and `Range` requests.
+
+    In `x-accel` mode the response is empty and nginx serves the file, and any range of it, from the internal location
+    named in `X-Accel-Redirect`, so no worker is held for the length of the download. Under ASGI the file is read
+    asynchronously instead, so a slow download only holds a connection
+    """
+    size = revision.get_size() or 0
+    etag = get_download_etag(revision, size)
+    last_modified = int(revision.modified.timestamp())
+    content_type = get_content_type(filename)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None and use_accel_redirect(revision):
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = get_accel_redirect(revision)
+    elif response is None:
+        ranges = None
+        if "Range" in request.headers and if_range_matches(request, etag, last_modified):
+            ranges = parse_range_header(request.headers["Range"], size)
+
+        if ranges is None and is_asgi(request):
+            response = body_response(request, revision, [(0, size - 1)] if size else [], content_type=content_type)
+        elif ranges is None:
+            response = FileResponse(revision.file.open("rb"), content_type=content_type)
+            response["Content-Length"] = size
+        elif not ranges:
+            response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+            response["Content-Range"] = f"bytes */{size}"
+        elif len(ranges) == 1:
+            start, end = ranges[0]
+            response = body_response(
+                request, revision, [ranges[0]], status=status.HTTP_206_PARTIAL_CONTENT, content_type=content_type
+            )
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        else:
+            response = multipart_response(request, revision, ranges, size, content_type)
+
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    if response.status_code != status.HTTP_304_NOT_MODIFIED:
+        response["Content-Disposition"] = f"attachment; filename={filename}"
+    return response
@@ -0,0 +1,247 @@
+import json
+import os
+import tarfile
+import time
+from typing import Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import BooleanField, ExpressionWrapper, Q, Value
+from wiki.models import ArticleRevision, URLPath
+from wiki.plugins.attachments.models import Attachment, AttachmentRevision
+
+
+EXPORT_CHUNK_SIZE = getattr(settings, "WIKI_API_EXPORT_CHUNK_SIZE", 500)
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "tar": ("application/x-tar", "tar"),
+}
+EXPORT_ROOT = "wiki"
+
+# Size of the pieces attachment files are read and streamed in
+FILE_CHUNK_SIZE = 64 * 1024
+
+
+def get_readable_filter(user, prefix: str = "") -> Q:
+    """
+    The `can_read` rules of django-wiki as a filter on articles, or on a model relating to them through `prefix`,
+    like `article__`
+    """
+    if user is None or user.has_perm("wiki.moderate"):
+        return Q()
+
+    readable = Q(**{f"{prefix}other_read": True})
+    if user.is_authenticated:
+        readable |= Q(**{f"{prefix}group_read": True, f"{prefix}group_id__in": user.groups.values("id")})
+    # Deleted articles stay readable only by those who can delete them
+    readable &= Q(**{f"{prefix}current_revision__deleted": False})
+    if user.is_authenticated:
+        readable |= Q(**{f"{prefix}owner": user})
+    return readable
+
+
+def get_readable_expression(user) -> ExpressionWrapper:
+    """
+    The read rules as an expression on URLPath, so every row of the tree can still be walked to build the paths while
+    only the readable articles are exported
+    """
+    readable = get_readable_filter(user, "article__")
+    if not readable:
+        return ExpressionWrapper(Value(True), output_field=BooleanField())
+    return ExpressionWrapper(readable, output_field=BooleanField())
+
+
+def iter_urlpaths(site, user=None) -> Iterator[Tuple[URLPath, str]]:
+    """
+    Walk the URL tree depth first with a server side cursor, yielding each readable URL with its path.
+
+    Rows come out in (tree_id, lft) order so a parent is always seen before its children and the path is built from a
+    stack of the current ancestors, instead of the per-row ancestor queries `URLPath.path` makes
+    """
+    queryset = (
+        URLPath.objects.filter(site=site)
+        .select_related("article__current_revision", "article__owner", "article__group")
+        .annotate(readable=get_readable_expression(user))
+        .order_by("tree_id", "lft")
+    )
+
+    ancestors: List[str] = []
+    for urlpath in queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        del ancestors[urlpath.level :]
+        ancestors.append(urlpath.slug or "")
+        if urlpath.readable:
+            yield urlpath, "".join(f"{slug}/" for slug in ancestors[1:])
+
+
+def article_record(urlpath: URLPath, path: str) -> dict:
+    article = urlpath.article
+    revision = article.current_revision
+    return {
+        "type": "article",
+        "id": article.id,
+        "urlpath": urlpath.id,
+        "parent": urlpath.parent_id,
+        "path": path,
+        "slug": urlpath.slug,
+        "title": revision.title if revision else None,
+        "content": revision.content if revision else "",
+        "revision": revision.revision_number if revision else None,
+        "created": article.created,
+        "modified": article.modified,
+        "owner": article.owner.username if article.owner else None,
+        "group": article.group.name if article.group else None,
+        "group_read": article.group_read,
+        "group_write": article.group_write,
+        "other_read": article.other_read,
+        "other_write": article.other_write,
+    }
+
+
+def iter_revision_records(article_id: int) -> Iterator[dict]:
+    revisions = (
+        ArticleRevision.objects.filter(article_id=article_id).select_related("user").order_by("revision_number")
+    )
+    for revision in revisions.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield {
+            "type": "revision",
+            "id": revision.id,
+            "article": article_id,
+            "revision": revision.revision_number,
+            "title": revision.title,
+            "content": revision.content,
+            "user_message": revision.user_message,
+            "user": revision.user.username if revision.user else None,
+            "created": revision.created,
+            "deleted": revision.deleted,
+            "locked": revision.locked,
+        }
+
+
+def iter_attachments(article_id: int, include_revisions: bool = False) -> Iterator[Tuple[dict, AttachmentRevision]]:
+    """Yield a record and the revision holding the file for every attachment shared with the article"""
+    attachments = (
+        Attachment.objects.filter(articles=article_id, deleted=False, current_revision__deleted=False)
+        .select_related("current_revision")
+        .order_by("pk")
+    )
+    for attachment in attachments.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        if include_revisions:
+            revisions = AttachmentRevision.objects.filter(attachment=attachment).order_by("revision_number")
+        else:
+            revisions = [attachment.current_revision]
+
+        for revision in revisions:
+            yield {
+                "type": "attachment",
+                "id": attachment.id,
+                "article": article_id,
+                "filename": attachment.original_filename,
+                "revision": revision.revision_number,
+                "current": revision.id == attachment.current_revision_id,
+                "size": revision.get_size(),
+                "description": revision.description,
+                "created": revision.created,
+            }, revision
+
+
+def iter_records(site, user=None, include_revisions: bool = False) -> Iterator[Tuple[dict, Optional[object]]]:
+    for urlpath, path in iter_urlpaths(site, user):
+        yield article_record(urlpath, path), None
+        if include_revisions:
+            for record in iter_revision_records(urlpath.article_id):
+                yield record, None
+        for record, revision in iter_attachments(urlpath.article_id, include_revisions):
+            record["path"] = path
+            yield record, revision
+
+
+def to_json(record: dict) -> str:
+    return json.dumps(record, cls=DjangoJSONEncoder)
+
+
+def export_ndjson(site, user=None, include_revisions: bool = False) -> Iterator[bytes]:
+    """One JSON object per line for every article, revision and attachment. Attachment files are not included"""
+    for record, _ in iter_records(site, user, include_revisions):
+        yield (to_json(record) + "\n").encode()
+
+
+def safe_filename(filename: Optional[str], attachment_id: int) -> str:
+    """
+    The name of an attachment within its article's directory. Uploaded names are kept as they were sent, so any
+    directories, `..` or control characters are dropped to keep the file where it belongs when the archive is extracted
+    """
+    name = os.path.basename((filename or "").replace("\\", "/"))
+    name = "".join(char for char in name if char.isprintable())
+    if name.strip(". ") == "":
+        return f"attachment-{attachment_id}"
+    return name
+
+
+def _tar_member(name: str, size: int, mtime=None) -> bytes:
+    info = tarfile.TarInfo(f"{EXPORT_ROOT}/{name}")
+    info.size = size
+    info.mtime = int(mtime.timestamp()) if mtime else int(time.time())
+    return info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape")
+
+
+def _tar_padding(size: int) -> bytes:
+    remainder = size % tarfile.BLOCKSIZE
+    return tarfile.NUL * (tarfile.BLOCKSIZE - remainder) if remainder else b""
+
+
+def _tar_bytes(name: str, data: bytes, mtime=None) -> Iterator[bytes]:
+    yield _tar_member(name, len(data), mtime)
+    yield data
+    yield _tar_padding(len(data))
+
+
+def _tar_file(name: str, revision: AttachmentRevision, size: int) -> Iterator[bytes]:
+    """
+    Stream a file into the archive a chunk at a time, it is never read into memory as a whole. Exactly `size` bytes
+    are written, the size in the header sent ahead of them, even if the file has since been replaced by a larger or
+    smaller one: it is cut short or padded with NUL bytes
+    """
+    yield _tar_member(name, size, revision.created)
+    remaining = size
+    with revision.file.open("rb") as file:
+        for chunk in file.chunks(FILE_CHUNK_SIZE):
+            chunk = chunk[:remaining]
+            remaining -= len(chunk)
+            yield chunk
+            if not remaining:
+                break
+    while remaining:
+        padding = min(remaining, FILE_CHUNK_SIZE)
+        remaining -= padding
+        yield tarfile.NUL * padding
+    yield _tar_padding(size)
+
+
+def export_tar(site, user=None, include_revisions: bool = False) -> Iterator[bytes]:
+    """
+    A tar archive laid out like the wiki. Each article is a directory holding `index.md`, its metadata in `index.json`
+    and its attachments in `_attachments/`. With revisions, older versions go in `_revisions/` and
+    `_attachments/_revisions/`.
+
+    Members are written straight into the stream, headers first, so nothing is buffered besides one file chunk
+    """
+    for record, revision in iter_records(site, user, include_revisions):
+        if record["type"] == "article":
+            path = record["path"]
+            content = record.pop("content")
+            yield from _tar_bytes(f"{path}index.md", content.encode(), record["modified"])
+            yield from _tar_bytes(f"{path}index.json", to_json(record).encode(), record["modified"])
+        elif record["type"] == "revision":
+            yield from _tar_bytes(
+                f"{path}_revisions/{record['revision']}.md", record["content"].encode(), record["created"]
+            )
+        elif revision.file and record["size"] is not None:
+            filename = safe_filename(record["filename"], record["id"])
+            if record["current"]:
+                name = f"{path}_attachments/{filename}"
+            else:
+                name = f"{path}_attachments/_revisions/{record['revision']}/{filename}"
+            yield from _tar_file(name, revision, record["size"])
+
+    # End of archive marker
+    yield tarfile.NUL * tarfile.BLOCKSIZE * 2
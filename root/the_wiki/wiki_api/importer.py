@@ -0,0 +1,246 @@
+import hashlib
+import json
+import os
+import tarfile
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.utils.text import slugify
+from wiki.models import Article, ArticleForObject, ArticleRevision, URLPath
+
+from wiki_api.types import ImportEntry
+
+
+IMPORT_CHUNK_SIZE = getattr(settings, "WIKI_API_IMPORT_CHUNK_SIZE", 500)
+MARKDOWN_SUFFIX = ".md"
+INDEX_NAME = "index"
+
+# Permission flags copied from the `index.json` written by the exporter
+PERMISSION_FIELDS = ("group_read", "group_write", "other_read", "other_write")
+
+# (id, level, tree_id) of a URL path, all the importer needs to hang children off it
+Node = Tuple[int, int, int]
+
+
+class DirectorySource:
+    """Markdown files read from a directory tree"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def names(self) -> Iterator[str]:
+        for directory, _, files in os.walk(self.path):
+            for name in files:
+                yield os.path.relpath(os.path.join(directory, name), self.path).replace(os.sep, "/")
+
+    def read(self, name: str) -> bytes:
+        with open(os.path.join(self.path, name), "rb") as file:
+            return file.read()
+
+    def close(self):
+        pass
+
+
+class TarSource:
+    """
+    Markdown files read from a tar archive, compressed or not. A single directory wrapping the whole archive, such as
+    the `wiki/` of an export, is left out of the paths
+    """
+
+    def __init__(self, path: str):
+        self.archive = tarfile.open(path, "r:*")
+        names = [member.name for member in self.archive.getmembers() if member.isfile()]
+        prefixes = {name.split("/", 1)[0] for name in names}
+        self.prefix = f"{prefixes.pop()}/" if len(prefixes) == 1 and all("/" in name for name in names) else ""
+
+    def names(self) -> Iterator[str]:
+        for member in self.archive.getmembers():
+            if member.isfile():
+                yield member.name[len(self.prefix) :]
+
+    def read(self, name: str) -> bytes:
+        return self.archive.extractfile(self.prefix + name).read()
+
+    def close(self):
+        self.archive.close()
+
+
+def open_source(path: str):
+    if os.path.isdir(path):
+        return DirectorySource(path)
+    return TarSource(path)
+
+
+def get_slug(name: str) -> str:
+    """
+    The slug of a file or directory name. A name `slugify` keeps nothing of, such as one written only in a non-Latin
+    script or only in punctuation, gets a slug made from a hash of it instead, so it imports to the same path every time
+    """
+    slug = slugify(name)[: URLPath.SLUG_MAX_LENGTH]
+    return slug or f"page-{hashlib.md5(name.encode()).hexdigest()[:8]}"
+
+
+def collect_entries(names: Iterator[str]) -> List[ImportEntry]:
+    """
+    Map file names onto wiki paths. Both `guide/install.md` and `guide/install/index.md` become `guide/install/`,
+    `index.json` next to an `index.md` carries its metadata and every missing ancestor gets an empty article.
+
+    Hidden files and anything under a directory starting with `_`, like the `_revisions/` and `_attachments/` of an
+    export, are ignored. Entries are returned parents first
+    """
+    entries: Dict[Tuple[str, ...], ImportEntry] = {}
+
+    for name in names:
+        parts = name.split("/")
+        if any(part.startswith(("_", ".")) for part in parts):
+            continue
+
+        stem, suffix = os.path.splitext(parts[-1])
+        if stem == INDEX_NAME and suffix in (MARKDOWN_SUFFIX, ".json"):
+            directories = parts[:-1]
+        elif suffix == MARKDOWN_SUFFIX:
+            directories = parts[:-1] + [stem]
+        else:
+            continue
+
+        path = tuple(get_slug(part) for part in directories)
+        entry = entries.setdefault(path, {"path": path, "markdown": None, "metadata": None})
+        if suffix == MARKDOWN_SUFFIX and (entry["markdown"] is None or stem == INDEX_NAME):
+            entry["markdown"] = name
+        elif suffix == ".json":
+            entry["metadata"] = name
+
+    for path in list(entries):
+        for depth in range(len(path)):
+            entries.setdefault(path[:depth], {"path": path[:depth], "markdown": None, "metadata": None})
+
+    # Tuples sort a path before any path it prefixes
+    return [entries[path] for path in sorted(entries)]
+
+
+def get_existing_nodes(parent: Optional[URLPath]) -> Dict[Tuple[str, ...], Node]:
+    """Every URL path already under `parent`, keyed on its slugs relative to `parent`"""
+    if parent is None:
+        return {}
+
+    nodes: Dict[Tuple[str, ...], Node] = {}
+    ancestors: List[str] = []
+    descendants = parent.get_descendants(include_self=True).order_by("lft")
+    for pk, slug, level, tree_id in descendants.values_list("pk", "slug", "level", "tree_id").iterator():
+        del ancestors[level - parent.level :]
+        ancestors.append(slug)
+        nodes[tuple(ancestors[1:])] = (pk, level, tree_id)
+    return nodes
+
+
+def read_entry(source, entry: ImportEntry) -> Tuple[str, str, dict]:
+    """The title, content and permission flags of an entry"""
+    content = source.read(entry["markdown"]).decode("utf-8", errors="replace") if entry["markdown"] else ""
+    metadata = json.loads(source.read(entry["metadata"])) if entry["metadata"] else {}
+
+    title = metadata.get("title")
+    if not title:
+        heading = next((line for line in content.splitlines() if line.startswith("# ")), None)
+        title = heading[2:].strip() if heading else None
+    if not title:
+        title = entry["path"][-1].replace("-", " ").title() if entry["path"] else "Root"
+
+    permissions = {field: metadata[field] for field in PERMISSION_FIELDS if field in metadata}
+    return title, content, permissions
+
+
+def create_chunk(source, entries: List[ImportEntry], nodes: Dict[Tuple[str, ...], Node], site, user):
+    """
+    Insert a chunk of entries with one bulk insert per table, plus one URL path insert per depth so parents have their
+    ids before their children are inserted. Tree fields are placeholders until the tree is rebuilt
+    """
+    articles, revisions = [], []
+    for entry in entries:
+        title, content, permissions = read_entry(source, entry)
+        article = Article(owner=user, **permissions)
+        articles.append(article)
+        revisions.append(
+            ArticleRevision(
+                article=article, revision_number=1, title=title, content=content, user=user, user_message="Imported"
+            )
+        )
+
+    Article.objects.bulk_create(articles)
+    ArticleRevision.objects.bulk_create(revisions)
+    for article, revision in zip(articles, revisions):
+        article.current_revision = revision
+    Article.objects.bulk_update(articles, ["current_revision"])
+    if apps.is_installed("wiki_api"):
+        # Signals are not sent by bulk inserts
+        from wiki_api.search import bulk_index
+
+        bulk_index(articles)
+
+    by_depth: Dict[int, List[Tuple[ImportEntry, Article]]] = {}
+    for entry, article in zip(entries, articles):
+        by_depth.setdefault(len(entry["path"]), []).append((entry, article))
+
+    urlpaths = []
+    for depth in sorted(by_depth):
+        batch = []
+        for entry, article in by_depth[depth]:
+            parent = nodes.get(entry["path"][:-1]) if entry["path"] else None
+            batch.append(
+                URLPath(
+                    site=site,
+                    parent_id=parent[0] if parent else None,
+                    slug=entry["path"][-1] if entry["path"] else None,
+                    article=article,
+                    level=parent[1] + 1 if parent else 0,
+                    tree_id=parent[2] if parent else 0,
+                    lft=0,
+                    rght=0,
+                )
+            )
+        URLPath.objects.bulk_create(batch)
+        for (entry, _), urlpath in zip(by_depth[depth], batch):
+            nodes[entry["path"]] = (urlpath.pk, urlpath.level, urlpath.tree_id)
+        urlpaths += batch
+
+    content_type = ContentType.objects.get_for_model(URLPath)
+    ArticleForObject.objects.bulk_create(
+        ArticleForObject(article_id=urlpath.article_id, content_type=content_type, object_id=urlpath.pk, is_mptt=True)
+        for urlpath in urlpaths
+    )
+
+
+def import_wiki(
+    source, site, parent: Optional[URLPath], user=None, chunk_size: int = IMPORT_CHUNK_SIZE
+) -> Dict[str, int]:
+    """
+    Import the markdown files of `source` under `parent`, or as a new wiki when `parent` is None. Paths that already
+    exist are left untouched.
+
+    Each chunk is committed in its own transaction with MPTT updates disabled and the tree is rebuilt once at the end,
+    so the wiki should not be edited while an import runs
+    """
+    nodes = get_existing_nodes(parent)
+    entries = collect_entries(source.names())
+    pending = [entry for entry in entries if entry["path"] not in nodes]
+    created = 0
+
+    try:
+        with URLPath.objects.disable_mptt_updates():
+            for start in range(0, len(pending), chunk_size):
+                with transaction.atomic():
+                    create_chunk(source, pending[start : start + chunk_size], nodes, site, user)
+                created += len(pending[start : start + chunk_size])
+    finally:
+        if created:
+            with transaction.atomic():
+                URLPath.objects.rebuild()
+            if apps.is_installed("wiki_api"):
+                # Signals are not sent by bulk inserts
+                from wiki_api.models import TreeVersion
+
+                TreeVersion.bump()
+
+    return {"created": created, "skipped": len(entries) - len(pending)}
@@ -0,0 +1,101 @@
+import asyncio
+import base64
+import statistics
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+from django.conf import settings
+
+
+class LoadTest:
+    """
+    Measure how a running server answers quick API requests while slow clients hold downloads open. Each slow client
+    reads its download at `read_rate` bytes a second and starts again when it ends, the way a client on a poor
+    connection would. Requests are plain HTTP/1.1 over asyncio streams, one connection each.
+
+    Basic auth hashes the password on every request, which can swamp what is measured, so a session key is preferred
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        path: str,
+        download: Optional[str] = None,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        read_rate: int = 16 * 1024,
+        session: Optional[str] = None,
+    ):
+        url = urlsplit(base_url)
+        self.host, self.port = url.hostname, url.port or 80
+        self.path, self.download, self.read_rate = path, download, read_rate
+        self.headers = f"Host: {url.netloc}\r\nConnection: close\r\nAccept: application/json\r\n"
+        if username:
+            token = base64.b64encode(f"{username}:{password or ''}".encode()).decode()
+            self.headers += f"Authorization: Basic {token}\r\n"
+        if session:
+            self.headers += f"Cookie: {settings.SESSION_COOKIE_NAME}={session}\r\n"
+
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.downloaded = 0
+
+    async def request(self, path: str):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        writer.write(f"GET {path} HTTP/1.1\r\n{self.headers}\r\n".encode())
+        await writer.drain()
+        return reader, writer
+
+    async def fast_client(self, deadline: float):
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            try:
+                reader, writer = await self.request(self.path)
+                status_line = await reader.readline()
+                await reader.read()
+                writer.close()
+            except OSError:
+                self.errors += 1
+                continue
+            if status_line.split(b" ")[1:2] == [b"200"]:
+                self.latencies.append(time.monotonic() - started)
+            else:
+                self.errors += 1
+
+    async def slow_client(self, deadline: float):
+        chunk_size = 1024
+        while time.monotonic() < deadline:
+            try:
+                reader, writer = await self.request(self.download)
+                while time.monotonic() < deadline:
+                    chunk = await reader.read(chunk_size)
+                    if not chunk:
+                        break
+                    self.downloaded += len(chunk)
+                    await asyncio.sleep(chunk_size / self.read_rate)
+                writer.close()
+            except OSError:
+                await asyncio.sleep(0.1)
+
+    async def run(self, fast: int, slow: int, duration: float) -> Dict[str, float]:
+        deadline = time.monotonic() + duration
+        clients = [self.fast_client(deadline) for _ in range(fast)]
+        if self.download:
+            clients += [self.slow_client(deadline) for _ in range(slow)]
+        await asyncio.gather(*clients)
+
+        latencies = sorted(self.latencies)
+
+        def percentile(share: float) -> float:
+            return latencies[min(int(len(latencies) * share), len(latencies) - 1)] * 1000 if latencies else 0
+
+        return {
+            "requests": len(latencies),
+            "requests/s": len(latencies) / duration,
+            "errors": self.errors,
+            "p50 ms": statistics.median(latencies) * 1000 if latencies else 0,
+            "p95 ms": percentile(0.95),
+            "max ms": latencies[-1] * 1000 if latencies else 0,
+            "slow KiB/s": self.downloaded / duration / 1024,
+        }
@@ -0,0 +1,28 @@
+from django.core.management import BaseCommand, CommandError
+
+from wiki_api.benchmarks import BENCHMARKS
+
+
+class Command(BaseCommand):
+    help = "Time the hot paths of the wiki API against the implementations they replace"
+
+    def add_arguments(self, parser):
+        parser.add_argument("benchmarks", nargs="*", help=f"Benchmarks to run, from {', '.join(sorted(BENCHMARKS))}")
+        parser.add_argument("--size", type=int, default=500, help="Number of objects in each run")
+        parser.add_argument("--number", type=int, default=20, help="Number of runs")
+
+    def handle(self, *args, **options):
+        unknown = set(options["benchmarks"]) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+
+        for name in options["benchmarks"] or sorted(BENCHMARKS):
+            results, sizes = BENCHMARKS[name](options["size"], options["number"]), {}
+            if isinstance(results, tuple):
+                results, sizes = results
+            baseline = next(iter(results.values()))
+            self.stdout.write(f"{name} ({options['number']} runs of {options['size']} objects)")
+            for case, seconds in results.items():
+                per_run = seconds / options["number"] * 1000
+                stored = f"  {sizes[case]:12,} bytes" if case in sizes else ""
+                self.stdout.write(f"  {case:<12} {per_run:9.3f} ms/run  {baseline / seconds:6.2f}x{stored}")
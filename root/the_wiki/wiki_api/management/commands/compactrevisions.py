@@ -0,0 +1,43 @@
+import time
+
+from django.core.management import BaseCommand, CommandError
+from wiki.models import Article
+
+from wiki_api.deltas import SNAPSHOT_INTERVAL, compact_article, deltas_enabled
+
+
+class Command(BaseCommand):
+    help = (
+        "Store old article revisions as compressed deltas against a whole snapshot every --interval revisions, or "
+        "whole again with --expand. Requires WIKI_API_REVISION_DELTAS to read them back"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("articles", nargs="*", type=int, help="IDs of the articles to compact. Defaults to all")
+        parser.add_argument(
+            "--interval", type=int, default=SNAPSHOT_INTERVAL, help="Number of revisions between whole snapshots"
+        )
+        parser.add_argument("--expand", action="store_true", help="Store every revision whole again")
+
+    def handle(self, *args, **options):
+        if not options["expand"] and not deltas_enabled():
+            raise CommandError("Set WIKI_API_REVISION_DELTAS so compacted revisions can be read back first")
+        if options["interval"] < 1:
+            raise CommandError("--interval must be at least 1")
+
+        articles = Article.objects.order_by("pk").only("pk", "current_revision_id")
+        if options["articles"]:
+            articles = articles.filter(pk__in=options["articles"])
+
+        totals = {"compacted": 0, "expanded": 0, "before": 0, "after": 0}
+        started = time.perf_counter()
+        for article in articles.iterator():
+            for key, value in compact_article(article, options["interval"], options["expand"]).items():
+                totals[key] += value
+
+        saved = 1 - totals["after"] / totals["before"] if totals["before"] else 0
+        self.stdout.write(
+            f"Compacted {totals['compacted']} and expanded {totals['expanded']} revisions in "
+            f"{time.perf_counter() - started:.1f}s. Revision content went from {totals['before']} to "
+            f"{totals['after']} bytes ({saved:.0%} smaller)"
+        )
@@ -0,0 +1,13 @@
+from django.core.management import BaseCommand
+
+from wiki_api.uploads import UPLOAD_EXPIRY, expire_sessions
+
+
+class Command(BaseCommand):
+    help = (
+        f"Delete chunked uploads that have not had a chunk in WIKI_API_UPLOAD_EXPIRY ({UPLOAD_EXPIRY}) seconds, and "
+        "their spool files. Abandoned uploads are also cleared whenever a new one is started"
+    )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Removed {expire_sessions()} abandoned upload files")
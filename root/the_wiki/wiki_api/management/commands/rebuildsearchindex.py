@@ -0,0 +1,16 @@
+from django.core.management import BaseCommand
+
+from wiki_api.search import SEARCH_INDEX_CHUNK_SIZE, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index of the API from the current revision of every article"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size", type=int, default=SEARCH_INDEX_CHUNK_SIZE, help="Articles indexed per insert"
+        )
+
+    def handle(self, *args, **options):
+        count = rebuild_index(options["chunk_size"])
+        self.stdout.write(f"Indexed {count} articles")
@@ -0,0 +1,105 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+SQLITE_CREATE = [
+    "CREATE VIRTUAL TABLE wiki_api_searchindex USING fts5(title, content, content='wiki_api_searchdocument', "
+    "content_rowid='article_id', tokenize='porter unicode61')",
+    "CREATE TRIGGER wiki_api_searchdocument_insert AFTER INSERT ON wiki_api_searchdocument BEGIN "
+    "INSERT INTO wiki_api_searchindex(rowid, title, content) VALUES (new.article_id, new.title, new.content); END",
+    "CREATE TRIGGER wiki_api_searchdocument_delete AFTER DELETE ON wiki_api_searchdocument BEGIN "
+    "INSERT INTO wiki_api_searchindex(wiki_api_searchindex, rowid, title, content) "
+    "VALUES ('delete', old.article_id, old.title, old.content); END",
+    "CREATE TRIGGER wiki_api_searchdocument_update AFTER UPDATE ON wiki_api_searchdocument BEGIN "
+    "INSERT INTO wiki_api_searchindex(wiki_api_searchindex, rowid, title, content) "
+    "VALUES ('delete', old.article_id, old.title, old.content); "
+    "INSERT INTO wiki_api_searchindex(rowid, title, content) VALUES (new.article_id, new.title, new.content); END",
+]
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS wiki_api_searchdocument_update",
+    "DROP TRIGGER IF EXISTS wiki_api_searchdocument_delete",
+    "DROP TRIGGER IF EXISTS wiki_api_searchdocument_insert",
+    "DROP TABLE IF EXISTS wiki_api_searchindex",
+]
+
+POSTGRESQL_CREATE = [
+    "ALTER TABLE wiki_api_searchdocument ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(content, '')), 'B')) STORED",
+    "CREATE INDEX wiki_api_searchdocument_search_vector ON wiki_api_searchdocument USING GIN (search_vector)",
+]
+POSTGRESQL_DROP = [
+    "DROP INDEX IF EXISTS wiki_api_searchdocument_search_vector",
+    "ALTER TABLE wiki_api_searchdocument DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def run_statements(statements):
+    """Run the statements for the database in use. Other databases search without an index"""
+
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+
+    return run
+
+
+def index_articles(apps, schema_editor):
+    """Index the current revision of every existing article"""
+    Article = apps.get_model("wiki", "Article")
+    SearchDocument = apps.get_model("wiki_api", "SearchDocument")
+    articles = Article.objects.exclude(current_revision=None).select_related("current_revision")
+    SearchDocument.objects.bulk_create(
+        SearchDocument(
+            article_id=article.id,
+            revision_id=article.current_revision_id,
+            title=article.current_revision.title,
+            content=article.current_revision.content,
+        )
+        for article in articles.iterator()
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("wiki", "0003_mptt_upgrade"),
+        ("wiki_api", "0002_uploadsession"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchDocument",
+            fields=[
+                (
+                    "article",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="+",
+                        serialize=False,
+                        to="wiki.article",
+                    ),
+                ),
+                ("title", models.CharField(max_length=512)),
+                ("content", models.TextField(blank=True)),
+                ("modified", models.DateTimeField(auto_now=True)),
+                (
+                    "revision",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="wiki.articlerevision",
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(
+            run_statements({"sqlite": SQLITE_CREATE, "postgresql": POSTGRESQL_CREATE}),
+            run_statements({"sqlite": SQLITE_DROP, "postgresql": POSTGRESQL_DROP}),
+        ),
+        migrations.RunPython(index_articles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("wiki", "0003_mptt_upgrade"),
+        ("wiki_api", "0003_searchdocument"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RevisionDelta",
+            fields=[
+                (
+                    "revision",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="+",
+                        serialize=False,
+                        to="wiki.articlerevision",
+                    ),
+                ),
+                ("delta", models.BinaryField()),
+                (
+                    "base",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.RESTRICT,
+                        related_name="+",
+                        to="wiki.articlerevision",
+                    ),
+                ),
+            ],
+        ),
+    ]
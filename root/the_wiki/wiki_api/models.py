@@ -0,0 +1,80 @@
+import os
+import uuid
+
+from django.conf import settings
+from django.db import models
+from django.db.models import F
+
+
+class TreeVersion(models.Model):
+    """
+    Single row counter bumped whenever a URLPath is saved or deleted. Every worker can tell whether the URL tree changed
+    with a primary key lookup instead of scanning the tree
+    """
+
+    version = models.PositiveBigIntegerField(default=0)
+
+    @classmethod
+    def current(cls) -> int:
+        return cls.objects.filter(pk=1).values_list("version", flat=True).first() or 0
+
+    @classmethod
+    def bump(cls):
+        if not cls.objects.filter(pk=1).update(version=F("version") + 1):
+            cls.objects.get_or_create(pk=1, defaults={"version": 1})
+
+
+class UploadSession(models.Model):
+    """
+    A chunked attachment upload in progress. Chunks are written into a spool file at their offset as they arrive, so
+    nothing is held in memory and an interrupted upload resumes from `offset`
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    article = models.ForeignKey("wiki.Article", on_delete=models.CASCADE, related_name="+")
+    # Set when the upload replaces the file of an existing attachment
+    attachment = models.ForeignKey(
+        "wiki_attachments.Attachment", null=True, blank=True, on_delete=models.CASCADE, related_name="+"
+    )
+    filename = models.CharField(max_length=256)
+    description = models.TextField(blank=True)
+    size = models.PositiveBigIntegerField()
+    # Hex SHA-256 of the whole file, checked when the upload is completed
+    checksum = models.CharField(max_length=64, blank=True)
+    offset = models.PositiveBigIntegerField(default=0)
+    created = models.DateTimeField(auto_now_add=True)
+    modified = models.DateTimeField(auto_now=True)
+
+    @property
+    def spool_path(self) -> str:
+        return os.path.join(getattr(settings, "WIKI_API_UPLOAD_SPOOL_PATH", "/config/uploads"), f"{self.id}.part")
+
+
+class SearchDocument(models.Model):
+    """
+    The searchable text of an article's current revision. The full-text index is kept next to it by the database
+    itself, an FTS5 table on SQLite and a generated `tsvector` column on PostgreSQL, see `wiki_api.search`
+    """
+
+    article = models.OneToOneField("wiki.Article", primary_key=True, on_delete=models.CASCADE, related_name="+")
+    revision = models.ForeignKey(
+        "wiki.ArticleRevision", null=True, blank=True, on_delete=models.SET_NULL, related_name="+"
+    )
+    title = models.CharField(max_length=512)
+    content = models.TextField(blank=True)
+    modified = models.DateTimeField(auto_now=True)
+
+
+class RevisionDelta(models.Model):
+    """
+    An article revision stored as a compressed delta against an earlier revision kept whole, its `base`. The content
+    of the revision itself is left empty, see `wiki_api.deltas`
+    """
+
+    revision = models.OneToOneField(
+        "wiki.ArticleRevision", primary_key=True, on_delete=models.CASCADE, related_name="+"
+    )
+    # Only deleted together with the article, and so with every revision taken against it
+    base = models.ForeignKey("wiki.ArticleRevision", on_delete=models.RESTRICT, related_name="+")
+    delta = models.BinaryField()
@@ -0,0 +1,58 @@
+from typing import Optional, Tuple
+
+from django.conf import settings
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+MAX_PAGE_SIZE = getattr(settings, "WIKI_API_MAX_PAGE_SIZE", 1000)
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Keyset pagination on the primary key. Pages are fetched with `WHERE pk > <last seen>` so neither a COUNT nor an
+    OFFSET scan is needed, however deep into the table the client is
+    """
+
+    ordering = "pk"
+    page_size_query_param = "page_size"
+    max_page_size = MAX_PAGE_SIZE
+
+
+class PageSizePagination(PageNumberPagination):
+    """Page number pagination with `?page_size=`, for results not ordered by primary key such as search results"""
+
+    page_size_query_param = "page_size"
+    max_page_size = MAX_PAGE_SIZE
+
+
+class OptionalCursorPagination(PageSizePagination):
+    """
+    Page number pagination unless the client opts into keyset pagination with `?pagination=cursor`. The `next` and
+    `previous` links of a keyset page keep both parameters, so clients only have to follow them.
+
+    In both modes `?page_size=` picks the number of results per page, bounded by `WIKI_API_MAX_PAGE_SIZE`
+    """
+
+    cursor_paginator = None
+
+    def use_cursor(self, request) -> bool:
+        return (
+            request.query_params.get("pagination") == "cursor"
+            or KeysetPagination.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request):
+            self.cursor_paginator = KeysetPagination()
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_links(self) -> Tuple[Optional[str], Optional[str]]:
+        """The `next` and `previous` links of the page just paginated"""
+        paginator = self.cursor_paginator or super()
+        return paginator.get_next_link(), paginator.get_previous_link()
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
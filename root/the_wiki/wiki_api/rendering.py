@@ -0,0 +1,61 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import translation
+from django.utils.http import quote_etag
+from django.utils.safestring import mark_safe
+from wiki.models import Article
+
+from the_wiki.caching import COUNTERS
+
+
+def get_html_cache():
+    return caches[getattr(settings, "WIKI_API_HTML_CACHE", "default")]
+
+
+def get_render_permissions(article: Article, user) -> str:
+    """
+    The user is handed to every markdown extension when rendering, so the output is only shared between users holding
+    the same permissions on the article
+    """
+    flags = (
+        ("r", article.can_read(user)),
+        ("w", article.can_write(user)),
+        ("m", article.can_moderate(user)),
+    )
+    return "".join(flag for flag, allowed in flags if allowed)
+
+
+def get_render_cache_key(article: Article, user) -> str:
+    """
+    Build the cache key for the rendered HTML of an article. Adding a revision changes both the current revision and
+    the article's modified time, so stale entries are never read again and simply expire
+    """
+    return "wiki_api-html-{id}-{revision}-{modified}-{lang}-{permissions}".format(
+        id=article.id,
+        revision=article.current_revision_id,
+        modified=article.modified.timestamp(),
+        lang=translation.get_language(),
+        permissions=get_render_permissions(article, user),
+    )
+
+
+def get_render_etag(cache_key: str) -> str:
+    return quote_etag(hashlib.md5(cache_key.encode()).hexdigest())
+
+
+def get_cached_html(article: Article, user, cache_key: str = None) -> str:
+    """Render an article for a user, reusing any output cached for the same revision and permissions"""
+    cache = get_html_cache()
+    cache_key = cache_key or get_render_cache_key(article, user)
+
+    html = cache.get(cache_key)
+    if html is not None:
+        COUNTERS["html"].hit()
+    else:
+        COUNTERS["html"].miss()
+        html = str(article.render(user=user))
+        cache.set(cache_key, html, getattr(settings, "WIKI_API_HTML_CACHE_TIMEOUT", 600))
+
+    return mark_safe(html)
@@ -0,0 +1,101 @@
+import re
+from typing import Optional, Set
+
+from django.db import transaction
+from django.db.models import Max
+from wiki.models import Article, ArticleRevision
+
+from wiki_api.types import CreateRevisionBody
+
+
+class RevisionConflict(Exception):
+    """The current revision of the article is no longer the one the new revision was based on"""
+
+
+# `"42"`, or the ETag of an article: `"rev-42-<digest of the rest of the response>"`
+IF_MATCH_TAG = re.compile(r'^"?(?:rev-(\d+)(?:-[0-9a-f]+)?|(\d+))"?$')
+
+
+def revision_etag(revision_id: int, digest: str) -> str:
+    """The (unquoted) ETag of an article, led by its current revision so it can be sent back in `If-Match`"""
+    return f"rev-{revision_id}-{digest}"
+
+
+def parse_if_match(header: Optional[str]) -> Optional[Set[int]]:
+    """
+    The revision IDs an `If-Match` header accepts as current, given as the ETag of the article or as revision IDs
+    quoted like one (`"42"`) or not. None when any revision will do, without the header or with `*`. Weak tags never
+    match, as If-Match compares strongly. A ValueError is raised for anything else
+    """
+    if header is None or header.strip() == "*":
+        return None
+
+    revisions = set()
+    for tag in (tag.strip() for tag in header.split(",")):
+        if tag.startswith("W/"):
+            continue
+        match = IF_MATCH_TAG.match(tag)
+        if match is None:
+            raise ValueError(f"Cannot read a revision from '{tag}'")
+        revisions.add(int(match.group(1) or match.group(2)))
+    return revisions
+
+
+def claim_article(article: Article) -> bool:
+    """
+    Write the article row back unchanged, on the condition that its current revision is still the one loaded. The
+    write holds the row (or on SQLite the database) until the transaction ends, so edits to one article queue up here
+    and each one sees the revision committed by the last
+    """
+    return bool(
+        Article.objects.filter(pk=article.pk, current_revision_id=article.current_revision_id).update(
+            current_revision_id=article.current_revision_id
+        )
+    )
+
+
+def create_revision(
+    article: Article, data: CreateRevisionBody, request, expected: Optional[Set[int]] = None
+) -> ArticleRevision:
+    """
+    Add a revision to `article` and make it current in a single transaction. With `expected`, the revision IDs from
+    `parse_if_match`, a `RevisionConflict` is raised unless one of them is still current when the article is claimed,
+    so an edit is never silently built on a revision it did not see. Without it, the revision follows whichever
+    revision is current by then.
+
+    `article` is updated in place, there is no need to load it again to serialize it
+    """
+    if expected is not None and article.current_revision_id not in expected:
+        raise RevisionConflict()
+
+    with transaction.atomic():
+        if not claim_article(article):
+            if expected is not None:
+                raise RevisionConflict()
+            # Another edit committed since the article was loaded, follow it instead
+            current_id = (
+                Article.objects.select_for_update()
+                .filter(pk=article.pk)
+                .values_list("current_revision_id", flat=True)
+                .first()
+            )
+            if current_id is None:
+                raise RevisionConflict()
+            article.current_revision = ArticleRevision.objects.get(pk=current_id)
+
+        last_number = ArticleRevision.objects.filter(article_id=article.pk).aggregate(number=Max("revision_number"))
+        revision = ArticleRevision(
+            article=article,
+            revision_number=(last_number["number"] or 0) + 1,
+            previous_revision_id=article.current_revision_id,
+            title=data.get("title") or article.current_revision.title,
+            content=data.get("content") or "",
+            user_message=data.get("user_message") or "",
+        )
+        revision.set_from_request(request)
+        revision.clean()
+        revision.save()
+
+        article.current_revision = revision
+        article.save(update_fields=["current_revision", "modified"])
+    return revision
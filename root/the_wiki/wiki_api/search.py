@@ -0,0 +1,168 @@
+from typing import Iterable, List
+
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVectorField
+from django.contrib.sites.shortcuts import get_current_site
+from django.db import connections, transaction
+from django.db.models import CharField, FloatField, Q, QuerySet, Value
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+from wiki.models import Article, URLPath
+
+from wiki_api.export import get_readable_filter
+from wiki_api.models import SearchDocument
+from wiki_api.tree import attach_tree_paths
+
+
+SEARCH_INDEX_CHUNK_SIZE = 500
+# Text search configuration of the PostgreSQL index, the one used in the `0003_searchdocument` migration
+SEARCH_CONFIG = "english"
+# Matches are wrapped in markdown bold in the snippets, so they are safe to render wherever the content is
+HIGHLIGHT = "**"
+SNIPPET_WORDS = 24
+
+
+def document_for(article: Article) -> SearchDocument:
+    revision = article.current_revision
+    return SearchDocument(
+        article_id=article.id, revision_id=revision.id, title=revision.title, content=revision.content
+    )
+
+
+def index_article(article: Article):
+    """Bring the document of an article up to date with its current revision, if it changed"""
+    if article.current_revision_id is None:
+        return
+
+    document = document_for(article)
+    updated = (
+        SearchDocument.objects.filter(article_id=article.id)
+        .exclude(revision_id=document.revision_id)
+        .update(
+            revision_id=document.revision_id, title=document.title, content=document.content, modified=timezone.now()
+        )
+    )
+    if not updated:
+        SearchDocument.objects.get_or_create(
+            article_id=article.id,
+            defaults={"revision_id": document.revision_id, "title": document.title, "content": document.content},
+        )
+
+
+def bulk_index(articles: Iterable[Article]):
+    """Add documents for new articles, each with its current revision loaded"""
+    SearchDocument.objects.bulk_create(document_for(article) for article in articles if article.current_revision_id)
+
+
+def rebuild_index(chunk_size: int = SEARCH_INDEX_CHUNK_SIZE) -> int:
+    """Index every article again from scratch. Returns the number of documents"""
+    articles = Article.objects.exclude(current_revision=None).select_related("current_revision").order_by("pk")
+    count = 0
+    with transaction.atomic():
+        SearchDocument.objects.all().delete()
+        chunk: List[Article] = []
+        for article in articles.iterator(chunk_size=chunk_size):
+            chunk.append(article)
+            if len(chunk) == chunk_size:
+                bulk_index(chunk)
+                count += len(chunk)
+                chunk = []
+        bulk_index(chunk)
+        count += len(chunk)
+
+    connection = connections[SearchDocument.objects.db]
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO wiki_api_searchindex(wiki_api_searchindex) VALUES ('optimize')")
+    return count
+
+
+def fts5_query(text: str) -> str:
+    """Every word of the query as a quoted FTS5 string, so user input is never read as query syntax"""
+    return " ".join('"{}"'.format(word.replace('"', '""')) for word in text.split())
+
+
+# FTS5 only ranks and highlights within a query that matches its table
+FTS5_MATCH = "wiki_api_searchindex MATCH %s"
+
+
+def fts5_function(sql: str, params: list, match: str, output_field) -> RawSQL:
+    """An FTS5 auxiliary function like `bm25` or `snippet`, evaluated for the index row of each document"""
+    return RawSQL(
+        f"SELECT {sql} FROM wiki_api_searchindex WHERE {FTS5_MATCH} "
+        "AND wiki_api_searchindex.rowid = wiki_api_searchdocument.article_id",
+        [*params, match],
+        output_field=output_field,
+    )
+
+
+def search(text: str, user) -> QuerySet:
+    """
+    Search documents the user can read, best matches first. Each result is annotated with its `rank`, higher is
+    better, and a `snippet` of the content around the matches.
+
+    SQLite ranks with bm25 over its FTS5 table and PostgreSQL with `ts_rank_cd` over the `tsvector` column, title
+    matches weighing more than content in both. Other databases fall back to a substring match, newest first
+    """
+    queryset = SearchDocument.objects.filter(get_readable_filter(user, "article__")).defer("content")
+    vendor = connections[queryset.db].vendor
+
+    if vendor == "sqlite":
+        match = fts5_query(text)
+        if not match:
+            return queryset.none()
+        return (
+            queryset.filter(
+                article_id__in=RawSQL(f"SELECT rowid FROM wiki_api_searchindex WHERE {FTS5_MATCH}", [match])
+            )
+            .annotate(
+                rank=fts5_function("-bm25(wiki_api_searchindex, 10.0, 1.0)", [], match, FloatField()),
+                snippet=fts5_function(
+                    "snippet(wiki_api_searchindex, 1, %s, %s, '...', %s)",
+                    [HIGHLIGHT, HIGHLIGHT, SNIPPET_WORDS],
+                    match,
+                    CharField(),
+                ),
+            )
+            .order_by("-rank", "article_id")
+        )
+
+    if vendor == "postgresql":
+        query = SearchQuery(text, config=SEARCH_CONFIG, search_type="websearch")
+        # The generated column is not a model field, it is only read here
+        vector = RawSQL("wiki_api_searchdocument.search_vector", [], output_field=SearchVectorField())
+        return (
+            queryset.alias(search_vector=vector)
+            .filter(search_vector=query)
+            .annotate(
+                rank=SearchRank(vector, query, cover_density=True),
+                snippet=SearchHeadline(
+                    "content",
+                    query,
+                    config=SEARCH_CONFIG,
+                    start_sel=HIGHLIGHT,
+                    stop_sel=HIGHLIGHT,
+                    max_words=SNIPPET_WORDS,
+                    min_words=8,
+                ),
+            )
+            .order_by("-rank", "article_id")
+        )
+
+    return (
+        queryset.filter(Q(title__icontains=text) | Q(content__icontains=text))
+        .annotate(rank=Value(None, output_field=FloatField()), snippet=Value(None, output_field=CharField()))
+        .order_by("-modified", "article_id")
+    )
+
+
+def attach_paths(documents: List[SearchDocument], request):
+    """Set the URL path and wiki path of every result on the page, with one query for each"""
+    urlpaths = list(
+        URLPath.objects.filter(site=get_current_site(request), article_id__in=[doc.article_id for doc in documents])
+    )
+    attach_tree_paths(urlpaths)
+    by_article = {urlpath.article_id: urlpath for urlpath in urlpaths}
+    for document in documents:
+        urlpath = by_article.get(document.article_id)
+        document.urlpath_id = urlpath.id if urlpath else None
+        document.tree_path = urlpath.tree_path if urlpath else None
@@ -1,15 +1,135 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.urls import NoReverseMatch, get_script_prefix
+from django.utils.functional import cached_property
 from rest_framework import serializers
+from rest_framework.fields import Field, SkipField, empty
+from rest_framework.relations import PKOnlyObject
 from rest_framework.reverse import reverse
+from rest_framework.settings import api_settings
+
+
+FIELD_CACHE_SIZE = getattr(settings, "WIKI_API_FIELD_CACHE_SIZE", 256)
+
+
+class FieldCache:
+    """
+    Resolved serializer fields keyed on (serializer class, requested fields, expanded fields). The keys come from
+    `?fields=` and `?expand=`, so the least recently used field sets are dropped once `size` of them are held
+    """
+
+    def __init__(self, size: int = FIELD_CACHE_SIZE):
+        self.size = size
+        self.fields: "OrderedDict[tuple, Dict[str, Field]]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __contains__(self, key) -> bool:
+        return key in self.fields
+
+    def __len__(self) -> int:
+        return len(self.fields)
+
+    def get(self, key) -> Optional[Dict[str, Field]]:
+        with self.lock:
+            if key not in self.fields:
+                return None
+            self.fields.move_to_end(key)
+            return self.fields[key]
+
+    def set(self, key, fields: Dict[str, Field]):
+        with self.lock:
+            self.fields[key] = fields
+            self.fields.move_to_end(key)
+            while len(self.fields) > self.size:
+                self.fields.popitem(last=False)
 
 
 class ParameterisedHyperlinkedIdentityField(serializers.HyperlinkedIdentityField):
+    """
+    A hyperlinked identity field for nested routes. `lookup_fields` pairs a dotted attribute path on the object with
+    the URL keyword argument it fills.
+
+    URLs are built from a route template compiled once per view name and the request's scheme and host, instead of a
+    full `reverse()` per object. A path ending in a foreign key's `.id`, such as `article.id`, reads the `article_id`
+    column so the related row is never loaded
+    """
+
     lookup_fields = (("pk", "pk"),)
 
+    # Route templates shared by every field, keyed on (view name, script prefix). None marks a route that has to be
+    # reversed every time
+    route_templates: Dict[Tuple[str, str], Optional[str]] = {}
+
     def __init__(self, *args, **kwargs):
+        lookup_field = kwargs.get("lookup_field")
+        if lookup_field and "lookup_fields" not in kwargs:
+            kwargs["lookup_fields"] = ((lookup_field, kwargs.get("lookup_url_kwarg") or lookup_field),)
         self.lookup_fields = kwargs.pop("lookup_fields", self.lookup_fields)
+        self.accessors: Dict[type, Tuple[Tuple[str, ...], ...]] = {}
         super(ParameterisedHyperlinkedIdentityField, self).__init__(*args, **kwargs)
 
-    def get_url(self, obj, view_name, request, format):
+    @staticmethod
+    def compile_accessor(model, model_field: str) -> Tuple[str, ...]:
+        """Turn a dotted path into the attributes to read, ending on a foreign key column where possible"""
+        attrs = model_field.split(".")
+        if len(attrs) < 2 or attrs[-1] not in ("id", "pk"):
+            return tuple(attrs)
+
+        # Follow the path through the models to the one holding the foreign key
+        for attr in attrs[:-2]:
+            try:
+                model = model._meta.get_field(attr).related_model
+            except (AttributeError, FieldDoesNotExist):
+                return tuple(attrs)
+        try:
+            field = model._meta.get_field(attrs[-2])
+        except (AttributeError, FieldDoesNotExist):
+            return tuple(attrs)
+        if field.many_to_one or field.one_to_one and field.concrete:
+            return tuple(attrs[:-2]) + (field.attname,)
+        return tuple(attrs)
+
+    def get_accessors(self, model) -> Tuple[Tuple[str, ...], ...]:
+        if model not in self.accessors:
+            self.accessors[model] = tuple(
+                self.compile_accessor(model, model_field) if model_field else ()
+                for model_field, _ in self.lookup_fields
+            )
+        return self.accessors[model]
+
+    def get_route_template(self, view_name: str) -> Optional[str]:
+        """
+        Reverse the route once with placeholder arguments and keep the result as a format string. Routes whose
+        patterns do not accept the placeholders keep using `reverse()`
+        """
+        key = (view_name, get_script_prefix())
+        if key not in self.route_templates:
+            placeholders = {
+                url_param: f"__wiki_api_{index}__" for index, (_, url_param) in enumerate(self.lookup_fields)
+            }
+            try:
+                path = reverse(view_name, kwargs=placeholders).replace("{", "{{").replace("}", "}}")
+            except NoReverseMatch:
+                self.route_templates[key] = None
+            else:
+                for url_param, placeholder in placeholders.items():
+                    path = path.replace(placeholder, "{%s}" % url_param)
+                self.route_templates[key] = path
+        return self.route_templates[key]
+
+    def get_absolute_prefix(self, request) -> str:
+        """The scheme and host of the request, worked out once per request"""
+        prefix = getattr(request, "_wiki_api_url_prefix", None)
+        if prefix is None:
+            prefix = request._wiki_api_url_prefix = request.build_absolute_uri("/")[:-1]
+        return prefix
+
+    def reverse_url(self, obj, view_name, request, format):
+        """Build the URL with a dotted attribute walk and a full `reverse()`"""
         kwargs = {}
         for model_field, url_param in self.lookup_fields:
             if not model_field:
@@ -22,26 +142,201 @@ class ParameterisedHyperlinkedIdentityField(serializers.HyperlinkedIdentityField
             kwargs[url_param] = attr
         return reverse(view_name, kwargs=kwargs, request=request, format=format)
 
+    def get_url(self, obj, view_name, request, format):
+        if format or (request is not None and self.needs_reverse(request)):
+            return self.reverse_url(obj, view_name, request, format)
+
+        template = self.get_route_template(view_name)
+        if template is None:
+            return self.reverse_url(obj, view_name, request, format)
+
+        kwargs = {}
+        for (_, url_param), accessor in zip(self.lookup_fields, self.get_accessors(type(obj))):
+            value = obj
+            for attr in accessor:
+                value = getattr(value, attr)
+            if not accessor:
+                value = None
+            elif not isinstance(value, int):
+                # Anything but an integer may not match the route's pattern
+                return self.reverse_url(obj, view_name, request, format)
+            kwargs[url_param] = value
+
+        url = template.format(**kwargs)
+        if request is not None:
+            return self.get_absolute_prefix(request) + url
+        return url
+
+    @staticmethod
+    def needs_reverse(request) -> bool:
+        """Versioned URLs and the `?format=` override are left to `reverse()`"""
+        return getattr(request, "versioning_scheme", None) is not None or api_settings.URL_FORMAT_OVERRIDE in getattr(
+            request, "GET", {}
+        )
+
 
 class DynamicFieldsModelSerializer(serializers.ModelSerializer):
     """
     A ModelSerializer that takes an additional `fields` argument that
     controls which fields should be displayed.
+
+    Subclasses may describe the related rows each field needs through `Meta.select_related`, `Meta.prefetch_related`
+    and `Meta.deferred`, each a mapping of field name to queryset lookups. Views pass their queryset through
+    `optimise_queryset` so only the joins for the fields actually being rendered are added.
     """
 
+    serializer_url_field = ParameterisedHyperlinkedIdentityField
+
+    @classmethod
+    def expandable_fields(cls) -> Dict[str, serializers.BaseSerializer]:
+        """The nested serializers that `expand` can embed, by field name"""
+        return {
+            name: field
+            for name, field in cls._declared_fields.items()
+            if isinstance(field, serializers.BaseSerializer)
+        }
+
+    @classmethod
+    def optimise_queryset(cls, queryset, fields=None, expand=None):
+        """
+        Apply the select_related/prefetch_related/defer lookups declared on `Meta` for the active `fields` (all
+        declared fields when `fields` is None). Nested serializers left out of `expand` only need their ids, so they
+        are not joined; a to-many relation keeps its prefetch, which decides the rows it holds, or is prefetched on
+        its own when none is declared
+        """
+        meta = cls.Meta
+        collapsed = {}
+        if expand is not None:
+            collapsed = {name: field for name, field in cls.expandable_fields().items() if name not in expand}
+
+        def active(lookups, include_collapsed=False):
+            return [
+                lookup
+                for field_name, field_lookups in lookups.items()
+                if (fields is None or field_name in fields) and (include_collapsed or field_name not in collapsed)
+                for lookup in field_lookups
+            ]
+
+        declared_prefetches = getattr(meta, "prefetch_related", {})
+        select_related = active(getattr(meta, "select_related", {}))
+        prefetch_related = active(declared_prefetches, include_collapsed=True)
+        deferred = active(getattr(meta, "deferred", {}))
+        prefetch_related += [
+            field.source or name
+            for name, field in collapsed.items()
+            if isinstance(field, serializers.ListSerializer)
+            and (fields is None or name in fields)
+            and name not in declared_prefetches
+        ]
+
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        if deferred:
+            queryset = queryset.defer(*deferred)
+        return queryset
+
+    # Resolved fields shared by every instance. Instances get fresh fields built from the same arguments
+    field_cache = FieldCache()
+
+    # Fields whose `to_representation` returns a value of this type unchanged, so a plain attribute read will do
+    direct_field_types = {
+        serializers.BooleanField: bool,
+        serializers.CharField: str,
+        serializers.IntegerField: int,
+        serializers.SlugField: str,
+    }
+
     def __init__(self, *args, **kwargs):
-        # Don't pass the 'fields' arg up to the superclass
+        # Don't pass the 'fields' and 'expand' args up to the superclass
         fields = kwargs.pop("fields", None)
+        expand = kwargs.pop("expand", None)
+        self.requested_fields = frozenset(fields) if fields is not None else None
+        self.expanded_fields = frozenset(expand) if expand is not None else None
 
         # Instantiate the superclass normally
         super().__init__(*args, **kwargs)
 
-        if fields is not None:
-            # Drop any fields that are not specified in the `fields` argument.
-            allowed = set(fields)
-            existing = set(self.fields)
-            for field_name in existing - allowed:
-                self.fields.pop(field_name)
+    def get_fields(self):
+        """
+        Introspect the model once per serializer class, set of requested fields and set of expanded fields. Fields
+        not in the `fields` argument are dropped and, when `expand` is given, nested serializers not in it are
+        replaced by their ids before caching. Each instance gets new fields built from the arguments of the cached
+        ones, as fields are bound to the serializer that holds them
+        """
+        key = (type(self), self.requested_fields, self.expanded_fields)
+        fields = self.field_cache.get(key)
+        if fields is None:
+            fields = super().get_fields()
+            if self.requested_fields is not None:
+                fields = OrderedDict((name, field) for name, field in fields.items() if name in self.requested_fields)
+            if self.expanded_fields is not None:
+                for name, field in fields.items():
+                    if isinstance(field, serializers.BaseSerializer) and name not in self.expanded_fields:
+                        fields[name] = self.build_collapsed_field(field)
+            self.field_cache.set(key, fields)
+        return OrderedDict((name, self.rebuild_field(field)) for name, field in fields.items())
+
+    @classmethod
+    def rebuild_field(cls, field: Field) -> Field:
+        """
+        An unbound field built from the arguments `field` was declared with. Unlike `copy.deepcopy` the arguments are
+        shared rather than copied, except for the child field of a list, which is bound to the list that holds it
+        """
+        kwargs = {
+            name: cls.rebuild_field(value) if isinstance(value, Field) else value
+            for name, value in field._kwargs.items()
+        }
+        return type(field)(*field._args, **kwargs)
+
+    @staticmethod
+    def build_collapsed_field(field: serializers.BaseSerializer) -> Field:
+        """A nested serializer that is not expanded, rendered as the primary key(s) of what it would have embedded"""
+        kwargs = {"read_only": True, "many": isinstance(field, serializers.ListSerializer)}
+        if field.source:
+            kwargs["source"] = field.source
+        return serializers.PrimaryKeyRelatedField(**kwargs)
+
+    @cached_property
+    def representation_plan(self) -> List[Tuple[Field, Optional[str], Optional[type]]]:
+        """
+        The readable fields with, for those that only copy a model attribute, the attribute name and the type that is
+        passed through as it is. Worked out once per serializer, so once per list for a `many=True` child
+        """
+        plan = []
+        for field in self._readable_fields:
+            value_type = self.direct_field_types.get(type(field))
+            if value_type is not None and len(field.source_attrs) == 1:
+                plan.append((field, field.source_attrs[0], value_type))
+            else:
+                plan.append((field, None, None))
+        return plan
+
+    def to_representation(self, instance):
+        """
+        `Serializer.to_representation`, with plain attributes that already have the right type copied straight into
+        the output instead of going through their field
+        """
+        ret = OrderedDict()
+        for field, attr, value_type in self.representation_plan:
+            if attr is not None:
+                value = getattr(instance, attr, empty)
+                if value is None or type(value) is value_type:
+                    ret[field.field_name] = value
+                    continue
+
+            try:
+                attribute = field.get_attribute(instance)
+            except SkipField:
+                continue
+
+            check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+            if check_for_none is None:
+                ret[field.field_name] = None
+            else:
+                ret[field.field_name] = field.to_representation(attribute)
+        return ret
 
 
 from .users import UserSerializer  # noqa E402
@@ -52,9 +347,12 @@ from .articles import (
     ArticleRevisionSerializer,
     ArticleHTMLSerializer,
     NewArticleSerializer,
+    BulkNewArticleSerializer,
     NewRevisionSerializer,
 )  # noqa E402
-from .urls import URLSerializer  # noqa E402
+from .urls import URLSerializer, URLTreeSerializer  # noqa E402
+from .uploads import UploadSessionSerializer, NewUploadSessionSerializer  # noqa E402
+from .search import SearchResultSerializer  # noqa E402
 
 __all__ = [
     # Helper serializers
@@ -69,7 +367,12 @@ __all__ = [
     "ArticleSerializer",  # requires user/attachment/article revision
     "ArticleHTMLSerializer",
     "URLSerializer",  # requires article
+    "URLTreeSerializer",
+    "UploadSessionSerializer",
+    "SearchResultSerializer",
     # Request body parsers
     "NewArticleSerializer",
+    "BulkNewArticleSerializer",
     "NewRevisionSerializer",
+    "NewUploadSessionSerializer",
 ]
@@ -1,9 +1,12 @@
 from django.contrib.sites.shortcuts import get_current_site
+from django.db.models import Prefetch
 from django.utils.text import slugify
 from rest_framework import serializers
 from wiki.models import ArticleRevision, Article, URLPath
+from wiki.plugins.attachments.models import Attachment
 
 from wiki_api.apps import WikiApiConfig
+from wiki_api.rendering import get_cached_html
 from wiki_api.serializers import DynamicFieldsModelSerializer, ParameterisedHyperlinkedIdentityField
 from wiki_api.serializers.attachments import AttachmentSerializer
 from wiki_api.serializers.groups import GroupSerializer
@@ -22,6 +25,20 @@ class ArticleRevisionSerializer(DynamicFieldsModelSerializer):
         model = ArticleRevision
         fields = "__all__"
         extra_kwargs = {"url": {"view_name": f"{WikiApiConfig.name}:articlerevisions-detail"}}
+        select_related = {"user": ["user"]}
+
+
+class ArticleAttachmentsSerializer(serializers.ListSerializer):
+    """
+    The attachments of an article. Attachments are reusable plugins related to the article through the plugin's
+    `articles` relation, so `shared_plugins_set` only holds Attachments when `ArticleSerializer.optimise_queryset`
+    prefetched them; otherwise they are queried as Attachments rather than as the plugins they extend
+    """
+
+    def get_attribute(self, instance: Article):
+        if "shared_plugins_set" in getattr(instance, "_prefetched_objects_cache", {}):
+            return instance.shared_plugins_set.all()
+        return Attachment.objects.filter(articles=instance).select_related("current_revision__attachment")
 
 
 class ArticleSerializer(DynamicFieldsModelSerializer):
@@ -30,8 +47,11 @@ class ArticleSerializer(DynamicFieldsModelSerializer):
     current_revision = ArticleRevisionSerializer(
         read_only=True, allow_null=True, fields=["id", "url", "title", "revision_number", "previous_revision"]
     )
-    attachments = AttachmentSerializer(
-        read_only=True, many=True, fields=["id", "url", "original_filename", "current_revision"], allow_null=True
+    attachments = ArticleAttachmentsSerializer(
+        child=AttachmentSerializer(read_only=True, fields=["id", "url", "original_filename", "current_revision"]),
+        source="shared_plugins_set",
+        read_only=True,
+        allow_null=True,
     )
 
     class Meta:
@@ -53,13 +73,27 @@ class ArticleSerializer(DynamicFieldsModelSerializer):
         extra_kwargs = {
             "url": {"view_name": f"{WikiApiConfig.name}:articles-detail"},
         }
+        select_related = {
+            "owner": ["owner"],
+            "group": ["group"],
+            "current_revision": ["current_revision"],
+        }
+        prefetch_related = {
+            "attachments": [
+                Prefetch(
+                    "shared_plugins_set",
+                    queryset=Attachment.objects.select_related("current_revision__attachment"),
+                )
+            ],
+        }
+        deferred = {"current_revision": ["current_revision__content"]}
 
 
 class ArticleHTMLSerializer(serializers.ModelSerializer):
     html = serializers.SerializerMethodField()
 
     def get_html(self, obj: Article):
-        return obj.render(user=self.context["request"].user)
+        return get_cached_html(obj, self.context["request"].user, self.context.get("cache_key"))
 
     class Meta:
         model = Article
@@ -117,6 +151,26 @@ class NewArticleSerializer(serializers.Serializer):
         return data
 
 
+class BulkNewArticleSerializer(NewArticleSerializer):
+    """
+    A single item of a bulk article create. `ref` names the item so later items in the same batch can use it as their
+    `parent_ref`. Checks against the database are done once for the whole batch rather than per item
+    """
+
+    ref = serializers.CharField(max_length=255, required=False)
+    parent = serializers.IntegerField(allow_null=True, required=False, default=None)
+    parent_ref = serializers.CharField(max_length=255, required=False)
+
+    def validate(self, data):
+        if data.get("parent") is not None and data.get("parent_ref"):
+            raise serializers.ValidationError("Specify either a parent or a parent_ref, not both.")
+
+        if not data.get("slug"):
+            data["slug"] = slugify(data["title"])
+
+        return data
+
+
 class NewRevisionSerializer(serializers.Serializer):
     title = serializers.CharField(max_length=255, allow_blank=False)
     content = serializers.CharField(allow_blank=True, allow_null=True)
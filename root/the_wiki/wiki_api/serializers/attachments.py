@@ -8,7 +8,7 @@ from wiki_api.serializers.users import UserSerializer, USER_MINIMAL_FIELDS
 class AttachmentRevisionSerializer(DynamicFieldsModelSerializer):
     url = ParameterisedHyperlinkedIdentityField(
         view_name=f"{WikiApiConfig.name}:attachmentrevisions-detail",
-        lookup_fields=((None, "articles_pk"), ("attachment.id", "attachments_pk"), ("id", "pk")),
+        lookup_fields=(("attachment.article.id", "articles_pk"), ("attachment.id", "attachments_pk"), ("id", "pk")),
         read_only=True,
     )
     user = UserSerializer(read_only=True, fields=USER_MINIMAL_FIELDS)
@@ -17,6 +17,7 @@ class AttachmentRevisionSerializer(DynamicFieldsModelSerializer):
         model = AttachmentRevision
         fields = "__all__"
         extra_kwargs = {"url": {"view_name": f"{WikiApiConfig.name}:attachmentrevisions-detail"}}
+        select_related = {"url": ["attachment"], "user": ["user"]}
 
 
 class AttachmentSerializer(DynamicFieldsModelSerializer):
@@ -33,3 +34,5 @@ class AttachmentSerializer(DynamicFieldsModelSerializer):
         model = Attachment
         fields = "__all__"
         extra_kwargs = {"url": {"view_name": f"{WikiApiConfig.name}:attachments-detail"}}
+        select_related = {"current_revision": ["current_revision__attachment"]}
+        prefetch_related = {"articles": ["articles"]}
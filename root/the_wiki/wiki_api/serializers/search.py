@@ -0,0 +1,19 @@
+from rest_framework import serializers
+
+from wiki_api.apps import WikiApiConfig
+from wiki_api.models import SearchDocument
+from wiki_api.serializers import DynamicFieldsModelSerializer, ParameterisedHyperlinkedIdentityField
+
+
+class SearchResultSerializer(DynamicFieldsModelSerializer):
+    url = ParameterisedHyperlinkedIdentityField(
+        view_name=f"{WikiApiConfig.name}:articles-detail", lookup_fields=(("article_id", "pk"),), read_only=True
+    )
+    snippet = serializers.CharField(read_only=True, allow_null=True)
+    rank = serializers.FloatField(read_only=True, allow_null=True)
+    urlpath = serializers.IntegerField(source="urlpath_id", read_only=True, allow_null=True)
+    path = serializers.CharField(source="tree_path", read_only=True, allow_null=True)
+
+    class Meta:
+        model = SearchDocument
+        fields = ["article", "url", "title", "snippet", "rank", "urlpath", "path", "modified"]
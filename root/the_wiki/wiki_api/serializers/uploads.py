@@ -0,0 +1,49 @@
+from rest_framework import serializers
+from wiki.models import Article
+from wiki.plugins.attachments.models import Attachment, IllegalFileExtension, extension_allowed
+
+from wiki_api.apps import WikiApiConfig
+from wiki_api.models import UploadSession
+from wiki_api.serializers import DynamicFieldsModelSerializer
+from wiki_api.uploads import UPLOAD_MAX_SIZE
+
+
+class UploadSessionSerializer(DynamicFieldsModelSerializer):
+    url = serializers.HyperlinkedIdentityField(view_name=f"{WikiApiConfig.name}:uploads-detail")
+
+    class Meta:
+        model = UploadSession
+        fields = "__all__"
+        extra_kwargs = {"url": {"view_name": f"{WikiApiConfig.name}:uploads-detail"}}
+
+
+class NewUploadSessionSerializer(serializers.Serializer):
+    article = serializers.IntegerField()
+    attachment = serializers.IntegerField(required=False, allow_null=True)
+    filename = serializers.CharField(max_length=256)
+    description = serializers.CharField(required=False, allow_blank=True, default="")
+    size = serializers.IntegerField(min_value=0, max_value=UPLOAD_MAX_SIZE)
+    checksum = serializers.RegexField(r"^[0-9a-fA-F]{64}$", required=False, allow_blank=True, default="")
+
+    def validate_filename(self, filename):
+        try:
+            extension_allowed(filename)
+        except IllegalFileExtension as e:
+            raise serializers.ValidationError(str(e))
+        return filename
+
+    def validate(self, data):
+        """Resolve the article and, when replacing a file, the attachment, which has to keep its extension"""
+        data["article"] = Article.objects.filter(pk=data["article"]).first()
+        if data["article"] is None:
+            raise serializers.ValidationError("Article not found.")
+
+        if data.get("attachment"):
+            data["attachment"] = Attachment.objects.filter(pk=data["attachment"], articles=data["article"]).first()
+            if data["attachment"] is None:
+                raise serializers.ValidationError("Attachment not found on this article.")
+
+            original_extension = (data["attachment"].original_filename or "").split(".")[-1].lower()
+            if data["filename"].split(".")[-1].lower() != original_extension:
+                raise serializers.ValidationError(f"File extension has to be '{original_extension}'.")
+        return data
@@ -3,23 +3,25 @@ from rest_framework.reverse import reverse_lazy
 from wiki.models import URLPath
 
 from wiki_api.apps import WikiApiConfig
-from wiki_api.serializers import DynamicFieldsModelSerializer
+from wiki_api.serializers import DynamicFieldsModelSerializer, ParameterisedHyperlinkedIdentityField
 from wiki_api.serializers.articles import ArticleSerializer
 
 
 class URLSerializer(DynamicFieldsModelSerializer):
     article = ArticleSerializer(read_only=True, fields=["id", "url", "created", "modified"])
     path = serializers.SerializerMethodField()
-    url = serializers.HyperlinkedIdentityField(view_name=f"{WikiApiConfig.name}:urlpaths-detail")
+    url = ParameterisedHyperlinkedIdentityField(view_name=f"{WikiApiConfig.name}:urlpaths-detail")
     parent_url = serializers.SerializerMethodField()
 
     def get_path(self, obj):
-        return obj.path
+        # Set in bulk by `wiki_api.tree` on list pages
+        tree_path = getattr(obj, "tree_path", None)
+        return tree_path if tree_path is not None else obj.path
 
     def get_parent_url(self, obj):
-        if obj.parent:
+        if obj.parent_id:
             return reverse_lazy(
-                f"{WikiApiConfig.name}:urlpaths-detail", kwargs={"pk": obj.parent.id}, request=self.context["request"]
+                f"{WikiApiConfig.name}:urlpaths-detail", kwargs={"pk": obj.parent_id}, request=self.context["request"]
             )
         return None
 
@@ -29,3 +31,18 @@ class URLSerializer(DynamicFieldsModelSerializer):
         extra_kwargs = {
             "url": {"view_name": f"{WikiApiConfig.name}:urlpaths-detail"},
         }
+        select_related = {"article": ["article"]}
+
+
+class URLTreeSerializer(DynamicFieldsModelSerializer):
+    """A node of the URL tree, with its path worked out in memory by `wiki_api.tree`"""
+
+    url = ParameterisedHyperlinkedIdentityField(view_name=f"{WikiApiConfig.name}:urlpaths-detail")
+    title = serializers.CharField(source="article.current_revision.title", read_only=True, allow_null=True)
+    path = serializers.CharField(source="tree_path", read_only=True)
+
+    class Meta:
+        model = URLPath
+        fields = ["id", "url", "slug", "level", "parent", "article", "title", "path"]
+        select_related = {"title": ["article__current_revision"]}
+        deferred = {"title": ["article__current_revision__content"]}
@@ -0,0 +1,24 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from wiki.models import Article, ArticleRevision, URLPath
+
+from wiki_api.deltas import deltas_enabled, expand_revision
+from wiki_api.models import TreeVersion
+from wiki_api.search import index_article
+
+
+@receiver(post_save, sender=URLPath)
+@receiver(post_delete, sender=URLPath)
+def on_urlpath_change(**kwargs):
+    TreeVersion.bump()
+
+
+@receiver(post_save, sender=Article)
+def on_article_save(instance, raw=False, **kwargs):
+    # `Article.add_revision` saves the article once the new revision is current. Fixtures may load the article before
+    # its revisions, they are indexed with `manage.py rebuildsearchindex`
+    if not raw:
+        index_article(instance)
+    # Reverting to an older revision makes it current, and current revisions are always kept whole
+    if not raw and instance.current_revision_id and deltas_enabled():
+        expand_revision(instance.current_revision_id)
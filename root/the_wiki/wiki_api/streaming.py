@@ -0,0 +1,45 @@
+from typing import AsyncIterator, Iterator
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+
+# Bytes gathered from a synchronous iterator per trip to a worker thread when streaming it under ASGI
+ASYNC_CHUNK_SIZE = 64 * 1024
+
+
+def is_asgi(request) -> bool:
+    """Whether the request is served by an ASGI server, where streamed bodies must be async to not be buffered"""
+    return isinstance(getattr(request, "_request", request), ASGIRequest)
+
+
+def _next_chunk(iterator: Iterator[bytes], size: int) -> bytes:
+    chunks, length = [], 0
+    for chunk in iterator:
+        chunks.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            break
+    return b"".join(chunks)
+
+
+async def aiter_sync(iterator: Iterator[bytes], size: int = ASYNC_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """
+    Stream a synchronous iterator from the event loop. Chunks are pulled in batches of about `size` bytes on the
+    request's own thread, so generators running queries keep their database connection
+    """
+    next_chunk = sync_to_async(_next_chunk, thread_sensitive=True)
+    while True:
+        chunk = await next_chunk(iterator, size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def streaming_response(request, content: Iterator[bytes], **kwargs) -> StreamingHttpResponse:
+    """
+    A streamed response that an ASGI server sends as it is produced. Given a synchronous iterator, Django would read
+    it to the end into memory before sending anything
+    """
+    return StreamingHttpResponse(aiter_sync(content) if is_asgi(request) else content, **kwargs)
@@ -1,11 +1,57 @@
+import fcntl
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import tarfile
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
 from django.contrib.auth.models import User, Group
-from django.test import Client, TestCase
-from rest_framework import status
+from django.contrib.sessions.models import Session
+from django.contrib.sites.models import Site
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections
+from django.db.models.signals import post_init
+from django.test import AsyncClient, Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.request import Request
+from rest_framework.reverse import reverse
 from wiki.models.article import Article, ArticleRevision
 from wiki.models.urlpath import URLPath
+from wiki.plugins.attachments.models import Attachment, AttachmentRevision
 
 
+from the_wiki.caching import COUNTERS, CacheCounter, cache_from_url
+from the_help.management.commands.copydatabase import SOURCE_ALIAS
+from the_wiki import health, routers
+from the_wiki.db import add_sqlite_database, apply_sqlite_pragmas, database_from_url
+from the_wiki.middleware import PAGE_VERSION_KEY
 from the_wiki.settings import WIKI_API_ENABLED
+from wiki_api.diff import get_diff_cache, get_opcodes
+from wiki_api.export import _tar_file
+from wiki_api.importer import get_slug
+from wiki_api.models import RevisionDelta, SearchDocument, UploadSession
+from wiki_api.pagination import KeysetPagination, OptionalCursorPagination
+from wiki_api.rendering import get_html_cache
+from wiki_api.revisions import RevisionConflict, create_revision
+from wiki_api.serializers import (
+    ArticleRevisionSerializer,
+    ArticleSerializer,
+    AttachmentRevisionSerializer,
+    DynamicFieldsModelSerializer,
+    FieldCache,
+)
+from wiki_api.streaming import aiter_sync
+from wiki_api.tree import PathIndex, attach_tree_paths, path_index
 
 
 class APITest(TestCase):
@@ -685,3 +731,2242 @@ class APIArticleTest(APITest):
         self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
         response = self.client.get(f"/api/articles/{self.root_article.id}/html")
         self.assertEqual(response.status_code, status.HTTP_301_MOVED_PERMANENTLY)
+
+    def test_article_html_detail_cached(self):
+        get_html_cache().clear()
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        with mock.patch.object(Article, "render", autospec=True, return_value="<p>cached</p>") as render:
+            first = self.client.get(f"/api/articles/{self.root_article.id}/html/")
+            second = self.client.get(f"/api/articles/{self.root_article.id}/html/")
+
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(second.data["html"], "<p>cached</p>")
+
+    def test_article_html_detail_not_modified(self):
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        response = self.client.get(f"/api/articles/{self.root_article.id}/html/")
+        self.assertIn("ETag", response)
+        self.assertIn("Last-Modified", response)
+
+        with mock.patch.object(Article, "render", autospec=True) as render:
+            not_modified = self.client.get(
+                f"/api/articles/{self.root_article.id}/html/", HTTP_IF_NONE_MATCH=response["ETag"]
+            )
+            self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+            not_modified = self.client.get(
+                f"/api/articles/{self.root_article.id}/html/", HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+            )
+            self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        render.assert_not_called()
+
+    def test_article_html_detail_new_revision(self):
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        response = self.client.get(f"/api/articles/{self.root_article.id}/html/")
+
+        self.client.put(
+            f"/api/articles/{self.root_article.id}/",
+            data={"title": "New Title", "content": "Brand new content", "user_message": ""},
+            content_type="application/json",
+        )
+
+        updated = self.client.get(f"/api/articles/{self.root_article.id}/html/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(updated.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(updated["ETag"], response["ETag"])
+        self.assertIn("Brand new content", updated.data["html"])
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class APIQueryCountTest(APITest):
+    """
+    Query counts must not grow with the number of rows on a page. Each request costs a session lookup, a user lookup
+    and the conditional GET validators on top of the numbers below.
+    """
+
+    fixtures = ["1-content-types.yaml", "2-permissions.yaml", "3-groups.yaml", "4-users.yaml", "5-articles.yaml"]
+
+    @property
+    def root_article(self):
+        return URLPath.objects.filter(level=0).first()
+
+    def create_articles(self, count):
+        """Create `count` articles under the root, each with a single attachment"""
+        for i in range(count):
+            url_path = URLPath.create_urlpath(
+                parent=self.root_article,
+                slug=f"query-count-{Article.objects.count()}-{i}",
+                title=f"Query Count {i}",
+                content="# Query count",
+                article_kwargs={"owner": self.user},
+                user=self.user,
+            )
+            attachment = Attachment(article=url_path.article, original_filename="file.txt")
+            attachment.save()
+            attachment.articles.add(url_path.article)
+            revision = AttachmentRevision(attachment=attachment, user=self.user)
+            revision.file.save("file.txt", ContentFile(b"Hello, World!"), save=False)
+            revision.save()
+
+        return url_path.article
+
+    def assertConstantQueries(self, num, url):
+        """Check `url` costs `num` queries with one and with several articles in the database"""
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        for count in (1, 5):
+            path = url(self.create_articles(count))
+            with self.assertNumQueries(num):
+                response = self.client.get(path)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_article_list_queries(self):
+        # count, page
+        self.assertConstantQueries(4, lambda article: "/api/articles/")
+
+    def test_article_detail_queries(self):
+        # article with owner/group/current revision, attachments
+        self.assertConstantQueries(4, lambda article: f"/api/articles/{article.id}/")
+
+    def test_article_detail_attachments(self):
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        article = self.create_articles(1)
+        response = self.client.get(f"/api/articles/{article.id}/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["attachments"]), 1)
+        self.assertEqual(response.data["attachments"][0]["original_filename"], "file.txt")
+
+    def test_article_revision_list_queries(self):
+        # count, page
+        self.assertConstantQueries(4, lambda article: f"/api/articles/{article.id}/revisions/")
+
+    def test_attachment_list_queries(self):
+        # count, page, shared articles
+        self.assertConstantQueries(5, lambda article: f"/api/articles/{article.id}/attachments/")
+
+    def test_attachment_revision_list_queries(self):
+        # count, page
+        self.assertConstantQueries(
+            4,
+            lambda article: f"/api/articles/{article.id}/attachments/"
+            f"{Attachment.objects.filter(article=article).get().id}/revisions/",
+        )
+
+    def test_article_detail_sparse_queries(self):
+        # article without joins, no attachments
+        self.assertConstantQueries(3, lambda article: f"/api/articles/{article.id}/?fields=id,url,owner&expand=")
+
+    def test_article_detail_collapsed_attachments_queries(self):
+        # article, attachment ids
+        self.assertConstantQueries(4, lambda article: f"/api/articles/{article.id}/?fields=id,attachments&expand=")
+
+
+class APIConditionalGetTest(APITest):
+    fixtures = ["1-content-types.yaml", "2-permissions.yaml", "3-groups.yaml", "4-users.yaml", "5-articles.yaml"]
+
+    @property
+    def root_article(self):
+        return URLPath.objects.filter(level=0).first()
+
+    def assertNotModified(self, url, num=2):
+        """Fetch `url` then replay its validators, which must be answered without serializing anything"""
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("ETag", response)
+
+        # user, validators (the session is cached)
+        with self.assertNumQueries(num):
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(not_modified["ETag"], response["ETag"])
+
+        return response
+
+    def test_article_list_not_modified(self):
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        response = self.assertNotModified("/api/articles/")
+        self.assertIn("Last-Modified", response)
+
+        not_modified = self.client.get("/api/articles/", HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_article_owner_modified(self):
+        """Handing an article to another owner or group changes its validators, even when `modified` does not"""
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        url = f"/api/articles/{self.root_article.article.id}/"
+        response = self.client.get(url)
+
+        owner = User.objects.create_user(username="new-owner", password="new-owner")
+        Article.objects.filter(pk=self.root_article.article.id).update(owner=owner)
+        modified = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(modified.status_code, status.HTTP_200_OK)
+
+        Article.objects.filter(pk=self.root_article.article.id).update(group=Group.objects.first())
+        regrouped = self.client.get(url, HTTP_IF_NONE_MATCH=modified["ETag"])
+        self.assertEqual(regrouped.status_code, status.HTTP_200_OK)
+
+    def test_article_list_modified(self):
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        response = self.client.get("/api/articles/")
+
+        self.client.put(
+            f"/api/articles/{self.root_article.article.id}/",
+            data={"title": "New Title", "content": "", "user_message": ""},
+            content_type="application/json",
+        )
+
+        modified = self.client.get("/api/articles/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(modified.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(modified["ETag"], response["ETag"])
+
+    def test_article_list_pages_differ(self):
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        response = self.client.get("/api/articles/")
+        other_page = self.client.get("/api/articles/?page=1")
+        self.assertNotEqual(response["ETag"], other_page["ETag"])
+
+    def test_article_detail_not_modified(self):
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        self.assertNotModified(f"/api/articles/{self.root_article.article.id}/")
+
+    def test_article_detail_attachment_changed(self):
+        """Articles embed their attachments, so a new attachment or attachment revision changes their ETag"""
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        article = self.root_article.article
+        url = f"/api/articles/{article.id}/"
+        etags = [self.client.get(url)["ETag"]]
+
+        attachment = Attachment.objects.create(article=article, original_filename="file.txt")
+        attachment.articles.add(article)
+        etags.append(self.client.get(url)["ETag"])
+        for content in (b"First", b"Second"):
+            revision = AttachmentRevision(attachment=attachment, user=self.user)
+            revision.file.save("file.txt", ContentFile(content), save=False)
+            revision.save()
+            attachment.current_revision = revision
+            attachment.save()
+            etags.append(self.client.get(url)["ETag"])
+
+        self.assertEqual(len(set(etags)), len(etags))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[0])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["attachments"]), 1)
+
+    def test_etag_varies_by_host(self):
+        """Responses hold absolute URLs, so one host's ETag does not match another's"""
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        url = f"/api/articles/{self.root_article.article.id}/"
+        response = self.client.get(url, HTTP_HOST="wiki.example.com")
+        self.assertIn("http://wiki.example.com/", str(response.data["url"]))
+
+        other = self.client.get(url, HTTP_HOST="wiki.example.org", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(other.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(other["ETag"], response["ETag"])
+        same = self.client.get(url, HTTP_HOST="wiki.example.com", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(same.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_article_detail_not_found(self):
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        response = self.client.get("/api/articles/999/", HTTP_IF_NONE_MATCH="*")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_article_revision_list_not_modified(self):
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        self.assertNotModified(f"/api/articles/{self.root_article.article.id}/revisions/")
+
+    def test_url_list_not_modified(self):
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        # plus the tree version
+        self.assertNotModified("/api/urls/", num=3)
+
+    def test_url_list_tree_changed(self):
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        response = self.client.get("/api/urls/")
+
+        child = URLPath.objects.filter(level=1).first()
+        child.slug = "renamed-slug"
+        child.save()
+
+        modified = self.client.get("/api/urls/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(modified.status_code, status.HTTP_200_OK)
+
+    def test_cursor_page_validators(self):
+        """The validators of a keyset page aggregate over the rows of the page, not the whole table"""
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        url = "/api/articles/?pagination=cursor&page_size=2"
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        aggregates = [query["sql"] for query in queries.captured_queries if "COUNT(" in query["sql"]]
+        self.assertEqual(len(aggregates), 1)
+        self.assertIn(" IN (", aggregates[0])
+
+        not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        article = Article.objects.get(pk=response.data["results"][0]["id"])
+        article.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, status.HTTP_200_OK)
+
+    def test_cursor_last_page_appended(self):
+        """A full last page gains a `next` link, and so a new ETag, when rows are appended after it"""
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        url = f"/api/articles/?pagination=cursor&page_size={Article.objects.count()}"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data["next"])
+
+        URLPath.create_urlpath(
+            parent=self.root_article, slug="appended", title="Appended", content="", user=User.objects.first()
+        )
+
+        modified = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(modified.status_code, status.HTTP_200_OK)
+        self.assertIsNotNone(modified.data["next"])
+        self.assertNotEqual(modified["ETag"], response["ETag"])
+
+
+class APIPaginationTest(APITest):
+    fixtures = ["1-content-types.yaml", "2-permissions.yaml", "3-groups.yaml", "4-users.yaml", "5-articles.yaml"]
+
+    def collect(self, url):
+        """Follow `next` links from `url` and return every result"""
+        results = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn("count", response.data)
+            results += response.data["results"]
+            url = response.data["next"]
+        return results
+
+    def test_article_list_cursor(self):
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        results = self.collect("/api/articles/?pagination=cursor&page_size=3")
+
+        ids = [article["id"] for article in results]
+        self.assertEqual(ids, list(Article.objects.order_by("pk").values_list("pk", flat=True)))
+
+    def test_article_list_cursor_no_count(self):
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        # user, validators, page
+        with self.assertNumQueries(3):
+            response = self.client.get("/api/articles/?pagination=cursor")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_article_revision_list_cursor(self):
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        article = Article.objects.order_by("pk").first()
+        results = self.collect(f"/api/articles/{article.id}/revisions/?pagination=cursor&page_size=1")
+        self.assertEqual(len(results), article.articlerevision_set.count())
+
+    def test_url_list_cursor(self):
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        results = self.collect("/api/urls/?pagination=cursor&page_size=2")
+        self.assertEqual(len(results), URLPath.objects.count())
+
+    def test_article_list_page_size(self):
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        response = self.client.get("/api/articles/?page_size=2")
+        self.assertEqual(response.data["count"], Article.objects.count())
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_article_list_max_page_size(self):
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        with mock.patch.object(OptionalCursorPagination, "max_page_size", 1), mock.patch.object(
+            KeysetPagination, "max_page_size", 1
+        ):
+            response = self.client.get("/api/articles/?page_size=100")
+            self.assertEqual(len(response.data["results"]), 1)
+
+            response = self.client.get("/api/articles/?pagination=cursor&page_size=100")
+            self.assertEqual(len(response.data["results"]), 1)
+
+
+class APIBulkArticleTest(APITest):
+    fixtures = ["1-content-types.yaml", "2-permissions.yaml", "3-groups.yaml", "4-users.yaml", "5-articles.yaml"]
+
+    @property
+    def root_article(self):
+        return URLPath.objects.filter(level=0).first()
+
+    def test_article_bulk_create(self):
+        articles = [
+            {"ref": "parent", "parent": self.root_article.id, "title": "Bulk Parent", "content": "Parent"},
+            {"ref": "child", "parent_ref": "parent", "title": "Bulk Child", "content": "Child"},
+            {"parent_ref": "child", "title": "Bulk Grandchild", "slug": "grandchild", "content": "Grandchild"},
+        ]
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        response = self.client.post("/api/articles/bulk/", data=articles, content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        results = response.data["results"]
+        self.assertEqual([result["status"] for result in results], [status.HTTP_201_CREATED] * 3)
+        self.assertEqual([result["index"] for result in results], [0, 1, 2])
+
+        grandchild = URLPath.objects.get(pk=results[2]["urlpath"])
+        self.assertEqual(grandchild.path, "bulk-parent/bulk-child/grandchild/")
+        self.assertEqual(grandchild.article.id, results[2]["article"]["id"])
+        self.assertEqual(grandchild.article.current_revision.content, "Grandchild")
+
+        response = self.client.get("/bulk-parent/bulk-child/grandchild/", follow=False)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_article_bulk_create_partial(self):
+        existing_slug = URLPath.objects.filter(level=1).first().slug
+        articles = [
+            {"ref": "ok", "parent": self.root_article.id, "title": "Bulk Okay", "content": ""},
+            {"ref": "taken", "parent": self.root_article.id, "title": "Taken", "slug": existing_slug, "content": ""},
+            {"parent_ref": "taken", "title": "Orphan", "content": ""},
+            {"parent": 999, "title": "Missing Parent", "content": ""},
+            {"parent": self.root_article.id, "content": "No title"},
+            {"parent": self.root_article.id, "title": "Bulk Okay", "content": "Duplicate in the batch"},
+            {"parent": None, "title": "Second Root", "content": ""},
+        ]
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        response = self.client.post("/api/articles/bulk/", data=articles, content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+
+        self.assertEqual(
+            [result["status"] for result in response.data["results"]],
+            [
+                status.HTTP_201_CREATED,
+                status.HTTP_400_BAD_REQUEST,
+                status.HTTP_424_FAILED_DEPENDENCY,
+                status.HTTP_404_NOT_FOUND,
+                status.HTTP_400_BAD_REQUEST,
+                status.HTTP_400_BAD_REQUEST,
+                status.HTTP_400_BAD_REQUEST,
+            ],
+        )
+        self.assertEqual(URLPath.objects.filter(slug="bulk-okay").count(), 1)
+
+    def test_article_bulk_validation_queries(self):
+        """Validating a batch costs the same number of queries however large it is"""
+        existing_slug = URLPath.objects.filter(level=1).first().slug
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+
+        for count in (1, 10):
+            articles = [
+                {"parent": self.root_article.id, "title": "Taken", "slug": existing_slug, "content": ""}
+            ] * count
+            # user, parents, slugs
+            with self.assertNumQueries(3):
+                response = self.client.post("/api/articles/bulk/", data=articles, content_type="application/json")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_article_bulk_create_not_a_list(self):
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        response = self.client.post(
+            "/api/articles/bulk/", data={"title": "Not a list"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_article_bulk_create_too_many(self):
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        articles = [
+            {"parent": self.root_article.id, "title": f"Bulk Limit {i}", "slug": f"bulk-limit-{i}", "content": ""}
+            for i in range(3)
+        ]
+        with mock.patch("wiki_api.views.articles.BULK_MAX_ITEMS", 2):
+            response = self.client.post("/api/articles/bulk/", data=articles, content_type="application/json")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn("at most 2", response.data["error"])
+            self.assertFalse(URLPath.objects.filter(slug__startswith="bulk-limit-").exists())
+
+            response = self.client.post("/api/articles/bulk/", data=articles[:2], content_type="application/json")
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_article_bulk_create_not_logged_in(self):
+        response = self.client.post("/api/articles/bulk/", data=[], content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class APIExportTest(APITest):
+    fixtures = ["1-content-types.yaml", "2-permissions.yaml", "3-groups.yaml", "4-users.yaml", "5-articles.yaml"]
+
+    def setUp(self):
+        super().setUp()
+        parent = URLPath.objects.filter(level=1).first()
+        self.url_path = URLPath.create_urlpath(
+            parent=parent,
+            slug="export-child",
+            title="Export Child",
+            content="# Exported",
+            article_kwargs={"owner": self.user},
+            user=self.user,
+        )
+        attachment = Attachment(article=self.url_path.article, original_filename="file.txt")
+        attachment.save()
+        attachment.articles.add(self.url_path.article)
+        revision = AttachmentRevision(attachment=attachment, user=self.user)
+        revision.file.save("file.txt", ContentFile(b"Hello, World!"), save=False)
+        revision.save()
+
+    def export(self, **params):
+        response = self.client.get("/api/export/", params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b"".join(response.streaming_content)
+
+    def export_records(self, **params):
+        return [json.loads(line) for line in self.export(**params).decode().splitlines()]
+
+    # ###
+    # ### Begin tests for GET '/api/export/'
+    # ###
+
+    def test_export_ndjson(self):
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        records = self.export_records()
+
+        articles = [record for record in records if record["type"] == "article"]
+        self.assertEqual(
+            {record["path"]: record["id"] for record in articles},
+            {url_path.path: url_path.article_id for url_path in URLPath.objects.all()},
+        )
+        self.assertFalse(any(record["type"] == "revision" for record in records))
+
+        exported = next(record for record in articles if record["id"] == self.url_path.article_id)
+        self.assertEqual(exported["content"], "# Exported")
+        self.assertEqual(exported["title"], "Export Child")
+
+        attachments = [record for record in records if record["type"] == "attachment"]
+        self.assertEqual(len(attachments), 1)
+        self.assertEqual(attachments[0]["path"], self.url_path.path)
+        self.assertEqual(attachments[0]["size"], 13)
+
+    def test_export_revisions(self):
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        article = self.url_path.article
+        revision = ArticleRevision(title="Export Child", content="# Second", user=self.user)
+        article.add_revision(revision)
+
+        records = self.export_records(revisions="true")
+        revisions = [record for record in records if record["type"] == "revision"]
+        # Only articles in the URL tree are exported
+        self.assertEqual(len(revisions), ArticleRevision.objects.filter(article__urlpath__isnull=False).count())
+        self.assertEqual(
+            [record["content"] for record in revisions if record["article"] == article.id], ["# Exported", "# Second"]
+        )
+
+    def test_export_tar(self):
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        archive = tarfile.open(fileobj=io.BytesIO(self.export(output="tar")))
+        path = f"wiki/{self.url_path.path}"
+
+        self.assertEqual(archive.extractfile(f"{path}index.md").read(), b"# Exported")
+        self.assertEqual(json.load(archive.extractfile(f"{path}index.json"))["id"], self.url_path.article_id)
+        self.assertEqual(archive.extractfile(f"{path}_attachments/file.txt").read(), b"Hello, World!")
+        self.assertIn("wiki/index.md", archive.getnames())
+
+    def test_export_tar_unsafe_filename(self):
+        """Attachment names cannot place files outside of their article's directory"""
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        attachments = {}
+        for filename in ("../../../escaped.txt", "..\\..\\windows.txt", "..", "nul\x00byte.txt"):
+            attachment = Attachment.objects.create(article=self.url_path.article, original_filename=filename)
+            attachments[filename] = attachment.id
+            attachment.articles.add(self.url_path.article)
+            revision = AttachmentRevision(attachment=attachment, user=self.user)
+            revision.file.save("file.txt", ContentFile(b"Unsafe"), save=False)
+            revision.save()
+            # Saving the first revision names the attachment after its file
+            Attachment.objects.filter(pk=attachment.pk).update(original_filename=filename)
+
+        archive = tarfile.open(fileobj=io.BytesIO(self.export(output="tar")))
+        names = archive.getnames()
+        for name in names:
+            self.assertTrue(name.startswith("wiki/"), name)
+            self.assertNotIn("..", name.split("/"), name)
+        path = f"wiki/{self.url_path.path}_attachments/"
+        self.assertIn(f"{path}escaped.txt", names)
+        self.assertIn(f"{path}windows.txt", names)
+        self.assertIn(f"{path}nulbyte.txt", names)
+        self.assertIn(f"{path}attachment-{attachments['..']}", names)
+
+    def test_export_tar_file_changed_size(self):
+        """A file is written at the size in its header, even when it changed after the size was read"""
+        revision = AttachmentRevision.objects.get(attachment__articles=self.url_path.article)
+        for size, expected in ((5, b"Hello"), (16, b"Hello, World!\0\0\0")):
+            data = b"".join(_tar_file("file.txt", revision, size)) + tarfile.NUL * tarfile.BLOCKSIZE * 2
+            archive = tarfile.open(fileobj=io.BytesIO(data))
+            self.assertEqual(archive.extractfile("wiki/file.txt").read(), expected)
+            self.assertEqual(len(data) % tarfile.BLOCKSIZE, 0)
+
+    def test_export_permissions(self):
+        article = self.url_path.article
+        article.other_read = False
+        article.save()
+
+        User.objects.create_user(username="export-reader", password="export-reader")
+        self.assertTrue(self.client.login(username="export-reader", password="export-reader"))
+        records = self.export_records()
+
+        exported = {record["id"] for record in records if record["type"] == "article"}
+        self.assertNotIn(article.id, exported)
+        self.assertEqual(exported, set(URLPath.objects.exclude(article=article).values_list("article_id", flat=True)))
+        self.assertFalse(any(record["type"] == "attachment" for record in records))
+
+    def test_export_unknown_output(self):
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        response = self.client.get("/api/export/", {"output": "zip"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_not_logged_in(self):
+        response = self.client.get("/api/export/")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_export_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "export.tar")
+            call_command("exportwiki", format="tar", revisions=True, output=output, stderr=io.StringIO())
+            with tarfile.open(output) as archive:
+                names = archive.getnames()
+
+        self.assertIn(f"wiki/{self.url_path.path}index.md", names)
+        self.assertIn(f"wiki/{self.url_path.path}_revisions/1.md", names)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ImportWikiTest(APITest):
+    fixtures = ["1-content-types.yaml", "2-permissions.yaml", "3-groups.yaml", "4-users.yaml", "5-articles.yaml"]
+
+    files = {
+        "index.md": "# Root is not replaced",
+        "guide.md": "# The Guide\n\nStart here",
+        "guide/install.md": "Install it",
+        "notes/deep/page/index.md": "# Deep Page",
+        "notes/deep/_revisions/1.md": "Ignored",
+        "notes/.hidden.md": "Ignored",
+    }
+
+    def write_tree(self, directory):
+        for name, content in self.files.items():
+            path = os.path.join(directory, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as file:
+                file.write(content)
+
+    def import_wiki(self, source, **options):
+        stdout = io.StringIO()
+        call_command("importwiki", source, stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def assertTreeValid(self):
+        """Tree fields rebuilt after the import must match the parent links"""
+        for url_path in URLPath.objects.all():
+            self.assertEqual(
+                [ancestor.pk for ancestor in url_path.get_ancestors()],
+                [ancestor.pk for ancestor in url_path.parent.get_ancestors(include_self=True)]
+                if url_path.parent
+                else [],
+            )
+
+    def test_import_directory(self):
+        before = URLPath.objects.count()
+        root_content = URLPath.root().article.current_revision.content
+        with tempfile.TemporaryDirectory() as directory:
+            self.write_tree(directory)
+            output = self.import_wiki(directory, user=self.admin_username)
+
+        # guide, guide/install, notes, notes/deep, notes/deep/page
+        self.assertIn("Imported 5 articles, skipped 1 existing", output)
+        self.assertEqual(URLPath.objects.count(), before + 5)
+        self.assertTreeValid()
+
+        guide = URLPath.get_by_path("guide/")
+        self.assertEqual(guide.article.current_revision.title, "The Guide")
+        self.assertEqual(guide.article.current_revision.content, "# The Guide\n\nStart here")
+        self.assertEqual(guide.article.owner, self.user)
+        self.assertEqual(URLPath.get_by_path("guide/install/").article.current_revision.title, "Install")
+        self.assertEqual(URLPath.get_by_path("notes/deep/").article.current_revision.content, "")
+        self.assertEqual(
+            Article.get_for_object(URLPath.get_by_path("notes/deep/page/")).current_revision.title, "Deep Page"
+        )
+        self.assertEqual(URLPath.root().article.current_revision.content, root_content)
+        self.assertEqual(SearchDocument.objects.get(article=guide.article).title, "The Guide")
+
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        response = self.client.get("/notes/deep/page/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_import_unsluggable_names(self):
+        """Names with nothing to slugify get a slug of their own instead of an empty one"""
+        self.files = {"日本語.md": "# Japanese", "!!!/page.md": "Under punctuation", "ÉTÉ.md": "Summer"}
+        with tempfile.TemporaryDirectory() as directory:
+            self.write_tree(directory)
+            self.assertIn("Imported 4 articles", self.import_wiki(directory))
+            self.assertIn("Imported 0 articles, skipped 5 existing", self.import_wiki(directory))
+
+        self.assertFalse(URLPath.objects.filter(level__gt=0, slug="").exists())
+        self.assertTreeValid()
+        japanese = URLPath.get_by_path(f"{get_slug('日本語')}/")
+        self.assertEqual(japanese.article.current_revision.content, "# Japanese")
+        self.assertRegex(japanese.slug, r"^page-[0-9a-f]{8}$")
+        self.assertEqual(URLPath.get_by_path(f"{get_slug('!!!')}/page/").article.current_revision.title, "Page")
+        self.assertEqual(URLPath.get_by_path("ete/").article.current_revision.content, "Summer")
+
+    def test_import_skips_existing(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.write_tree(directory)
+            self.import_wiki(directory)
+            output = self.import_wiki(directory, chunk_size=2)
+
+        self.assertIn("Imported 0 articles, skipped 6 existing", output)
+
+    def test_import_export_round_trip(self):
+        parent = URLPath.create_urlpath(
+            parent=URLPath.root(), slug="copy", title="Copy", article_kwargs={"owner": self.user}, user=self.user
+        )
+        exported = list(URLPath.objects.exclude(pk=parent.pk).filter(level__gt=0))
+
+        with tempfile.TemporaryDirectory() as directory:
+            archive = os.path.join(directory, "export.tar")
+            call_command("exportwiki", format="tar", output=archive, stderr=io.StringIO())
+            self.import_wiki(archive, parent="copy", chunk_size=1)
+
+        self.assertTreeValid()
+        for url_path in exported:
+            copy = URLPath.get_by_path(f"copy/{url_path.path}")
+            self.assertEqual(copy.article.current_revision.title, url_path.article.current_revision.title)
+            self.assertEqual(copy.article.current_revision.content, url_path.article.current_revision.content)
+            self.assertEqual(copy.article.other_read, url_path.article.other_read)
+
+    def test_import_missing_parent(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with self.assertRaises(CommandError):
+                self.import_wiki(directory, parent="does-not-exist")
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class APIAttachmentDownloadTest(APITest):
+    fixtures = ["1-content-types.yaml", "2-permissions.yaml", "3-groups.yaml", "4-users.yaml", "5-articles.yaml"]
+
+    content = b"Hello, World!"
+
+    def setUp(self):
+        super().setUp()
+        article = URLPath.objects.filter(level=1).first().article
+        self.attachment = Attachment(article=article, original_filename="file.txt")
+        self.attachment.save()
+        self.attachment.articles.add(article)
+        self.revision = AttachmentRevision(attachment=self.attachment, user=self.user)
+        self.revision.file.save("file.txt", ContentFile(self.content), save=False)
+        self.revision.save()
+
+        base = f"/api/articles/{article.id}/attachments/{self.attachment.id}"
+        self.download_url = f"{base}/download/"
+        self.revision_download_url = f"{base}/revisions/{self.revision.id}/download/"
+
+    # ###
+    # ### Begin tests for GET '/api/articles/<article_id>/attachments/<id>/download/'
+    # ###
+
+    def test_attachment_download(self):
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        for url in (self.download_url, self.revision_download_url):
+            response = self.client.get(url, HTTP_ACCEPT="*/*")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(b"".join(response.streaming_content), self.content)
+            self.assertEqual(response["Content-Disposition"], "attachment; filename=file.txt")
+            self.assertEqual(response["Content-Type"], "text/plain")
+            self.assertEqual(response["Accept-Ranges"], "bytes")
+            self.assertIn("ETag", response)
+            self.assertNotIn("X-Accel-Redirect", response)
+
+    @override_settings(WIKI_API_DOWNLOAD_MODE="x-accel")
+    def test_attachment_download_accel_redirect(self):
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        for url in (self.download_url, self.revision_download_url):
+            response = self.client.get(url, HTTP_ACCEPT="*/*")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.content, b"")
+            self.assertEqual(response["X-Accel-Redirect"], f"/protected-media/{self.revision.file.name}")
+            self.assertEqual(response["Content-Disposition"], "attachment; filename=file.txt")
+
+    def test_attachment_download_not_logged_in(self):
+        with override_settings(WIKI_API_DOWNLOAD_MODE="x-accel"):
+            response = self.client.get(self.download_url, HTTP_ACCEPT="*/*")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertNotIn("X-Accel-Redirect", response)
+
+    def download(self, **headers):
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        response = self.client.get(self.download_url, HTTP_ACCEPT="*/*", headers=headers)
+        content = b"".join(response.streaming_content) if response.streaming else response.content
+        return response, content
+
+    def test_attachment_download_range(self):
+        response, content = self.download(Range="bytes=0-4")
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(content, b"Hello")
+        self.assertEqual(response["Content-Range"], "bytes 0-4/13")
+        self.assertEqual(response["Content-Length"], "5")
+
+        # Suffix and open ended ranges
+        self.assertEqual(self.download(Range="bytes=-6")[1], b"World!")
+        self.assertEqual(self.download(Range="bytes=7-")[1], b"World!")
+        self.assertEqual(self.download(Range="bytes=7-100")[1], b"World!")
+        # Overlapping ranges are merged into one
+        self.assertEqual(self.download(Range="bytes=0-4,2-6")[1], b"Hello, ")
+
+    def test_attachment_download_multiple_ranges(self):
+        response, content = self.download(Range="bytes=0-4,7-11")
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertTrue(response["Content-Type"].startswith("multipart/byteranges; boundary="))
+        self.assertEqual(int(response["Content-Length"]), len(content))
+
+        boundary = response["Content-Type"].split("boundary=")[1]
+        parts = content.split(f"--{boundary}".encode())
+        self.assertEqual(parts[-1], b"--\r\n")
+        self.assertEqual(
+            [part.split(b"\r\n\r\n", 1)[1] for part in parts[1:-1]],
+            [b"Hello\r\n", b"World\r\n"],
+        )
+        self.assertIn(b"Content-Range: bytes 7-11/13", parts[2])
+
+    def test_attachment_download_range_not_satisfiable(self):
+        response, _ = self.download(Range="bytes=100-200")
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(response["Content-Range"], "bytes */13")
+
+    def test_attachment_download_invalid_range(self):
+        for header in ("bytes=5-1", "lines=0-1", "bytes=a-b", "bytes=" + ",".join(["0-1"] * 20)):
+            response, content = self.download(Range=header)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(content, self.content)
+
+    def test_attachment_download_if_range(self):
+        response, _ = self.download()
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+
+        response, content = self.download(Range="bytes=0-4", **{"If-Range": etag})
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        response, content = self.download(Range="bytes=0-4", **{"If-Range": last_modified})
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+
+        # The file changed since the client's first request, so it gets the whole new file
+        response, content = self.download(Range="bytes=0-4", **{"If-Range": '"stale"'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(content, self.content)
+
+    def test_attachment_download_not_modified(self):
+        response, _ = self.download()
+        response, _ = self.download(**{"If-None-Match": response["ETag"]})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_attachment_download_content_type(self):
+        self.attachment.original_filename = "archive.tar.gz"
+        self.attachment.save()
+        response, _ = self.download()
+        self.assertEqual(response["Content-Type"], "application/octet-stream")
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), WIKI_API_UPLOAD_SPOOL_PATH=tempfile.mkdtemp())
+class APIUploadSessionTest(APITest):
+    fixtures = ["1-content-types.yaml", "2-permissions.yaml", "3-groups.yaml", "4-users.yaml", "5-articles.yaml"]
+
+    content = b"Hello, World!"
+
+    def setUp(self):
+        super().setUp()
+        self.article = URLPath.objects.filter(level=1).first().article
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+
+    def create_session(self, **data):
+        data = {
+            "article": self.article.id,
+            "filename": "file.txt",
+            "size": len(self.content),
+            "checksum": hashlib.sha256(self.content).hexdigest(),
+            **data,
+        }
+        response = self.client.post("/api/uploads/", data=data, content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        return response.data
+
+    def put_chunk(self, session, first, data):
+        return self.client.put(
+            f"/api/uploads/{session['id']}/",
+            data=data,
+            content_type="application/octet-stream",
+            headers={"Content-Range": f"bytes {first}-{first + len(data) - 1}/{session['size']}"},
+        )
+
+    # ###
+    # ### Begin tests for '/api/uploads/'
+    # ###
+
+    def test_upload(self):
+        session = self.create_session(description="Uploaded in chunks")
+        self.assertEqual(session["offset"], 0)
+
+        response = self.put_chunk(session, 0, self.content[:5])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["offset"], 5)
+        response = self.put_chunk(session, 5, self.content[5:])
+        self.assertEqual(response.data["offset"], len(self.content))
+
+        spool_path = UploadSession.objects.get(pk=session["id"]).spool_path
+        response = self.client.post(f"/api/uploads/{session['id']}/complete/")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        revision = AttachmentRevision.objects.get(pk=response.data["id"])
+        self.assertEqual(revision.file.read(), self.content)
+        self.assertEqual(revision.description, "Uploaded in chunks")
+        self.assertEqual(revision.attachment.original_filename, "file.txt")
+        self.assertEqual(revision.attachment.current_revision, revision)
+        self.assertIn(self.article, revision.attachment.articles.all())
+        self.assertFalse(UploadSession.objects.filter(pk=session["id"]).exists())
+        self.assertFalse(os.path.exists(spool_path))
+
+    def test_upload_resume(self):
+        session = self.create_session()
+        self.put_chunk(session, 0, self.content[:5])
+
+        # A chunk that does not start at the offset is refused, with the offset to resume from
+        response = self.put_chunk(session, 8, self.content[8:])
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data["offset"], 5)
+
+        response = self.client.get(f"/api/uploads/{session['id']}/")
+        self.assertEqual(response.data["offset"], 5)
+        self.put_chunk(session, 5, self.content[5:])
+
+        response = self.client.post(f"/api/uploads/{session['id']}/complete/")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_upload_replace_attachment(self):
+        session = self.create_session()
+        self.put_chunk(session, 0, self.content)
+        attachment_id = self.client.post(f"/api/uploads/{session['id']}/complete/").data["attachment"]
+
+        self.content = b"Goodbye, World!"
+        session = self.create_session(attachment=attachment_id, filename="renamed.txt")
+        self.put_chunk(session, 0, self.content)
+        response = self.client.post(f"/api/uploads/{session['id']}/complete/")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        attachment = Attachment.objects.get(pk=attachment_id)
+        self.assertEqual(attachment.current_revision.revision_number, 2)
+        self.assertEqual(attachment.current_revision.file.read(), self.content)
+
+        response = self.client.post(
+            "/api/uploads/",
+            data={"article": self.article.id, "attachment": attachment_id, "filename": "file.pdf", "size": 1},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_incomplete(self):
+        session = self.create_session()
+        self.put_chunk(session, 0, self.content[:5])
+        response = self.client.post(f"/api/uploads/{session['id']}/complete/")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["offset"], 5)
+
+    def test_upload_checksum_mismatch(self):
+        session = self.create_session(checksum="0" * 64)
+        self.put_chunk(session, 0, self.content)
+        response = self.client.post(f"/api/uploads/{session['id']}/complete/")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(AttachmentRevision.objects.exists())
+
+    def test_upload_bad_chunk(self):
+        session = self.create_session()
+        response = self.client.put(
+            f"/api/uploads/{session['id']}/", data=self.content, content_type="application/octet-stream"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.put(
+            f"/api/uploads/{session['id']}/",
+            data=self.content,
+            content_type="application/octet-stream",
+            headers={"Content-Range": f"bytes 0-{len(self.content) - 1}/100"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_invalid_session(self):
+        response = self.client.post(
+            "/api/uploads/",
+            data={"article": self.article.id, "filename": "script.exe", "size": 10},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(
+            "/api/uploads/", data={"article": 999, "filename": "file.txt", "size": 10}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_other_user(self):
+        session = self.create_session()
+        User.objects.create_user(username="other-uploader", password="other-uploader")
+        self.assertTrue(self.client.login(username="other-uploader", password="other-uploader"))
+
+        response = self.put_chunk(session, 0, self.content)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_upload_abort(self):
+        session = self.create_session()
+        spool_path = UploadSession.objects.get(pk=session["id"]).spool_path
+        self.assertTrue(os.path.exists(spool_path))
+
+        response = self.client.delete(f"/api/uploads/{session['id']}/")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(os.path.exists(spool_path))
+
+    def test_upload_concurrent_chunk(self):
+        """A chunk sent while another is being written to the same upload is refused and leaves the file alone"""
+        session = self.create_session()
+        spool_path = UploadSession.objects.get(pk=session["id"]).spool_path
+        with open(spool_path, "r+b") as spool:
+            fcntl.flock(spool, fcntl.LOCK_EX)
+            response = self.put_chunk(session, 0, self.content)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data["offset"], 0)
+        self.assertEqual(os.path.getsize(spool_path), 0)
+
+        self.assertEqual(self.put_chunk(session, 0, self.content).status_code, status.HTTP_200_OK)
+
+    def test_upload_expired(self):
+        abandoned = self.create_session()
+        self.put_chunk(abandoned, 0, self.content[:5])
+        spool_path = UploadSession.objects.get(pk=abandoned["id"]).spool_path
+        active = self.create_session()
+        self.put_chunk(active, 0, self.content[:5])
+
+        UploadSession.objects.filter(pk=abandoned["id"]).update(modified=timezone.now() - timedelta(days=2))
+        self.create_session()
+        self.assertFalse(UploadSession.objects.filter(pk=abandoned["id"]).exists())
+        self.assertFalse(os.path.exists(spool_path))
+        self.assertTrue(UploadSession.objects.filter(pk=active["id"]).exists())
+
+        # A spool file left behind by a session deleted with its article goes once it is as old
+        orphan_path = UploadSession.objects.get(pk=active["id"]).spool_path
+        UploadSession.objects.filter(pk=active["id"]).delete()
+        output = io.StringIO()
+        call_command("expireuploads", stdout=output)
+        self.assertIn("Removed 0 abandoned upload files", output.getvalue())
+        os.utime(orphan_path, (0, 0))
+        call_command("expireuploads", stdout=output)
+        self.assertIn("Removed 1 abandoned upload files", output.getvalue())
+        self.assertFalse(os.path.exists(orphan_path))
+
+
+class HyperlinkFieldTest(APITest):
+    fixtures = ["1-content-types.yaml", "2-permissions.yaml", "3-groups.yaml", "4-users.yaml", "5-articles.yaml"]
+
+    def setUp(self):
+        super().setUp()
+        self.request = Request(RequestFactory().get("/api/articles/"))
+
+    def test_hyperlink_matches_reverse(self):
+        """URLs built from the route template are the ones reverse() builds"""
+        revision = ArticleRevision.objects.first()
+        field = ArticleRevisionSerializer().fields["url"]
+        view_name = "wiki_api:articlerevisions-detail"
+        self.assertEqual(
+            field.get_url(revision, view_name, self.request, None),
+            reverse(view_name, kwargs={"articles_pk": revision.article_id, "pk": revision.id}, request=self.request),
+        )
+        self.assertEqual(
+            field.get_url(revision, view_name, None, None),
+            reverse(view_name, kwargs={"articles_pk": revision.article_id, "pk": revision.id}),
+        )
+        self.assertEqual(
+            field.get_url(revision, view_name, self.request, "json"),
+            field.reverse_url(revision, view_name, self.request, "json"),
+        )
+
+    def test_hyperlink_no_related_queries(self):
+        """Foreign key ids are read from the row, the related object is never loaded"""
+        revisions = list(ArticleRevision.objects.all())
+        with self.assertNumQueries(0):
+            ArticleRevisionSerializer(
+                revisions, many=True, fields=["id", "url"], context={"request": self.request}
+            ).data
+
+    def test_attachment_revision_hyperlink(self):
+        """Attachment revision URLs include the article of the attachment"""
+        article = Article.objects.first()
+        attachment = Attachment.objects.create(article=article, original_filename="file.txt")
+        revision = AttachmentRevision(attachment=attachment, user=self.user)
+        serializer = AttachmentRevisionSerializer(revision, fields=["url"], context={"request": self.request})
+        self.assertEqual(
+            serializer.data["url"],
+            f"http://testserver/api/articles/{article.id}/attachments/{attachment.id}/revisions/{revision.id}/",
+        )
+
+    def test_benchmark_command(self):
+        """The benchmark runs and reports every case"""
+        output = io.StringIO()
+        call_command("benchmarkapi", "hyperlinks", size=5, number=1, stdout=output)
+        self.assertIn("reverse", output.getvalue())
+        self.assertIn("template", output.getvalue())
+        with self.assertRaises(CommandError):
+            call_command("benchmarkapi", "unknown")
+
+
+class SerializerFieldCacheTest(APITest):
+    fixtures = ["1-content-types.yaml", "2-permissions.yaml", "3-groups.yaml", "4-users.yaml", "5-articles.yaml"]
+
+    def setUp(self):
+        super().setUp()
+        self.context = {"request": Request(RequestFactory().get("/api/articles/"))}
+
+    def test_field_set_cached(self):
+        """Serializers with the same field set share the introspection but not the field instances"""
+        first = ArticleSerializer(fields=["id", "url"])
+        second = ArticleSerializer(fields=["url", "id"])
+        self.assertEqual(list(first.fields), ["id", "url"])
+        self.assertEqual(list(second.fields), ["id", "url"])
+        self.assertIn((ArticleSerializer, frozenset(["id", "url"]), None), DynamicFieldsModelSerializer.field_cache)
+        self.assertIsNot(first.fields["url"], second.fields["url"])
+        self.assertIs(first.fields["url"].parent, first)
+
+    def test_field_cache_bounded(self):
+        """The least recently used field sets are dropped, and cached fields are never handed out themselves"""
+        cache = FieldCache(size=2)
+        with mock.patch.object(DynamicFieldsModelSerializer, "field_cache", cache):
+            first = ArticleSerializer(fields=["id"])
+            self.assertEqual(list(first.fields), ["id"])
+            ArticleSerializer(fields=["url"]).fields
+            ArticleSerializer(fields=["id"]).fields
+            ArticleSerializer(fields=["created"]).fields
+            self.assertEqual(len(cache), 2)
+            self.assertIn((ArticleSerializer, frozenset(["id"]), None), cache)
+            self.assertNotIn((ArticleSerializer, frozenset(["url"]), None), cache)
+            self.assertIsNot(first.fields["id"], cache.get((ArticleSerializer, frozenset(["id"]), None))["id"])
+
+    def test_nested_list_rebuilt(self):
+        """A list field gets its own child, bound to it"""
+        first, second = ArticleSerializer(), ArticleSerializer()
+        self.assertIsNot(first.fields["attachments"].child, second.fields["attachments"].child)
+        self.assertIs(first.fields["attachments"].child.parent, first.fields["attachments"])
+
+    def test_attachments_without_prefetch(self):
+        """Attachments are rendered as attachments whether or not the article was loaded to render them"""
+        article = Article.objects.first()
+        attachment = Attachment.objects.create(article=article, original_filename="file.txt")
+        attachment.articles.add(article)
+        revision = AttachmentRevision(attachment=attachment, user=self.user)
+        revision.file.save("file.txt", ContentFile(b"Hello, World!"), save=False)
+        revision.save()
+
+        prefetched = ArticleSerializer.optimise_queryset(Article.objects.filter(pk=article.pk)).get()
+        for instance in (article, Article.objects.get(pk=article.pk), prefetched):
+            attachments = ArticleSerializer(instance, context=self.context).data["attachments"]
+            self.assertEqual([row["id"] for row in attachments], [attachment.id])
+            self.assertEqual(attachments[0]["original_filename"], "file.txt")
+            self.assertEqual(attachments[0]["current_revision"]["id"], revision.id)
+
+    def test_field_set_unknown_fields(self):
+        """Unknown field names are ignored"""
+        self.assertEqual(list(ArticleSerializer(fields=["id", "missing"]).fields), ["id"])
+
+    def test_representation_matches_serializer(self):
+        """The direct attribute path gives the same output as going through every field"""
+        revisions = list(ArticleRevision.objects.select_related("user"))
+        for revision in revisions:
+            serializer = ArticleRevisionSerializer(revision, context=self.context)
+            self.assertEqual(serializer.data, serializers.Serializer.to_representation(serializer, revision))
+
+        article = Article.objects.first()
+        serializer = ArticleSerializer(article, context=self.context)
+        self.assertEqual(serializer.data, serializers.Serializer.to_representation(serializer, article))
+
+
+class APIFieldSelectionTest(APITest):
+    fixtures = ["1-content-types.yaml", "2-permissions.yaml", "3-groups.yaml", "4-users.yaml", "5-articles.yaml"]
+
+    def setUp(self):
+        super().setUp()
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        self.article = Article.objects.exclude(owner=None).first()
+
+    def test_fields(self):
+        """Only the requested fields are rendered"""
+        response = self.client.get(f"/api/articles/{self.article.id}/?fields=id,url,modified")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data.keys()), {"id", "url", "modified"})
+
+        response = self.client.get("/api/articles/?fields=id,owner")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data["results"][0].keys()), {"id", "owner"})
+
+    def test_expand(self):
+        """Nested objects left out of expand are rendered as ids"""
+        response = self.client.get(f"/api/articles/{self.article.id}/?fields=id,owner,current_revision&expand=owner")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["owner"]["id"], self.article.owner_id)
+        self.assertEqual(response.data["current_revision"], self.article.current_revision_id)
+
+        expanded = self.client.get(f"/api/articles/{self.article.id}/")
+        response = self.client.get(f"/api/articles/{self.article.id}/?expand=")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["owner"], self.article.owner_id)
+        self.assertEqual(
+            response.data["attachments"], [attachment["id"] for attachment in expanded.data["attachments"]]
+        )
+
+    def test_expand_default(self):
+        """Without expand every nested object is embedded"""
+        response = self.client.get(f"/api/articles/{self.article.id}/?fields=id,owner")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data["owner"].keys()), {"id", "username", "url"})
+
+    def test_unknown_fields(self):
+        """Unknown fields are rejected"""
+        response = self.client.get(f"/api/articles/{self.article.id}/?fields=id,missing")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(f"/api/articles/{self.article.id}/?expand=created")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_url_fields(self):
+        """URL paths take the same parameters"""
+        response = self.client.get("/api/urls/?fields=id,slug,article&expand=")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        result = response.data["results"][0]
+        self.assertEqual(set(result.keys()), {"id", "slug", "article"})
+        self.assertEqual(result["article"], URLPath.objects.get(pk=result["id"]).article_id)
+
+
+class APIURLTreeTest(APITest):
+    fixtures = ["1-content-types.yaml", "2-permissions.yaml", "3-groups.yaml", "4-users.yaml", "5-articles.yaml"]
+
+    def setUp(self):
+        super().setUp()
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        self.root = URLPath.objects.get(level=0)
+        parent = self.root
+        for slug in ("tree-a", "tree-b", "tree-c"):
+            parent = URLPath.create_urlpath(parent=parent, slug=slug, title=slug.title(), content="", user=self.user)
+        self.leaf = parent
+
+    # ###
+    # ### Begin tests for GET '/api/urls/{id}/descendants/'
+    # ###
+
+    def test_descendants(self):
+        """Every descendant in tree order with the same paths as the model"""
+        response = self.client.get(f"/api/urls/{self.root.id}/descendants/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        expected = list(self.root.get_descendants())
+        self.assertEqual([node["id"] for node in response.data], [node.id for node in expected])
+        self.assertEqual([node["path"] for node in response.data], [node.path for node in expected])
+        self.assertEqual(response.data[-1]["title"], "Tree-C")
+
+    def test_descendants_depth(self):
+        """Descendants can be limited to a number of levels"""
+        response = self.client.get(f"/api/urls/{self.root.id}/descendants/?depth=2")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual({node["level"] for node in response.data}, {1, 2})
+
+        response = self.client.get(f"/api/urls/{self.root.id}/descendants/?depth=0")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_descendants_nested(self):
+        """Nested descendants hang off their parents"""
+        response = self.client.get(f"/api/urls/{self.root.id}/descendants/?structure=nested")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), self.root.get_children().count())
+
+        branch = next(node for node in response.data if node["slug"] == "tree-a")
+        self.assertEqual(branch["children"][0]["slug"], "tree-b")
+        self.assertEqual(branch["children"][0]["children"][0]["path"], "tree-a/tree-b/tree-c/")
+
+        response = self.client.get(f"/api/urls/{self.root.id}/descendants/?structure=tree")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_descendants_queries(self):
+        """The subtree is one query however deep it is"""
+        self.client.get(f"/api/urls/{self.root.id}/descendants/")
+        # user, url, validators, tree version, subtree
+        with self.assertNumQueries(5):
+            response = self.client.get(f"/api/urls/{self.root.id}/descendants/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_descendants_not_modified(self):
+        response = self.client.get(f"/api/urls/{self.root.id}/descendants/")
+        not_modified = self.client.get(f"/api/urls/{self.root.id}/descendants/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    # ###
+    # ### Begin tests for GET '/api/urls/{id}/children/'
+    # ###
+
+    def test_children(self):
+        response = self.client.get(f"/api/urls/{self.root.id}/children/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([node["id"] for node in response.data], [node.id for node in self.root.get_children()])
+
+    def test_children_leaf(self):
+        response = self.client.get(f"/api/urls/{self.leaf.id}/children/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [])
+
+    # ###
+    # ### Begin tests for GET '/api/urls/{id}/ancestors/'
+    # ###
+
+    def test_ancestors(self):
+        response = self.client.get(f"/api/urls/{self.leaf.id}/ancestors/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([node["path"] for node in response.data], ["", "tree-a/", "tree-a/tree-b/"])
+
+    def test_ancestors_not_found(self):
+        response = self.client.get("/api/urls/999/ancestors/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_paths(self):
+        """List pages build their paths with a single query"""
+        response = self.client.get("/api/urls/?page_size=100")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for node in response.data["results"]:
+            self.assertEqual(node["path"], URLPath.objects.get(pk=node["id"]).path)
+
+    def test_list_paths_long_page(self):
+        """A full page of URL paths spread over the tree, in both pagination modes"""
+        for parent_number in range(40):
+            parent = URLPath.create_urlpath(
+                parent=self.root, slug=f"parent-{parent_number}", title="Parent", content="", user=self.user
+            )
+            for child_number in range(25):
+                URLPath.create_urlpath(
+                    parent=parent, slug=f"child-{child_number}", title="Child", content="", user=self.user
+                )
+        # More than SQLite's expression depth limit allows as one OR clause per row
+        self.assertGreater(URLPath.objects.count(), 1000)
+
+        expected = {urlpath.id: urlpath.path for urlpath in URLPath.objects.all()}
+        for url in ("/api/urls/?page_size=1000", "/api/urls/?pagination=cursor&page_size=1000"):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            results = response.data["results"]
+            self.assertEqual(len(results), 1000)
+            self.assertEqual(
+                {node["id"]: node["path"] for node in results}, {node["id"]: expected[node["id"]] for node in results}
+            )
+
+    def test_paths_rows_loaded(self):
+        """Only the ancestors of the rows on a page are loaded, however large the rest of the tree grows"""
+        docs = URLPath.create_urlpath(parent=self.root, slug="docs", title="Docs", content="", user=self.user)
+        ops = URLPath.create_urlpath(parent=docs, slug="ops", title="Ops", content="", user=self.user)
+        page_ids = [
+            URLPath.create_urlpath(parent=ops, slug="page", title="Page", content="", user=self.user).id,
+            ops.id,
+        ]
+
+        loaded = []
+
+        def count_rows(instance, **kwargs):
+            loaded.append(instance.pk)
+
+        def load_page():
+            page = list(URLPath.objects.filter(pk__in=page_ids))
+            del loaded[:]
+            post_init.connect(count_rows, sender=URLPath)
+            try:
+                with self.assertNumQueries(2):
+                    attach_tree_paths(page)
+            finally:
+                post_init.disconnect(count_rows, sender=URLPath)
+            self.assertEqual({urlpath.tree_path for urlpath in page}, {"docs/ops/", "docs/ops/page/"})
+            return sorted(loaded)
+
+        before = load_page()
+        self.assertEqual(before, sorted([self.root.id, docs.id]))
+        for parent_number in range(10):
+            parent = URLPath.create_urlpath(
+                parent=docs, slug=f"parent-{parent_number}", title="Parent", content="", user=self.user
+            )
+            for child_number in range(3):
+                URLPath.create_urlpath(
+                    parent=parent, slug=f"child-{child_number}", title="Child", content="", user=self.user
+                )
+        self.assertEqual(load_page(), before)
+
+
+class APIURLResolveTest(APITest):
+    fixtures = ["1-content-types.yaml", "2-permissions.yaml", "3-groups.yaml", "4-users.yaml", "5-articles.yaml"]
+
+    def setUp(self):
+        super().setUp()
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        self.root = URLPath.objects.get(level=0)
+        self.docs = URLPath.create_urlpath(parent=self.root, slug="docs", title="Docs", content="", user=self.user)
+        self.ops = URLPath.create_urlpath(parent=self.docs, slug="ops", title="Ops", content="", user=self.user)
+        # Tree versions repeat once each test is rolled back
+        path_index.version = None
+
+    # ###
+    # ### Begin tests for GET '/api/urls/resolve/'
+    # ###
+
+    def test_resolve(self):
+        for path in ("docs/ops", "/docs/ops/", "docs/ops/"):
+            response = self.client.get("/api/urls/resolve/", {"path": path})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data["id"], self.ops.id)
+            self.assertEqual(response.data["path"], "docs/ops/")
+            self.assertEqual(response.data["article"]["id"], self.ops.article_id)
+
+    def test_resolve_root(self):
+        response = self.client.get("/api/urls/resolve/", {"path": ""})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["id"], self.root.id)
+
+    def test_resolve_missing(self):
+        for path in ("docs/missing", "docs/ops/missing", "missing/ops"):
+            response = self.client.get("/api/urls/resolve/", {"path": path})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.get("/api/urls/resolve/")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_resolve_cached(self):
+        """A resolved path costs a version check and the row itself"""
+        self.client.get("/api/urls/resolve/", {"path": "docs/ops", "fields": "id"})
+        # user, tree version, URL path
+        with self.assertNumQueries(3):
+            response = self.client.get("/api/urls/resolve/", {"path": "docs/ops", "fields": "id"})
+        self.assertEqual(response.data, {"id": self.ops.id})
+
+    def test_resolve_invalidated(self):
+        """Moving, creating and deleting URL paths are seen straight away"""
+        self.client.get("/api/urls/resolve/", {"path": "docs/ops"})
+
+        self.ops.slug = "operations"
+        self.ops.save()
+        response = self.client.get("/api/urls/resolve/", {"path": "docs/ops"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get("/api/urls/resolve/", {"path": "docs/operations"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.ops.delete()
+        response = self.client.get("/api/urls/resolve/", {"path": "docs/operations"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_path_index_size(self):
+        index = PathIndex(size=2)
+        site = Site.objects.get_current()
+        self.assertEqual(index.resolve(site, "docs/ops"), (self.ops.id, "docs/ops/"))
+        self.assertEqual(len(index.paths), 2)
+        self.assertEqual(index.resolve(site, "docs/ops/missing"), None)
+
+
+class APISearchTest(APITest):
+    fixtures = ["1-content-types.yaml", "2-permissions.yaml", "3-groups.yaml", "4-users.yaml", "5-articles.yaml"]
+
+    def setUp(self):
+        super().setUp()
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        # Fixtures are loaded without signals
+        call_command("rebuildsearchindex", stdout=io.StringIO())
+        self.url_path = URLPath.create_urlpath(
+            parent=URLPath.objects.get(level=0),
+            slug="runbooks",
+            title="Operations runbooks",
+            content="Restarting the flux capacitor safely",
+            user=self.user,
+            article_kwargs={"owner": self.user},
+        )
+
+    def search(self, q, **params):
+        return self.client.get("/api/search/", {"q": q, **params})
+
+    # ###
+    # ### Begin tests for GET '/api/search/'
+    # ###
+
+    def test_search(self):
+        response = self.search("capacitor")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 1)
+
+        result = response.data["results"][0]
+        self.assertEqual(result["article"], self.url_path.article_id)
+        self.assertEqual(result["urlpath"], self.url_path.id)
+        self.assertEqual(result["path"], "runbooks/")
+        self.assertEqual(result["title"], "Operations runbooks")
+        self.assertIn("**capacitor**", result["snippet"])
+        self.assertTrue(result["url"].endswith(f"/api/articles/{self.url_path.article_id}/"))
+
+    def test_search_stemmed(self):
+        """Words match other forms of themselves"""
+        response = self.search("restart runbook")
+        self.assertEqual([result["article"] for result in response.data["results"]], [self.url_path.article_id])
+
+    def test_search_ranked(self):
+        """Matches in the title rank above matches in the content"""
+        URLPath.create_urlpath(
+            parent=URLPath.objects.get(level=0),
+            slug="capacitor",
+            title="Capacitor",
+            content="All about it",
+            user=self.user,
+        )
+        response = self.search("capacitor")
+        self.assertEqual(response.data["count"], 2)
+        self.assertEqual(response.data["results"][0]["title"], "Capacitor")
+        self.assertGreater(response.data["results"][0]["rank"], response.data["results"][1]["rank"])
+
+    def test_search_new_revision(self):
+        """The index follows the current revision"""
+        article = self.url_path.article
+        revision = ArticleRevision(title="Operations runbooks", content="Rebooting the warp core")
+        article.add_revision(revision)
+
+        self.assertEqual(self.search("capacitor").data["count"], 0)
+        self.assertEqual(self.search("warp").data["count"], 1)
+
+    def test_search_permissions(self):
+        article = self.url_path.article
+        article.other_read = False
+        article.save()
+
+        User.objects.create_user(username="search-reader", password="search-reader")
+        self.assertTrue(self.client.login(username="search-reader", password="search-reader"))
+        self.assertEqual(self.search("capacitor").data["count"], 0)
+
+    def test_search_syntax(self):
+        """Query syntax in the input is searched for as text"""
+        for q in ('"capacitor', "capacitor AND (", "NEAR(capacitor", "capacitor*"):
+            response = self.search(q)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_search_pagination(self):
+        response = self.search("capacitor", page_size=1, page=2)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_search_no_query(self):
+        for params in ({}, {"q": "  "}):
+            response = self.client.get("/api/search/", params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_not_logged_in(self):
+        self.client.logout()
+        self.assertEqual(self.search("capacitor").status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_rebuild_index(self):
+        SearchDocument.objects.all().delete()
+        self.assertEqual(self.search("capacitor").data["count"], 0)
+
+        output = io.StringIO()
+        call_command("rebuildsearchindex", stdout=output)
+        self.assertEqual(output.getvalue().strip(), f"Indexed {Article.objects.count()} articles")
+        self.assertEqual(self.search("capacitor").data["count"], 1)
+
+
+class APIRevisionDiffTest(APITest):
+    fixtures = ["1-content-types.yaml", "2-permissions.yaml", "3-groups.yaml", "4-users.yaml", "5-articles.yaml"]
+
+    def setUp(self):
+        super().setUp()
+        get_diff_cache().clear()
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        self.url_path = URLPath.create_urlpath(
+            parent=URLPath.objects.get(level=0),
+            slug="diffs",
+            title="Diffs",
+            content="one\ntwo\nthree\nfour\nfive\nsix\nseven\neight\nnine\nten",
+            user=self.user,
+        )
+        self.article = self.url_path.article
+        self.first = self.article.current_revision
+        self.article.add_revision(
+            ArticleRevision(title="Diffs", content="one\ntwo\nTHREE\nfour\nfive\nsix\nseven\neight\nnine\nten\neleven")
+        )
+        self.second = self.article.current_revision
+
+    def diff(self, revision, **params):
+        return self.client.get(f"/api/articles/{self.article.id}/revisions/{revision.id}/diff/", params)
+
+    # ###
+    # ### Begin tests for GET '/api/articles/{article_id}/revisions/{revision_id}/diff/'
+    # ###
+
+    def test_diff_previous(self):
+        response = self.diff(self.second)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["from"], self.first.id)
+        self.assertEqual(response.data["to"], self.second.id)
+
+        first, second = response.data["hunks"]
+        self.assertEqual(
+            (first["old_start"], first["old_lines"], first["new_start"], first["new_lines"]), (1, 6, 1, 6)
+        )
+        self.assertEqual(
+            [(line["type"], line["content"]) for line in first["lines"] if line["type"] != "context"],
+            [("delete", "three"), ("insert", "THREE")],
+        )
+        self.assertEqual(second["lines"][-1], {"type": "insert", "content": "eleven"})
+
+    def test_diff_unified(self):
+        response = self.diff(self.second, output="unified", context=0)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["diff"],
+            f"--- revision {self.first.revision_number}\n+++ revision {self.second.revision_number}\n"
+            "@@ -3,1 +3,1 @@\n-three\n+THREE\n@@ -11,0 +11,1 @@\n+eleven\n",
+        )
+
+    def test_diff_against(self):
+        """Any two revisions of the article can be compared, in either direction"""
+        response = self.diff(self.first, against=self.second.id, context=0)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["hunks"][-1]["lines"], [{"type": "delete", "content": "eleven"}])
+
+        other = ArticleRevision.objects.exclude(article=self.article).first()
+        self.assertEqual(self.diff(self.first, against=other.id).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.diff(self.first, against="latest").status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_diff_first_revision(self):
+        """The first revision is compared against an empty page"""
+        response = self.diff(self.first)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data["from"])
+        self.assertEqual(len(response.data["hunks"][0]["lines"]), 10)
+
+    def test_diff_bad_parameters(self):
+        self.assertEqual(self.diff(self.second, output="html").status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.diff(self.second, context=-1).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.diff(self.second, context=1000).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_diff_cached(self):
+        """A cached diff does not load the content of either revision"""
+        self.diff(self.second)
+        # user, revision, previous revision
+        with self.assertNumQueries(3):
+            response = self.diff(self.second)
+        self.assertEqual(len(response.data["hunks"]), 2)
+
+    def test_diff_too_many_edits(self):
+        """Past the edit limit the changed block is reported as replaced"""
+        old, new = [str(i) for i in range(50)], [str(i) for i in range(50, 100)]
+        self.assertEqual(get_opcodes(old, new, max_edits=10), [("replace", 0, 50, 0, 50)])
+        self.assertEqual(len(get_opcodes(old, new)), 1)
+        self.assertEqual(
+            get_opcodes(["a", "b", "c"], ["a", "c"]),
+            [("equal", 0, 1, 0, 1), ("delete", 1, 2, 1, 1), ("equal", 2, 3, 1, 2)],
+        )
+
+
+@override_settings(WIKI_API_REVISION_DELTAS=True)
+class RevisionDeltaTest(APITest):
+    fixtures = ["1-content-types.yaml", "2-permissions.yaml", "3-groups.yaml", "4-users.yaml", "5-articles.yaml"]
+
+    def setUp(self):
+        super().setUp()
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        self.url_path = URLPath.create_urlpath(
+            parent=URLPath.objects.get(level=0), slug="runbook", title="Runbook", content="step 0\n", user=self.user
+        )
+        self.article = self.url_path.article
+        for number in range(1, 12):
+            content = "".join(f"step {step}\n" for step in range(number + 1))
+            self.article.add_revision(ArticleRevision(title="Runbook", content=content))
+        self.contents = dict(ArticleRevision.objects.filter(article=self.article).values_list("pk", "content"))
+
+    def compact(self, *args):
+        output = io.StringIO()
+        call_command("compactrevisions", str(self.article.id), *args, stdout=output)
+        return output.getvalue()
+
+    def test_round_trip(self):
+        """Compacted revisions read back the same through the ORM, and are stored whole again with --expand"""
+        self.assertIn("Compacted 8 and expanded 0 revisions", self.compact("--interval", "5"))
+        stored = dict(ArticleRevision.objects.filter(article=self.article).values_list("pk", "content"))
+        self.assertEqual(sum(1 for content in stored.values() if not content), 8)
+        self.assertEqual(RevisionDelta.objects.filter(revision__article=self.article).count(), 8)
+        for revision in ArticleRevision.objects.filter(article=self.article):
+            self.assertEqual(revision.content, self.contents[revision.pk])
+
+        # Nothing moved, so nothing is written
+        self.assertIn("Compacted 0 and expanded 0 revisions", self.compact("--interval", "5"))
+        self.assertIn("expanded 8 revisions", self.compact("--expand"))
+        stored = dict(ArticleRevision.objects.filter(article=self.article).values_list("pk", "content"))
+        self.assertEqual(stored, self.contents)
+        self.assertFalse(RevisionDelta.objects.exists())
+
+    def test_current_revision_kept_whole(self):
+        self.compact("--interval", "5")
+        first = ArticleRevision.objects.get(article=self.article, revision_number=2)
+        self.assertTrue(RevisionDelta.objects.filter(revision=first).exists())
+
+        # Reverting makes an old revision current again
+        self.article.current_revision = first
+        self.article.save()
+        self.assertFalse(RevisionDelta.objects.filter(revision=first).exists())
+        self.assertEqual(
+            ArticleRevision.objects.filter(pk=first.pk).values_list("content", flat=True).get(),
+            self.contents[first.pk],
+        )
+
+        self.article.delete()
+        self.assertFalse(RevisionDelta.objects.exists())
+
+    def test_revisions_endpoint(self):
+        """The revisions endpoints rebuild a page of compacted revisions in a fixed number of queries"""
+        self.compact("--interval", "5")
+        url = f"/api/articles/{self.article.id}/revisions/"
+        response = self.client.get(url, {"page_size": 12})
+        self.assertEqual({row["id"]: row["content"] for row in response.data["results"]}, self.contents)
+
+        revision = ArticleRevision.objects.get(article=self.article, revision_number=7)
+        response = self.client.get(f"{url}{revision.id}/")
+        self.assertEqual(response.data["content"], self.contents[revision.pk])
+
+        with self.assertNumQueries(6):
+            self.client.get(url, {"page_size": 12})
+
+    def test_content_rebuilt_on_read(self):
+        """Loading compacted revisions costs no query per revision, only reading one back does"""
+        self.compact("--interval", "5")
+        with self.assertNumQueries(1):
+            revisions = list(ArticleRevision.objects.filter(article=self.article).order_by("revision_number"))
+        with self.assertNumQueries(1):
+            self.assertEqual(revisions[1].content, self.contents[revisions[1].pk])
+        with self.assertNumQueries(0):
+            self.assertEqual(revisions[1].content, self.contents[revisions[1].pk])
+            self.assertEqual(revisions[0].content, self.contents[revisions[0].pk])
+
+    def test_benchmark(self):
+        """The benchmark times reads from the database and reports the bytes stored, leaving nothing behind"""
+        revisions = ArticleRevision.objects.count()
+        output = io.StringIO()
+        call_command("benchmarkapi", "deltas", size=25, number=1, stdout=output)
+        self.assertRegex(output.getvalue(), r"whole .* bytes")
+        self.assertRegex(output.getvalue(), r"deltas .* bytes")
+        self.assertEqual(ArticleRevision.objects.count(), revisions)
+
+    def test_requires_setting(self):
+        with override_settings(WIKI_API_REVISION_DELTAS=False):
+            with self.assertRaises(CommandError):
+                self.compact()
+
+
+class APIRevisionCreateTest(APITest):
+    fixtures = ["1-content-types.yaml", "2-permissions.yaml", "3-groups.yaml", "4-users.yaml", "5-articles.yaml"]
+
+    def setUp(self):
+        super().setUp()
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        self.article = URLPath.objects.filter(level=0).first().article
+        self.body = {"title": "Edited", "content": "Edited content", "user_message": "Bot edit"}
+
+    def post(self, **headers):
+        return self.client.post(
+            f"/api/articles/{self.article.id}/revisions/", data=self.body, content_type="application/json", **headers
+        )
+
+    # ###
+    # ### Begin tests for POST '/api/articles/{article_id}/revisions/'
+    # ###
+
+    def test_create_revision(self):
+        previous = self.article.current_revision
+        response = self.post()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        self.article.refresh_from_db()
+        revision = self.article.current_revision
+        self.assertEqual(response.data["id"], self.article.id)
+        self.assertEqual(response.data["current_revision"]["id"], revision.id)
+        self.assertEqual(revision.previous_revision_id, previous.id)
+        self.assertEqual(revision.revision_number, previous.revision_number + 1)
+        self.assertEqual((revision.title, revision.content, revision.user), ("Edited", "Edited content", self.user))
+
+    def test_create_revision_invalid(self):
+        self.body = {"content": "No title"}
+        self.assertEqual(self.post().status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_create_revision_not_found(self):
+        response = self.client.post("/api/articles/999/revisions/", data=self.body, content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_create_revision_if_match(self):
+        current = self.article.current_revision_id
+        self.assertEqual(self.post(HTTP_IF_MATCH=f'"{current}"').status_code, status.HTTP_201_CREATED)
+
+        # The client still thinks `current` is the latest
+        revisions = ArticleRevision.objects.filter(article=self.article).count()
+        response = self.post(HTTP_IF_MATCH=f'"{current}"')
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.article.refresh_from_db()
+        self.assertEqual(response.data["current_revision"], self.article.current_revision_id)
+        self.assertEqual(ArticleRevision.objects.filter(article=self.article).count(), revisions)
+
+        latest = self.article.current_revision_id
+        self.assertEqual(self.post(HTTP_IF_MATCH=f'W/"{latest}"').status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertEqual(self.post(HTTP_IF_MATCH=f'"1", "{latest}"').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.post(HTTP_IF_MATCH="*").status_code, status.HTTP_201_CREATED)
+
+    def test_article_update_if_match(self):
+        url = f"/api/articles/{self.article.id}/"
+        stale = f'"{self.article.current_revision_id}"'
+        response = self.client.put(url, data=self.body, content_type="application/json", HTTP_IF_MATCH=stale)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["current_revision"]["title"], "Edited")
+
+        response = self.client.put(url, data=self.body, content_type="application/json", HTTP_IF_MATCH=stale)
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+
+    def test_article_update_etag(self):
+        """The ETag of a GET is accepted as the If-Match of an edit based on it"""
+        url = f"/api/articles/{self.article.id}/"
+        etag = self.client.get(url)["ETag"]
+        self.assertTrue(etag.startswith(f'"rev-{self.article.current_revision_id}-'))
+
+        response = self.client.put(url, data=self.body, content_type="application/json", HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(self.client.get(url)["ETag"], etag)
+
+        response = self.client.put(url, data=self.body, content_type="application/json", HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+
+    def test_article_update_if_match_invalid(self):
+        url = f"/api/articles/{self.article.id}/"
+        for if_match in ('"abc"', "rev-", f'"{self.article.current_revision_id}", "nope"'):
+            response = self.client.put(url, data=self.body, content_type="application/json", HTTP_IF_MATCH=if_match)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, if_match)
+        self.assertEqual(ArticleRevision.objects.filter(article=self.article).count(), 1)
+
+    def test_concurrent_edit(self):
+        """An edit that lost the race follows the winning revision, or conflicts when it named the one it expected"""
+        stale = Article.objects.select_related("current_revision").get(pk=self.article.pk)
+        loaded = stale.current_revision_id
+        request = RequestFactory().post("/")
+        request.user = self.user
+        winner = create_revision(
+            Article.objects.get(pk=self.article.pk), {"title": "Winner", "content": "First"}, request
+        )
+
+        with self.assertRaises(RevisionConflict):
+            create_revision(stale, {"title": "Loser", "content": "Second"}, request, expected={loaded})
+
+        revision = create_revision(stale, {"title": "Follower", "content": "Second"}, request)
+        self.assertEqual(revision.previous_revision_id, winner.id)
+        self.assertEqual(revision.revision_number, winner.revision_number + 1)
+        self.assertEqual(Article.objects.get(pk=self.article.pk).current_revision_id, revision.id)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ASGIStreamingTest(APITest):
+    """Under ASGI streamed bodies are async iterators, so they are sent as they are produced instead of buffered"""
+
+    fixtures = ["1-content-types.yaml", "2-permissions.yaml", "3-groups.yaml", "4-users.yaml", "5-articles.yaml"]
+
+    content = b"0123456789" * 10000
+
+    def setUp(self):
+        super().setUp()
+        article = URLPath.objects.filter(level=1).first().article
+        attachment = Attachment(article=article, original_filename="file.txt")
+        attachment.save()
+        attachment.articles.add(article)
+        revision = AttachmentRevision(attachment=attachment, user=self.user)
+        revision.file.save("file.txt", ContentFile(self.content), save=False)
+        revision.save()
+        self.download_url = f"/api/articles/{article.id}/attachments/{attachment.id}/download/"
+
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        self.async_client = AsyncClient()
+        self.async_client.cookies = self.client.cookies
+
+    async def stream(self, url, **headers):
+        response = await self.async_client.get(url, headers={"Accept": "*/*", **headers})
+        self.assertTrue(response.is_async)
+        return response, b"".join([chunk async for chunk in response.streaming_content])
+
+    async def test_download(self):
+        response, content = await self.stream(self.download_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(content, self.content)
+        self.assertEqual(int(response["Content-Length"]), len(self.content))
+
+    async def test_download_ranges(self):
+        response, content = await self.stream(self.download_url, Range="bytes=70000-70004")
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(content, b"01234")
+
+        response, content = await self.stream(self.download_url, Range="bytes=0-1,-2")
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(len(content), int(response["Content-Length"]))
+        self.assertIn(b"Content-Range: bytes 99998-99999/100000\r\n\r\n89\r\n", content)
+
+    async def test_export(self):
+        response, content = await self.stream("/api/export/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        records = [json.loads(line) for line in content.decode().splitlines()]
+        self.assertTrue(any(record["type"] == "attachment" for record in records))
+
+    def test_aiter_sync(self):
+        async def collect():
+            return [chunk async for chunk in aiter_sync(iter([b"ab", b"", b"cd", b"ef"]), size=3)]
+
+        self.assertEqual(async_to_sync(collect)(), [b"abcd", b"ef"])
+
+
+class CacheConfigTest(TestCase):
+    def test_cache_from_url(self):
+        self.assertEqual(cache_from_url("locmem://")["LOCATION"], "wiki")
+        config = cache_from_url("file:///config/cache?max_entries=500", 60, "wiki")
+        self.assertEqual(config["BACKEND"], "django.core.cache.backends.filebased.FileBasedCache")
+        self.assertEqual((config["LOCATION"], config["TIMEOUT"], config["KEY_PREFIX"]), ("/config/cache", 60, "wiki"))
+        self.assertEqual(config["OPTIONS"], {"MAX_ENTRIES": 500})
+        self.assertEqual(cache_from_url("memcached://a:11211,b:11211")["LOCATION"], ["a:11211", "b:11211"])
+        self.assertEqual(cache_from_url("redis://cache:6379/1")["LOCATION"], "redis://cache:6379/1")
+
+        for url in ("postgres://db", "redis://cache:6379/1?max_entries=5", "locmem://?timeout=5"):
+            with self.assertRaises(ValueError):
+                cache_from_url(url)
+
+
+class ProcessViewMiddleware:
+    """Records the paths of the views it runs before"""
+
+    views = []
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        self.views.append(request.path)
+
+
+@override_settings(WIKI_PAGE_CACHE_TIMEOUT=60, MEDIA_ROOT=tempfile.mkdtemp())
+class WikiPageCacheTest(APITest):
+    fixtures = ["1-content-types.yaml", "2-permissions.yaml", "3-groups.yaml", "4-users.yaml", "5-articles.yaml"]
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.urlpath = URLPath.objects.filter(level=1).first()
+        self.url = reverse("wiki:get", kwargs={"path": self.urlpath.path})
+        caches["default"].clear()
+        for counter in COUNTERS.values():
+            counter.reset()
+
+    def get(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_anonymous(self):
+        first = self.get()
+        self.assertEqual(self.get().content, first.content)
+        self.assertEqual(COUNTERS["pages"].stats(), {"hits": 1, "misses": 1, "hit_rate": 0.5})
+
+        # A new revision is a new page
+        request = RequestFactory().get("/")
+        request.user = self.user
+        create_revision(self.urlpath.article, {"content": "Changed"}, request)
+        self.assertIn(b"Changed", self.get().content)
+        self.assertEqual(COUNTERS["pages"].stats()["misses"], 2)
+
+    def test_children_and_attachments(self):
+        """Pages list their children and attachments, which change without touching the article"""
+        self.get()
+        URLPath.create_urlpath(parent=self.urlpath, slug="child", title="Child", content="", user=self.user)
+        self.assertIn(b"Child", self.get().content)
+        self.assertEqual(COUNTERS["pages"].stats(), {"hits": 0, "misses": 2, "hit_rate": 0.0})
+
+        self.get()
+        attachment = Attachment.objects.create(article=self.urlpath.article, original_filename="notes.txt")
+        attachment.articles.add(self.urlpath.article)
+        AttachmentRevision.objects.create(attachment=attachment, file=ContentFile(b"notes", name="notes.txt"))
+        self.get()
+        self.assertEqual(COUNTERS["pages"].stats()["misses"], 3)
+
+        # Lost with the rest of the cache, the version starts again past where it was
+        caches["default"].delete(PAGE_VERSION_KEY)
+        self.get()
+        self.get()
+        self.assertEqual(COUNTERS["pages"].stats(), {"hits": 2, "misses": 4, "hit_rate": 0.3333})
+
+    def test_hit_queries(self):
+        """A hit only checks the article is still at the revision the page was stored with"""
+        self.get()
+        with self.assertNumQueries(1):
+            self.get()
+        self.assertEqual(COUNTERS["pages"].stats()["hits"], 1)
+
+    def test_middleware_after_cache(self):
+        """Pages are rendered through the rest of the middleware, which does not run for hits"""
+        ProcessViewMiddleware.views.clear()
+        with override_settings(MIDDLEWARE=settings.MIDDLEWARE + ["wiki_api.tests.ProcessViewMiddleware"]):
+            self.get()
+            self.get()
+        self.assertEqual(ProcessViewMiddleware.views, [self.url])
+
+    def test_counts_added_in_batches(self):
+        counter = CacheCounter("test", flush_every=3)
+        self.addCleanup(counter.reset)
+        counter.hit()
+        counter.miss()
+        self.assertIsNone(caches["default"].get("cache-stats-test-hits"))
+        self.assertEqual(counter.stats(), {"hits": 1, "misses": 1, "hit_rate": 0.5})
+
+        counter.hit()
+        self.assertEqual(caches["default"].get("cache-stats-test-hits"), 2)
+        self.assertEqual(caches["default"].get("cache-stats-test-misses"), 1)
+        self.assertEqual(counter.stats(), {"hits": 2, "misses": 1, "hit_rate": 0.6667})
+
+    def test_editors_not_cached(self):
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        self.get()
+        self.get()
+        self.assertEqual(COUNTERS["pages"].stats()["hits"], 0)
+
+    def test_read_only_user(self):
+        article = self.urlpath.article
+        article.other_write = False
+        article.save()
+        User.objects.create_user(username="reader", password="reader")
+        self.assertTrue(self.client.login(username="reader", password="reader"))
+        self.assertIn(b"reader", self.get().content)
+        self.get()
+        self.assertEqual(COUNTERS["pages"].stats()["hits"], 1)
+
+        # Pages of one reader are not served to another, or to anonymous readers
+        self.client.logout()
+        self.assertNotIn(b"reader", self.get().content)
+        self.assertEqual(COUNTERS["pages"].stats()["hits"], 1)
+
+    @override_settings(WIKI_PAGE_CACHE_TIMEOUT=0)
+    def test_disabled(self):
+        self.get()
+        self.get()
+        self.assertEqual(COUNTERS["pages"].stats()["misses"], 0)
+
+    def test_stats(self):
+        self.get()
+        self.get()
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        response = self.client.get("/api/cache/", headers={"Accept": "application/json"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["pages"], {"hits": 1, "misses": 1, "hit_rate": 0.5})
+        self.assertEqual(set(response.data), set(COUNTERS))
+
+        response = self.client.delete("/api/cache/", headers={"Accept": "application/json"})
+        self.assertEqual(response.data["pages"]["hits"], 0)
+
+        User.objects.create_user(username="reader", password="reader")
+        self.assertTrue(self.client.login(username="reader", password="reader"))
+        response = self.client.get("/api/cache/", headers={"Accept": "application/json"})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class SQLiteTuningTest(TestCase):
+    def test_connection_pragmas(self):
+        """Every connection the wiki opens is tuned"""
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute("PRAGMA cache_size")
+            self.assertEqual(cursor.fetchone()[0], -64 * 1024)
+
+    def test_wal(self):
+        with tempfile.TemporaryDirectory() as directory:
+            database = sqlite3.connect(os.path.join(directory, "db.sqlite3"))
+            apply_sqlite_pragmas(database, {"journal_mode": "WAL", "synchronous": "NORMAL"})
+            self.assertEqual(database.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            self.assertEqual(database.execute("PRAGMA synchronous").fetchone()[0], 1)
+            database.close()
+
+    def test_benchmark(self):
+        output = io.StringIO()
+        call_command("benchmarkapi", "sqlite", size=5, number=2, stdout=output)
+        self.assertIn("rollback", output.getvalue())
+        self.assertIn("tuned", output.getvalue())
+
+
+class CopyDatabaseTest(APITest):
+    fixtures = ["1-content-types.yaml", "2-permissions.yaml", "3-groups.yaml", "4-users.yaml", "5-articles.yaml"]
+
+    def test_database_from_url(self):
+        self.assertEqual(
+            database_from_url("postgres://wiki:p%40ss@db:5433/wiki?sslmode=require"),
+            {
+                "ENGINE": "django.db.backends.postgresql",
+                "NAME": "wiki",
+                "USER": "wiki",
+                "PASSWORD": "p@ss",
+                "HOST": "db",
+                "PORT": "5433",
+                "OPTIONS": {"sslmode": "require"},
+            },
+        )
+        self.assertEqual(database_from_url("sqlite:////config/db/db.sqlite3")["NAME"], "/config/db/db.sqlite3")
+        with self.assertRaises(ValueError):
+            database_from_url("mysql://db/wiki")
+
+    def remove_source(self):
+        # The test case puts back every database it knows of when it ends, which this one must not be among
+        connections[SOURCE_ALIAS].close()
+        del connections[SOURCE_ALIAS]
+        del connections.settings[SOURCE_ALIAS]
+
+    def test_copy(self):
+        """The target ends up with exactly the rows of the source, and new rows get fresh keys"""
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, "db.sqlite3")
+            add_sqlite_database(SOURCE_ALIAS, source)
+            self.addCleanup(self.remove_source)
+            call_command("migrate", database=SOURCE_ALIAS, verbosity=0)
+            call_command("loaddata", *self.fixtures, database=SOURCE_ALIAS, verbosity=0)
+            revision = ArticleRevision.objects.using(SOURCE_ALIAS).first()
+            RevisionDelta.objects.using(SOURCE_ALIAS).create(revision=revision, base=revision, delta=b"\x00\x01")
+
+            User.objects.create_user(username="only-in-target")
+            Article.objects.update(other_read=False)
+
+            output = io.StringIO()
+            call_command("copydatabase", source, interactive=False, batch_size=2, stdout=output)
+            self.assertIn("Copied", output.getvalue())
+
+            for model in (User, Group, Article, ArticleRevision, URLPath, RevisionDelta):
+                self.assertEqual(
+                    list(model.objects.order_by("pk").values()),
+                    list(model.objects.using(SOURCE_ALIAS).order_by("pk").values()),
+                )
+
+        self.assertFalse(User.objects.filter(username="only-in-target").exists())
+        self.assertEqual(bytes(RevisionDelta.objects.get().delta), b"\x00\x01")
+        self.assertGreater(User.objects.create_user(username="new").pk, 5)
+
+    def test_copy_missing_source(self):
+        with self.assertRaises(CommandError):
+            call_command("copydatabase", "/nonexistent/db.sqlite3", interactive=False)
+
+
+@override_settings(
+    WIKI_DB_REPLICAS=["replica"],
+    DATABASE_ROUTERS=["the_wiki.routers.ReplicaRouter"],
+    MIDDLEWARE=["django.contrib.sessions.middleware.SessionMiddleware", "the_wiki.middleware.ReplicaMiddleware"]
+    + [name for name in settings.MIDDLEWARE if name != "django.contrib.sessions.middleware.SessionMiddleware"],
+)
+class ReplicaRouterTest(APITest):
+    """Replica reads are routed to the default database under test, `pick_replica` is what tells them apart"""
+
+    fixtures = ["1-content-types.yaml", "2-permissions.yaml", "3-groups.yaml", "4-users.yaml", "5-articles.yaml"]
+
+    def setUp(self):
+        super().setUp()
+        routers.unavailable.clear()
+        self.real_pick_replica = routers.ReplicaRouter.pick_replica
+        patcher = mock.patch.object(routers.ReplicaRouter, "pick_replica", return_value="default")
+        self.pick_replica = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.router = routers.ReplicaRouter()
+
+    def test_router(self):
+        self.assertEqual(self.router.db_for_read(Article), "default")
+        self.pick_replica.assert_not_called()
+
+        with routers.reading_from_replicas():
+            self.router.db_for_read(Article)
+            self.router.db_for_read(ArticleRevision)
+            self.pick_replica.assert_called_once()
+            self.assertEqual(self.router.db_for_read(Session), "default")
+
+        self.pick_replica.reset_mock()
+        with routers.reading_from_replicas() as state:
+            self.assertEqual(self.router.db_for_write(Article), "default")
+            self.assertTrue(state.wrote)
+            self.router.db_for_read(Article)
+        with routers.reading_from_replicas(allowed=False):
+            self.router.db_for_read(Article)
+        self.pick_replica.assert_not_called()
+        self.assertFalse(self.router.allow_migrate("replica", "wiki"))
+
+    def test_unavailable_replica(self):
+        down = mock.Mock(**{"ensure_connection.side_effect": OperationalError})
+        up = mock.Mock()
+        with override_settings(WIKI_DB_REPLICAS=["down", "up"]), mock.patch.object(
+            routers, "connections", {"down": down, "up": up}
+        ):
+            for _ in range(5):
+                self.assertEqual(self.real_pick_replica(self.router), "up")
+            # Skipped once it failed
+            self.assertLessEqual(down.ensure_connection.call_count, 1)
+
+            up.ensure_connection.side_effect = OperationalError
+            self.assertIsNone(self.real_pick_replica(self.router))
+            self.assertEqual(set(routers.unavailable), {"down", "up"})
+
+    def test_requests(self):
+        self.assertTrue(self.client.login(username=self.admin_username, password=self.admin_password))
+        article = URLPath.objects.filter(level=0).first().article
+        self.assertEqual(self.client.get("/api/articles/").status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(reverse("wiki:get", kwargs={"path": ""})).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.pick_replica.call_count, 2)
+
+        # Writing pins the session to the primary for a while
+        self.pick_replica.reset_mock()
+        response = self.client.post(
+            f"/api/articles/{article.id}/revisions/",
+            data={"title": "Edited", "content": "Edited"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.client.get("/api/articles/")
+        self.pick_replica.assert_not_called()
+
+        session = self.client.session
+        session["wiki_db_primary_until"] = 0
+        session.save()
+        self.client.get("/api/articles/")
+        self.pick_replica.assert_called_once()
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class HealthCheckTest(TestCase):
+    def setUp(self):
+        health.readiness.reset()
+        self.addCleanup(health.readiness.reset)
+
+    def test_live(self):
+        for path in ("/health", "/health/live"):
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.content, b"ok")
+
+    def test_ready(self):
+        response = self.client.get("/health/ready")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        report = response.json()
+        self.assertTrue(report["ok"])
+        self.assertEqual(set(report["checks"]), {"database", "cache", "media", "migrations"})
+        self.assertTrue(all(check["ok"] and check["ms"] >= 0 for check in report["checks"].values()))
+
+    def test_not_ready(self):
+        with override_settings(MEDIA_ROOT="/nonexistent/media"):
+            response = self.client.get("/health/ready")
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        report = response.json()
+        self.assertFalse(report["ok"])
+        self.assertFalse(report["checks"]["media"]["ok"])
+        self.assertIn("error", report["checks"]["media"])
+        self.assertTrue(report["checks"]["database"]["ok"])
+
+    @override_settings(WIKI_HEALTH_READY_INTERVAL=60)
+    def test_ready_reused(self):
+        """The checks run once per interval, not once per request"""
+        check = mock.Mock()
+        with mock.patch.dict(health.CHECKS, {"database": check}):
+            for _ in range(3):
+                self.assertEqual(self.client.get("/health/ready").status_code, status.HTTP_200_OK)
+            check.assert_called_once()
+
+            with override_settings(WIKI_HEALTH_READY_INTERVAL=0):
+                self.client.get("/health/ready")
+            self.assertEqual(check.call_count, 2)
@@ -0,0 +1,187 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Q, QuerySet
+from wiki.conf import settings as wiki_settings
+from wiki.models import URLPath
+
+from wiki_api.models import TreeVersion
+
+
+PATH_INDEX_SIZE = getattr(settings, "WIKI_API_PATH_INDEX_SIZE", 10000)
+
+# (URL path id, path as stored) of a resolved path, or None when nothing is there
+Resolved = Optional[Tuple[int, str]]
+
+
+def ancestors_filter(node: URLPath, include_self: bool = False) -> Q:
+    """The MPTT range holding every ancestor of `node`"""
+    if include_self:
+        return Q(tree_id=node.tree_id, lft__lte=node.lft, rght__gte=node.rght)
+    return Q(tree_id=node.tree_id, lft__lt=node.lft, rght__gt=node.rght)
+
+
+def descendants_filter(node: URLPath, depth: Optional[int] = None) -> Q:
+    """The MPTT range holding every descendant of `node`, down to `depth` levels below it"""
+    descendants = Q(tree_id=node.tree_id, lft__gt=node.lft, rght__lt=node.rght)
+    if depth is not None:
+        descendants &= Q(level__lte=node.level + depth)
+    return descendants
+
+
+def get_subtree(queryset: QuerySet, node: URLPath, depth: Optional[int] = None) -> List[URLPath]:
+    """
+    The descendants of `node` in tree order, each with its `tree_path` set. The ancestors needed to build the paths
+    come back in the same query and are left out of the result
+    """
+    rows = list(queryset.filter(ancestors_filter(node, include_self=True) | descendants_filter(node, depth)))
+    set_tree_paths(rows)
+    return [row for row in rows if row.level > node.level]
+
+
+def get_ancestors(queryset: QuerySet, node: URLPath) -> List[URLPath]:
+    """The ancestors of `node` from the root down, each with its `tree_path` set"""
+    rows = list(queryset.filter(ancestors_filter(node)))
+    set_tree_paths(rows)
+    return rows
+
+
+def set_tree_paths(rows: List[URLPath]):
+    """
+    Set `tree_path` on every row from a stack of ancestors. `rows` must be in (tree_id, lft) order and include the
+    ancestors of every row, which is what the MPTT range queries above return. Paths match `URLPath.path`
+    """
+    rows.sort(key=lambda row: (row.tree_id, row.lft))
+    ancestors: List[str] = []
+    for row in rows:
+        del ancestors[row.level :]
+        ancestors.append(row.slug or "")
+        row.tree_path = "".join(f"{slug}/" for slug in ancestors[1:])
+
+
+def attach_tree_paths(urlpaths: List[URLPath]):
+    """
+    Set `tree_path` on URL paths from anywhere in the tree, such as a page of a list. Their ancestors are loaded a
+    level at a time by parent id, so it costs at most one query per level of the tree and only ever loads the
+    ancestors of the page, however large the wiki is
+    """
+    nodes: Dict[int, URLPath] = {urlpath.pk: urlpath for urlpath in urlpaths}
+    missing = {urlpath.parent_id for urlpath in urlpaths} - nodes.keys() - {None}
+    while missing:
+        parents = list(URLPath.objects.filter(pk__in=missing).only("parent", "slug"))
+        nodes.update((parent.pk, parent) for parent in parents)
+        missing = {parent.parent_id for parent in parents} - nodes.keys() - {None}
+
+    paths: Dict[int, str] = {}
+
+    def get_path(node: URLPath) -> str:
+        # Matches `URLPath.path`: the slugs below the root, each followed by a slash
+        if node.pk not in paths:
+            parent = nodes.get(node.parent_id)
+            paths[node.pk] = "" if parent is None else f"{get_path(parent)}{node.slug or ''}/"
+        return paths[node.pk]
+
+    for urlpath in urlpaths:
+        urlpath.tree_path = get_path(urlpath)
+
+
+def nest(records: List[dict], key: str = "id", parent_key: str = "parent") -> List[dict]:
+    """Turn a flat list of records in tree order into nested `children` lists"""
+    by_id: Dict[int, dict] = {}
+    roots = []
+    for record in records:
+        record["children"] = []
+        by_id[record[key]] = record
+        parent = by_id.get(record[parent_key])
+        if parent is None:
+            roots.append(record)
+        else:
+            parent["children"].append(record)
+    return roots
+
+
+def split_path(path: str) -> Tuple[str, ...]:
+    """The slugs of a wiki path, with or without its leading and trailing slashes"""
+    slugs = tuple(slug for slug in path.strip("/").split("/") if slug)
+    if not wiki_settings.URL_CASE_SENSITIVE:
+        slugs = tuple(slug.lower() for slug in slugs)
+    return slugs
+
+
+class PathIndex:
+    """
+    Wiki paths mapped to URL path ids, held in process for the current tree version. Every resolve checks the version
+    with a primary key lookup and the index is emptied when the tree has changed since, so creating, moving or deleting
+    a URL path in any worker is seen by all of them.
+
+    A path missing from the index is walked one indexed (parent, slug) lookup per level, starting from the longest
+    prefix already known, and every prefix on the way is remembered. The least recently used paths are dropped once
+    the index holds `size` of them
+    """
+
+    def __init__(self, size: int = PATH_INDEX_SIZE):
+        self.size = size
+        self.version = None
+        self.paths: "OrderedDict[Tuple[int, Tuple[str, ...]], Resolved]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key) -> Optional[Tuple[Resolved]]:
+        """The cached value wrapped in a tuple, as None is cached for missing paths, or None when not cached"""
+        with self.lock:
+            if key not in self.paths:
+                return None
+            self.paths.move_to_end(key)
+            return (self.paths[key],)
+
+    def set(self, key, value: Resolved, version: int):
+        with self.lock:
+            if version != self.version:
+                return
+            self.paths[key] = value
+            self.paths.move_to_end(key)
+            while len(self.paths) > self.size:
+                self.paths.popitem(last=False)
+
+    def check_version(self) -> int:
+        version = TreeVersion.current()
+        with self.lock:
+            if version != self.version:
+                self.paths.clear()
+                self.version = version
+        return version
+
+    def resolve(self, site, path: str) -> Resolved:
+        """The id and stored path of the URL path at `path` on `site`, or None"""
+        version = self.check_version()
+        slugs = split_path(path)
+
+        depth = len(slugs)
+        while depth >= 0:
+            found = self.get((site.id, slugs[:depth]))
+            if found is not None:
+                resolved = found[0]
+                break
+            depth -= 1
+        else:
+            root = URLPath.objects.filter(site=site, parent=None).values_list("id", flat=True).first()
+            resolved = (root, "") if root is not None else None
+            depth = 0
+            self.set((site.id, ()), resolved, version)
+
+        lookup = "slug" if wiki_settings.URL_CASE_SENSITIVE else "slug__iexact"
+        while resolved is not None and depth < len(slugs):
+            child = (
+                URLPath.objects.filter(parent_id=resolved[0], **{lookup: slugs[depth]})
+                .values_list("id", "slug")
+                .first()
+            )
+            depth += 1
+            resolved = (child[0], f"{resolved[1]}{child[1]}/") if child else None
+            self.set((site.id, slugs[:depth]), resolved, version)
+
+        return resolved
+
+
+path_index = PathIndex()
@@ -1,4 +1,4 @@
-from typing import Optional, TypedDict
+from typing import Any, List, Optional, Tuple, TypedDict
 
 
 CreateArticleBodyPermission = TypedDict(
@@ -29,3 +29,52 @@ CreateArticleBody = TypedDict(
 CreateRevisionBody = TypedDict(
     "CreateRevisionBody", {"title": str, "content": str, "user_message": Optional[str]}, total=False
 )
+
+BulkCreateArticleBody = TypedDict(
+    "BulkCreateArticleBody",
+    {
+        "ref": Optional[str],
+        "parent": Optional[int],
+        "parent_ref": Optional[str],
+        "title": str,
+        "slug": Optional[str],
+        "content": str,
+        "summary": Optional[str],
+        "permissions": CreateArticleBodyPermission,
+        # Resolved while validating the batch
+        "parent_object": Any,
+        "group_object": Any,
+    },
+    total=False,
+)
+
+BulkCreateArticleResult = TypedDict(
+    "BulkCreateArticleResult",
+    {
+        "index": int,
+        "ref": Optional[str],
+        "status": int,
+        "urlpath": int,
+        "article": dict,
+        "errors": Any,
+    },
+    total=False,
+)
+
+ImportEntry = TypedDict(
+    "ImportEntry",
+    {
+        # Slugs from the import parent down to this article
+        "path": Tuple[str, ...],
+        # Names of the files in the import source, None for directories without an index
+        "markdown": Optional[str],
+        "metadata": Optional[str],
+    },
+)
+
+DiffLine = TypedDict("DiffLine", {"type": str, "content": str})
+
+DiffHunk = TypedDict(
+    "DiffHunk",
+    {"old_start": int, "old_lines": int, "new_start": int, "new_lines": int, "lines": List[DiffLine]},
+)
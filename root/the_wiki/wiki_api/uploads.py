@@ -0,0 +1,174 @@
+import fcntl
+import hashlib
+import os
+import re
+from datetime import timedelta
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from wiki.plugins.attachments.models import Attachment, AttachmentRevision
+
+from wiki_api.models import UploadSession
+
+
+UPLOAD_MAX_SIZE = getattr(settings, "WIKI_API_UPLOAD_MAX_SIZE", 1024**3)
+# Seconds a session can go without a chunk before it is treated as abandoned
+UPLOAD_EXPIRY = getattr(settings, "WIKI_API_UPLOAD_EXPIRY", 60 * 60 * 24)
+# Size of the pieces a chunk is copied from the request to the spool file in
+STREAM_CHUNK_SIZE = 64 * 1024
+
+CONTENT_RANGE_RE = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+
+
+class UploadError(Exception):
+    pass
+
+
+class UploadConflict(UploadError):
+    """The chunk does not start where the upload stopped"""
+
+
+class SpooledFile(File):
+    """
+    A completed spool file. Exposing its path lets `FileSystemStorage` move it into place instead of copying it, the
+    same way it handles Django's own temporary uploads
+    """
+
+    def temporary_file_path(self) -> str:
+        return self.file.name
+
+
+def create_spool_file(session: UploadSession):
+    os.makedirs(os.path.dirname(session.spool_path), exist_ok=True)
+    open(session.spool_path, "wb").close()
+
+
+def delete_spool_file(session: UploadSession):
+    try:
+        os.remove(session.spool_path)
+    except FileNotFoundError:
+        pass
+
+
+def expire_sessions() -> int:
+    """
+    Delete the sessions that have not had a chunk in `UPLOAD_EXPIRY` seconds, and their spool files, along with any
+    spool file as old whose session went with its article or attachment. Returns the number of files removed
+    """
+    cutoff = timezone.now() - timedelta(seconds=UPLOAD_EXPIRY)
+    expired = UploadSession.objects.filter(modified__lt=cutoff)
+    sessions = list(expired.only("pk"))
+    expired.delete()
+
+    paths = {session.spool_path for session in sessions}
+    spool_dir = getattr(settings, "WIKI_API_UPLOAD_SPOOL_PATH", "/config/uploads")
+    try:
+        live = {f"{pk}.part" for pk in UploadSession.objects.values_list("pk", flat=True)}
+        for entry in os.scandir(spool_dir):
+            if entry.name.endswith(".part") and entry.name not in live and entry.stat().st_mtime < cutoff.timestamp():
+                paths.add(entry.path)
+    except FileNotFoundError:
+        pass
+
+    removed = 0
+    for path in paths:
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def parse_content_range(header: Optional[str], session: UploadSession) -> Tuple[int, int]:
+    """The first byte and length of a chunk from its `Content-Range: bytes <first>-<last>/<size>` header"""
+    match = CONTENT_RANGE_RE.match(header or "")
+    if not match:
+        raise UploadError("A Content-Range header of the form 'bytes <first>-<last>/<size>' is required")
+
+    first, last, size = map(int, match.groups())
+    if size != session.size:
+        raise UploadError(f"The upload is {session.size} bytes, not {size}")
+    if last < first or last >= size:
+        raise UploadError("Content-Range is outside the upload")
+    if first != session.offset:
+        raise UploadConflict(f"Expected a chunk starting at byte {session.offset}")
+    return first, last - first + 1
+
+
+def write_chunk(session: UploadSession, stream, first: int, length: int) -> int:
+    """
+    Copy `length` bytes from `stream` into the spool file at `first`, a piece at a time. Whatever arrived is kept even
+    if the client goes away part way, so the next chunk can pick up from there. Returns the number of bytes written
+
+    The spool file is locked from checking the offset until the new one is saved, so of two requests sending the same
+    chunk, one writes it and the other is refused without touching the file
+    """
+    written = 0
+    with open(session.spool_path, "r+b") as spool:
+        try:
+            fcntl.flock(spool, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadConflict("Another chunk is being written to this upload")
+
+        offset = UploadSession.objects.filter(pk=session.pk).values_list("offset", flat=True).first()
+        if offset != first:
+            session.offset = session.offset if offset is None else offset
+            raise UploadConflict(f"Expected a chunk starting at byte {session.offset}")
+
+        spool.seek(first)
+        while written < length:
+            data = stream.read(min(STREAM_CHUNK_SIZE, length - written)) if stream else b""
+            if not data:
+                break
+            spool.write(data)
+            written += len(data)
+        # Drop anything left behind by an earlier, interrupted attempt at this chunk
+        spool.truncate()
+        # `modified` is what keeps a slow upload from expiring
+        UploadSession.objects.filter(pk=session.pk).update(offset=first + written, modified=timezone.now())
+
+    session.offset = first + written
+    return written
+
+
+def file_checksum(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as file:
+        for data in iter(lambda: file.read(STREAM_CHUNK_SIZE), b""):
+            sha256.update(data)
+    return sha256.hexdigest()
+
+
+def complete_upload(session: UploadSession, request) -> AttachmentRevision:
+    """Check the spooled file is whole and turn it into a new revision of the session's attachment"""
+    if session.offset != session.size:
+        raise UploadError(f"Only {session.offset} of {session.size} bytes have been uploaded")
+    if session.checksum and file_checksum(session.spool_path) != session.checksum.lower():
+        raise UploadError("The checksum of the uploaded file does not match")
+
+    spool_path = session.spool_path
+    with transaction.atomic():
+        attachment = session.attachment
+        if attachment is None:
+            attachment = Attachment(article=session.article, original_filename=session.filename)
+            attachment.save()
+            attachment.articles.add(session.article)
+
+        revision = AttachmentRevision(attachment=attachment, description=session.description)
+        revision.set_from_request(request)
+        with open(spool_path, "rb") as spool:
+            revision.file.save(session.filename, SpooledFile(spool), save=False)
+        revision.save()
+        if attachment.current_revision_id != revision.id:
+            attachment.current_revision = revision
+            attachment.save()
+        session.delete()
+
+    # Storage on the local filesystem has moved the spool file into place already
+    if os.path.exists(spool_path):
+        os.remove(spool_path)
+    return revision
@@ -14,6 +14,7 @@ router.register(r"groups", views.GroupViewSet)
 # one
 router.register(r"articles", views.ArticleViewSet, basename="articles")
 router.register(r"urls", views.URLViewSet, basename="urlpaths")
+router.register(r"uploads", views.UploadSessionViewSet, basename="uploads")
 
 articles_router = routers.NestedDefaultRouter(router, r"articles", lookup="articles")
 articles_router.register(r"revisions", views.ArticleRevisionViewSet, basename="articlerevisions")
@@ -26,4 +27,7 @@ urlpatterns = [
     path(r"", include(router.urls)),
     path(r"", include(articles_router.urls)),
     path(r"", include(attachments_router.urls)),
+    path(r"cache/", views.CacheStatsView.as_view(), name="cache"),
+    path(r"export/", views.ExportView.as_view(), name="export"),
+    path(r"search/", views.SearchView.as_view(), name="search"),
 ]
@@ -1,5 +1,9 @@
 from .articles import ArticleViewSet, ArticleRevisionViewSet  # noqa E402
 from .attachments import AttachmentViewSet, AttachmentRevisionViewSet  # noqa E402
+from .cache import CacheStatsView  # noqa E402
+from .export import ExportView  # noqa E402
 from .groups import GroupViewSet  # noqa E402
+from .search import SearchView  # noqa E402
 from .urls import URLViewSet  # noqa E402
+from .uploads import UploadSessionViewSet  # noqa E402
 from .users import UserViewSet  # noqa E402
@@ -1,12 +1,14 @@
 from typing import Optional
 
 from django.db import IntegrityError
+from django.db.models import Count, Max
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from django.utils.text import slugify
 from rest_framework import viewsets, mixins, permissions, status
 from rest_framework.decorators import action
 from rest_framework.exceptions import ParseError
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from rest_framework.views import exception_handler
 from wiki.models import Article, URLPath, ArticleRevision
@@ -18,10 +20,52 @@ from wiki_api.serializers import (
     ArticleRevisionSerializer,
     NewRevisionSerializer,
 )
+from wiki_api.bulk import BULK_CHUNK_SIZE, BULK_MAX_ITEMS, create_bulk_articles
+from wiki_api.deltas import deltas_enabled, load_contents
+from wiki_api.diff import DIFF_CONTEXT, DIFF_OUTPUTS, MAX_DIFF_CONTEXT, format_unified, get_cached_diff
+from wiki_api.pagination import OptionalCursorPagination
+from wiki_api.rendering import get_render_cache_key, get_render_etag
+from wiki_api.revisions import RevisionConflict, create_revision, parse_if_match, revision_etag
+from wiki_api.views.mixins import ConditionalGetMixin, FieldSelectionMixin
 from wiki_api.types import CreateArticleBody, CreateArticleBodyPermission, CreateRevisionBody
 
 
+def revision_response(request, article: Article, response_status: int) -> Response:
+    """
+    Add the revision in the request body to `article` and respond with the article. An `If-Match` header naming a
+    revision other than the current one is answered with a 412 and the current revision
+    """
+    serialized_data: NewRevisionSerializer = NewRevisionSerializer(data=request.data)
+    if not serialized_data.is_valid():
+        return Response(serialized_data.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    validated_data: CreateRevisionBody = serialized_data.validated_data
+    try:
+        expected = parse_if_match(request.headers.get("If-Match"))
+    except ValueError:
+        return Response(
+            {"error": 'If-Match must be the ETag of the article or revision IDs such as "42"'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    try:
+        create_revision(article, validated_data, request, expected)
+    except RevisionConflict:
+        current_revision = Article.objects.filter(pk=article.pk).values_list("current_revision_id", flat=True).first()
+        return Response(
+            {
+                "error": "The article has a newer revision than the one in If-Match",
+                "current_revision": current_revision,
+            },
+            status=status.HTTP_412_PRECONDITION_FAILED,
+        )
+
+    return Response(ArticleSerializer(article, context={"request": request}).data, status=response_status)
+
+
 class ArticleViewSet(
+    FieldSelectionMixin,
+    ConditionalGetMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     mixins.CreateModelMixin,
@@ -31,12 +75,29 @@ class ArticleViewSet(
     queryset = Article.objects.order_by("current_revision__title", "modified").all()
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = ArticleSerializer
-    pagination_class = PageNumberPagination
+    pagination_class = OptionalCursorPagination
+    list_fields = ["id", "url", "current_revision"]
+    validator_aggregates = {
+        "last_modified": Max("modified"),
+        "revision": Max("current_revision_id"),
+        # Ownership can be handed over with a queryset update, which leaves `modified` alone
+        "owner": Max("owner_id"),
+        "group": Max("group_id"),
+        # Articles embed their attachments and the current revision of each
+        "attachments": Count("shared_plugins_set", distinct=True),
+        "attachment_revision": Max("shared_plugins_set__attachment__current_revision_id"),
+        "attachment_modified": Max("shared_plugins_set__attachment__current_revision__modified"),
+    }
+
+    def get_queryset(self):
+        # Only join/prefetch what the serializer is going to render for this action
+        return self.optimise_queryset(super().get_queryset())
 
-    def get_serializer(self, *args, **kwargs):
-        if "many" in kwargs and kwargs["many"] is True:
-            kwargs["fields"] = ["id", "url", "current_revision"]
-        return super().get_serializer(*args, **kwargs)
+    def get_etag(self, values: dict, digest: str) -> str:
+        # An article's ETag doubles as the If-Match of an edit based on it
+        if self.action == "retrieve":
+            return revision_etag(values["revision"], digest)
+        return super().get_etag(values, digest)
 
     def create(self, request, *args, **kwargs):
         serialized_data: NewArticleSerializer = NewArticleSerializer(data=request.data, context={"request": request})
@@ -91,38 +152,65 @@ class ArticleViewSet(
         return Response(new_article, status=status.HTTP_201_CREATED)
 
     def update(self, request, pk=None, *args, **kwargs):
-        article = get_object_or_404(Article, pk=pk)
-
-        serialized_data: NewRevisionSerializer = NewRevisionSerializer(data=request.data)
-        if not serialized_data.is_valid():
-            return Response(serialized_data.errors, status=status.HTTP_400_BAD_REQUEST)
+        return revision_response(request, self.get_object(), status.HTTP_200_OK)
 
-        validated_data: CreateRevisionBody = serialized_data.data
-
-        new_revision = ArticleRevision()
-        new_revision.article = article
-        new_revision.content = validated_data["content"].strip()
-        new_revision.title = validated_data.get("title", article.current_revision.title)
-        new_revision.user_message = validated_data.get("user_message")
-        new_revision.set_from_request(request)
+    @action(detail=False, methods=["POST"], name="Bulk create")
+    def bulk(self, request, *args, **kwargs):
+        if not isinstance(request.data, list):
+            return Response({"error": "Expected a list of articles"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(request.data) > BULK_MAX_ITEMS:
+            return Response(
+                {"error": f"Expected at most {BULK_MAX_ITEMS} articles per request"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        article.add_revision(new_revision)
+        results = create_bulk_articles(request.data, request, chunk_size=BULK_CHUNK_SIZE)
 
-        serialized_data = ArticleSerializer(article, context={"request": request}).data
-        return Response(serialized_data, status=status.HTTP_200_OK)
+        created = sum(1 for result in results if result["status"] == status.HTTP_201_CREATED)
+        if created == len(results):
+            response_status = status.HTTP_201_CREATED
+        elif created:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response({"results": results}, status=response_status)
 
     @action(detail=True, methods=["GET"], name="Get HTML")
     def html(self, request, pk=None, *args, **kwargs):
-        article = get_object_or_404(self.queryset, pk=pk)
-        serializer = ArticleHTMLSerializer(article, many=False, context={"request": request})
-        return Response(serializer.data)
+        # The revision content is only loaded if the render cache misses
+        article = get_object_or_404(
+            Article.objects.select_related("current_revision", "owner", "group").defer("current_revision__content"),
+            pk=pk,
+        )
+
+        cache_key = get_render_cache_key(article, request.user)
+        etag = get_render_etag(cache_key)
+        last_modified = int(article.modified.timestamp())
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            serializer = ArticleHTMLSerializer(
+                article, many=False, context={"request": request, "cache_key": cache_key}
+            )
+            response = Response(serializer.data)
+
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        return response
 
 
 class ArticleRevisionViewSet(
-    mixins.ListModelMixin, mixins.RetrieveModelMixin, mixins.CreateModelMixin, viewsets.GenericViewSet
+    FieldSelectionMixin,
+    ConditionalGetMixin,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.CreateModelMixin,
+    viewsets.GenericViewSet,
 ):
     serializer_class = ArticleRevisionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = OptionalCursorPagination
+    validator_aggregates = {"last_modified": Max("modified"), "revision": Max("id")}
 
     def get_queryset(self):
         queryset = ArticleRevision.objects.all()
@@ -130,23 +218,68 @@ class ArticleRevisionViewSet(
         if pk:
             queryset = queryset.filter(article_id=pk)
 
+        queryset = self.optimise_queryset(queryset)
+        if deltas_enabled():
+            # Compacted revisions are rebuilt together in `load_revision_contents` rather than one by one as loaded
+            queryset = queryset.defer("content")
         return queryset
 
+    def load_revision_contents(self, revisions):
+        fields = self.get_requested_fields()
+        if fields is None or "content" in fields:
+            load_contents(revisions)
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None:
+            self.load_revision_contents(page)
+        return page
+
+    def get_object(self):
+        revision = super().get_object()
+        self.load_revision_contents([revision])
+        return revision
+
     def create(self, request, articles_pk=None, *args):
-        current_article: Article = get_object_or_404(Article, pk=articles_pk)
+        article = get_object_or_404(ArticleSerializer.optimise_queryset(Article.objects.all()), pk=articles_pk)
+        return revision_response(request, article, status.HTTP_201_CREATED)
 
-        serialized_data: NewRevisionSerializer = NewRevisionSerializer(data=request.data)
-        if not serialized_data.is_valid():
-            return Response(serialized_data.errors, status=status.HTTP_400_BAD_REQUEST)
+    @action(detail=True, methods=["GET"], name="Diff")
+    def diff(self, request, articles_pk=None, pk=None):
+        """
+        The changes made by a revision, against its previous revision or the one named by `?against=`. `?output=`
+        picks structured `hunks` or a `unified` diff and `?context=` the number of unchanged lines around changes
+        """
+        output = request.query_params.get("output", "hunks")
+        if output not in DIFF_OUTPUTS:
+            return Response(
+                {"error": f"Unknown output '{output}'. Expected one of: {', '.join(DIFF_OUTPUTS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        validated_data: CreateRevisionBody = serialized_data.data
-        new_revision = ArticleRevision(
-            article_id=current_article.id,
-            content=validated_data["content"],
-            user=self.request.user,
-            user_message=validated_data.get("user_message", ""),
-        )
+        context = request.query_params.get("context", str(DIFF_CONTEXT))
+        if not context.isdigit() or int(context) > MAX_DIFF_CONTEXT:
+            return Response(
+                {"error": f"context must be a number of lines up to {MAX_DIFF_CONTEXT}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # Content is only loaded when the diff is not cached yet
+        revisions = ArticleRevision.objects.filter(article_id=articles_pk).defer("content")
+        revision = get_object_or_404(revisions, pk=pk)
+        against = request.query_params.get("against")
+        if against is None:
+            previous = revisions.filter(pk=revision.previous_revision_id).first()
+        elif against.isdigit():
+            previous = get_object_or_404(revisions, pk=against)
+        else:
+            return Response({"error": "against must be a revision ID"}, status=status.HTTP_400_BAD_REQUEST)
 
-        current_article.add_revision(new_revision)
-        article_data = ArticleSerializer(data=current_article, many=False, context={"request": request})
-        return Response(article_data.data, status=status.HTTP_201_CREATED)
+        hunks = get_cached_diff(previous, revision, int(context))
+        data = {"from": previous.id if previous else None, "to": revision.id}
+        if output == "unified":
+            old_name = f"revision {previous.revision_number}" if previous else "/dev/null"
+            data["diff"] = format_unified(hunks, old_name, f"revision {revision.revision_number}")
+        else:
+            data["hunks"] = hunks
+        return Response(data)
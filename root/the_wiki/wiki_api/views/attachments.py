@@ -1,20 +1,35 @@
-from django.http import FileResponse
+from django.db.models import Max
 from django.shortcuts import get_object_or_404
 from rest_framework import mixins, viewsets, permissions, status
 from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from wiki.plugins.attachments.models import Attachment, AttachmentRevision
 
+from wiki_api.downloads import download_response
+from wiki_api.pagination import OptionalCursorPagination
 from wiki_api.renderers import PassthroughRenderer
 from wiki_api.serializers import AttachmentSerializer, AttachmentRevisionSerializer
+from wiki_api.views.mixins import ConditionalGetMixin, FieldSelectionMixin
+
+
+# Files are sent as they are, but errors such as a failed permission check still need rendering
+DOWNLOAD_RENDERERS = [JSONRenderer, PassthroughRenderer]
 
 
 # TODO: Disable all attachment related functionality when app is not enabled
 
 
-class AttachmentViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+class AttachmentViewSet(
+    FieldSelectionMixin, ConditionalGetMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet
+):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = AttachmentSerializer
+    pagination_class = OptionalCursorPagination
+    validator_aggregates = {
+        "last_modified": Max("current_revision__modified"),
+        "revision": Max("current_revision_id"),
+    }
 
     def get_queryset(self):
         queryset = Attachment.objects.all()
@@ -22,26 +37,24 @@ class AttachmentViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, viewse
         if article_id:
             queryset = queryset.filter(article_id=article_id)
 
-        return queryset
+        return self.optimise_queryset(queryset)
 
-    @action(detail=True, methods=["GET"], name="Download", renderer_classes=[PassthroughRenderer])
+    @action(detail=True, methods=["GET"], name="Download", renderer_classes=DOWNLOAD_RENDERERS)
     def download(self, request, articles_pk=None, pk=None):
         attachment = get_object_or_404(Attachment, pk=pk)
         if not attachment.current_revision:
             return Response({"error": "Attachment has no current revision"}, status=status.HTTP_404_NOT_FOUND)
 
-        instance = attachment.current_revision.file
-
-        response = FileResponse(instance.open("rb"), content_type="application/octet-stream")
-        response["Content-Length"] = instance.size
-        response["Content-Disposition"] = f"attachment; filename={attachment.original_filename}"
+        return download_response(request, attachment.current_revision, attachment.original_filename)
 
-        return response
 
-
-class AttachmentRevisionViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+class AttachmentRevisionViewSet(
+    FieldSelectionMixin, ConditionalGetMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet
+):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = AttachmentRevisionSerializer
+    pagination_class = OptionalCursorPagination
+    validator_aggregates = {"last_modified": Max("modified"), "revision": Max("id")}
 
     def get_queryset(self):
         queryset = AttachmentRevision.objects.all()
@@ -49,17 +62,11 @@ class AttachmentRevisionViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin
         if attachment_id:
             queryset = queryset.filter(attachment_id=attachment_id)
 
-        return queryset
+        return self.optimise_queryset(queryset)
 
-    @action(detail=True, methods=["GET"], name="Download", renderer_classes=[PassthroughRenderer])
+    @action(detail=True, methods=["GET"], name="Download", renderer_classes=DOWNLOAD_RENDERERS)
     def download(self, request, articles_pk=None, attachments_pk=None, pk=None):
         attachment = get_object_or_404(Attachment, pk=attachments_pk)
         revision = get_object_or_404(AttachmentRevision, pk=pk)
 
-        instance = revision.file
-
-        response = FileResponse(instance.open("rb"), content_type="application/octet-stream")
-        response["Content-Length"] = instance.size
-        response["Content-Disposition"] = f"attachment; filename={attachment.original_filename}"
-
-        return response
+        return download_response(request, revision, attachment.original_filename)
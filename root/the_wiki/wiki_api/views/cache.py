@@ -0,0 +1,22 @@
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from the_wiki.caching import COUNTERS, get_cache_stats
+
+
+class CacheStatsView(APIView):
+    """
+    Hit and miss counts of the wiki page, article HTML and revision diff caches, for administrators. They add up
+    across workers when the cache is shared, each worker adding its counts in batches. DELETE resets them
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(get_cache_stats())
+
+    def delete(self, request):
+        for counter in COUNTERS.values():
+            counter.reset()
+        return Response(get_cache_stats())
@@ -0,0 +1,37 @@
+from django.contrib.sites.shortcuts import get_current_site
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from wiki_api.export import EXPORT_FORMATS, export_ndjson, export_tar
+from wiki_api.streaming import streaming_response
+
+
+class ExportView(APIView):
+    """
+    Stream every article the user can read, as NDJSON or a tar archive of markdown and attachments.
+
+    `?output=ndjson|tar` picks the format and `?revisions=true` adds the full revision history
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    exporters = {"ndjson": export_ndjson, "tar": export_tar}
+
+    def get(self, request):
+        output = request.query_params.get("output", "ndjson")
+        if output not in EXPORT_FORMATS:
+            return Response(
+                {"error": f"Unknown output '{output}'. Expected one of: {', '.join(EXPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        include_revisions = request.query_params.get("revisions", "false").lower() == "true"
+        content_type, extension = EXPORT_FORMATS[output]
+
+        response = streaming_response(
+            request,
+            self.exporters[output](get_current_site(request), request.user, include_revisions),
+            content_type=content_type,
+        )
+        response["Content-Disposition"] = f'attachment; filename="wiki-export.{extension}"'
+        return response
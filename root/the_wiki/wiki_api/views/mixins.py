@@ -0,0 +1,146 @@
+import hashlib
+import json
+from typing import List, Optional, Tuple
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, QuerySet
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.exceptions import ParseError
+
+
+class ConditionalGetMixin:
+    """
+    Answer list and detail GET requests with ETag/Last-Modified validators and return a 304 when they match the ones
+    sent by the client.
+
+    The validators come from a single aggregate query over the unpaginated queryset, so they are computed without
+    loading rows or running the serializer; keyset pages aggregate over the rows of the page instead.
+    `validator_aggregates` maps names to aggregate expressions that change whenever the rendered response would,
+    alongside a row count. The latest of the aggregates named `last_modified` or ending in `_modified` doubles as the
+    Last-Modified header.
+    """
+
+    validator_aggregates = {}
+
+    def get_validator_version(self):
+        """Any extra state the response depends on that the aggregates do not cover"""
+        return None
+
+    def get_etag(self, values: dict, digest: str) -> str:
+        """The (unquoted) ETag from the aggregated `values` and a digest of everything the response depends on"""
+        return digest
+
+    def get_validators(self, request, queryset: QuerySet, extra_state=None) -> Tuple[Optional[str], Optional[int]]:
+        # Aggregates over a to-many relation join several rows per object
+        values = queryset.order_by().aggregate(count=Count("pk", distinct=True), **self.validator_aggregates)
+        if not values["count"] and self.action != "list":
+            # Nothing to validate against, let the view respond with its 404
+            return None, None
+
+        modified = [value for name, value in values.items() if name.endswith("modified") and value]
+        last_modified = int(max(modified).timestamp()) if modified else None
+
+        # The same queryset renders differently per host (URLs are absolute), page, query parameters and negotiated
+        # format
+        state = [sorted(values.items()), self.get_validator_version(), request.build_absolute_uri(), extra_state]
+        state.append(request.META.get("HTTP_ACCEPT", ""))
+        etag = quote_etag(self.get_etag(values, hashlib.md5(json.dumps(state, default=str).encode()).hexdigest()))
+
+        return etag, last_modified
+
+    def conditional_response(self, request, queryset: QuerySet, view, *args, extra_state=None, **kwargs):
+        etag, last_modified = self.get_validators(request, queryset, extra_state)
+        if etag is None:
+            return view(request, *args, **kwargs)
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = view(request, *args, **kwargs)
+
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            if last_modified:
+                response["Last-Modified"] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        paginator = self.paginator
+        if paginator is not None and getattr(paginator, "use_cursor", lambda request: False)(request):
+            return self.keyset_list(request, queryset)
+        return self.conditional_response(request, queryset, super().list, *args, **kwargs)
+
+    def keyset_list(self, request, queryset: QuerySet):
+        """
+        A keyset page is fetched without scanning the table, so its validators must not scan it either. They are taken
+        over the rows of the page once it is fetched, which still saves serializing it when nothing has changed, along
+        with its links, so rows added after the last page give it a `next` link and a new ETag
+        """
+        page = self.paginate_queryset(queryset)
+        page_queryset = queryset.filter(pk__in=[obj.pk for obj in page])
+
+        def render(request):
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+        return self.conditional_response(request, page_queryset, render, extra_state=self.paginator.get_links())
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            queryset = self.filter_queryset(self.get_queryset()).filter(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            )
+        except (TypeError, ValueError, ValidationError):
+            return super().retrieve(request, *args, **kwargs)
+        return self.conditional_response(request, queryset, super().retrieve, *args, **kwargs)
+
+
+class FieldSelectionMixin:
+    """
+    Let clients choose the fields of a GET response with `?fields=id,url,owner` and the nested objects embedded in it
+    with `?expand=owner,current_revision`. Nested objects left out of `expand` are rendered as their ids; without
+    `expand` every one of them is embedded.
+
+    The same choice is passed to the serializer's `optimise_queryset`, so only the joins and prefetches for what is
+    rendered are made. `list_fields` are the fields of a list when `?fields=` is not given
+    """
+
+    list_fields: Optional[List[str]] = None
+    selection_actions = ("list", "retrieve")
+
+    def get_query_list(self, name: str) -> Optional[List[str]]:
+        if self.action not in self.selection_actions or name not in self.request.query_params:
+            return None
+        return [value.strip() for value in self.request.query_params[name].split(",") if value.strip()]
+
+    def get_requested_fields(self) -> Optional[List[str]]:
+        fields = self.get_query_list("fields")
+        if fields is None:
+            return self.list_fields if self.action == "list" else None
+
+        unknown = set(fields) - set(self.get_serializer_class()().fields)
+        if unknown:
+            raise ParseError(detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+        return fields
+
+    def get_requested_expand(self) -> Optional[List[str]]:
+        expand = self.get_query_list("expand")
+        if expand is None:
+            return None
+
+        unknown = set(expand) - set(self.get_serializer_class().expandable_fields())
+        if unknown:
+            raise ParseError(detail=f"Fields cannot be expanded: {', '.join(sorted(unknown))}")
+        return expand
+
+    def optimise_queryset(self, queryset: QuerySet) -> QuerySet:
+        return self.get_serializer_class().optimise_queryset(
+            queryset, self.get_requested_fields(), self.get_requested_expand()
+        )
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action in self.selection_actions:
+            kwargs.setdefault("fields", self.get_requested_fields())
+            kwargs.setdefault("expand", self.get_requested_expand())
+        return super().get_serializer(*args, **kwargs)
@@ -0,0 +1,32 @@
+from rest_framework import generics, permissions, status
+from rest_framework.response import Response
+
+from wiki_api.pagination import PageSizePagination
+from wiki_api.search import attach_paths, search
+from wiki_api.serializers import SearchResultSerializer
+
+
+class SearchView(generics.ListAPIView):
+    """
+    Full-text search over the current revision of every article the user can read, best matches first.
+
+    `?q=` is the query. Each result carries its rank, a snippet with the matches in bold and the article's wiki path
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = SearchResultSerializer
+    pagination_class = PageSizePagination
+
+    def get_queryset(self):
+        return search(self.request.query_params["q"], self.request.user)
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None:
+            attach_paths(page, self.request)
+        return page
+
+    def list(self, request, *args, **kwargs):
+        if not request.query_params.get("q", "").strip():
+            return Response({"error": "A search query is required"}, status=status.HTTP_400_BAD_REQUEST)
+        return super().list(request, *args, **kwargs)
@@ -0,0 +1,85 @@
+from rest_framework import mixins, viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from wiki_api.models import UploadSession
+from wiki_api.serializers import AttachmentRevisionSerializer, NewUploadSessionSerializer, UploadSessionSerializer
+from wiki_api.uploads import (
+    UploadConflict,
+    UploadError,
+    complete_upload,
+    create_spool_file,
+    delete_spool_file,
+    expire_sessions,
+    parse_content_range,
+    write_chunk,
+)
+
+
+class UploadSessionViewSet(
+    mixins.RetrieveModelMixin, mixins.ListModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet
+):
+    """
+    Resumable attachment uploads. A session is created with the size of the file, the file is sent in any number of
+    `PUT` requests each carrying a `Content-Range`, and `complete` turns it into a new attachment revision. After an
+    interruption, `GET` the session and carry on from its `offset`
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = UploadSessionSerializer
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(user=self.request.user).order_by("created")
+
+    def create(self, request, *args, **kwargs):
+        serialized_data = NewUploadSessionSerializer(data=request.data, context={"request": request})
+        if not serialized_data.is_valid():
+            return Response(serialized_data.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        validated_data = serialized_data.validated_data
+        if not validated_data["article"].can_write(request.user):
+            return Response(
+                {"error": "You do not have permission to add attachments to this article"},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        # Clear out abandoned uploads before adding another to the spool directory
+        expire_sessions()
+        session = UploadSession.objects.create(user=request.user, **validated_data)
+        create_spool_file(session)
+        return Response(self.get_serializer(session).data, status=status.HTTP_201_CREATED)
+
+    def update(self, request, *args, **kwargs):
+        """Write one chunk. The body is copied to disk as it is read, the request is never parsed"""
+        session = self.get_object()
+        try:
+            first, length = parse_content_range(request.headers.get("Content-Range"), session)
+            if int(request.headers.get("Content-Length") or 0) != length:
+                raise UploadError("Content-Length does not match Content-Range")
+            written = write_chunk(session, request.stream, first, length)
+        except UploadConflict as e:
+            return Response({"error": str(e), "offset": session.offset}, status=status.HTTP_409_CONFLICT)
+        except UploadError as e:
+            return Response({"error": str(e), "offset": session.offset}, status=status.HTTP_400_BAD_REQUEST)
+
+        if written != length:
+            return Response(
+                {"error": "The chunk was cut short", "offset": session.offset}, status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(self.get_serializer(session).data)
+
+    def perform_destroy(self, instance):
+        delete_spool_file(instance)
+        instance.delete()
+
+    @action(detail=True, methods=["POST"], name="Complete")
+    def complete(self, request, pk=None):
+        session = self.get_object()
+        try:
+            revision = complete_upload(session, request)
+        except UploadError as e:
+            return Response({"error": str(e), "offset": session.offset}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(
+            AttachmentRevisionSerializer(revision, context={"request": request}).data, status=status.HTTP_201_CREATED
+        )
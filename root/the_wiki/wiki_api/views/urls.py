@@ -1,17 +1,109 @@
-from rest_framework import mixins, viewsets, permissions
+from django.contrib.sites.shortcuts import get_current_site
+from django.db.models import Max
+from rest_framework import mixins, viewsets, permissions, status
+from rest_framework.decorators import action
 from rest_framework.response import Response
 from wiki.models import URLPath
 
-from wiki_api.serializers import URLSerializer
+from wiki_api.models import TreeVersion
+from wiki_api.pagination import OptionalCursorPagination
+from wiki_api.serializers import URLSerializer, URLTreeSerializer
+from wiki_api.tree import (
+    ancestors_filter,
+    attach_tree_paths,
+    descendants_filter,
+    get_ancestors,
+    get_subtree,
+    nest,
+    path_index,
+)
+from wiki_api.views.mixins import ConditionalGetMixin, FieldSelectionMixin
 
 
-class URLViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+class URLViewSet(
+    FieldSelectionMixin, ConditionalGetMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet
+):
     permission_classes = [permissions.IsAuthenticated]
     queryset = URLPath.objects.all()
     serializer_class = URLSerializer
+    pagination_class = OptionalCursorPagination
+    list_fields = ["id", "url", "article", "slug", "level", "parent", "path"]
+    # Paths and parents are covered by the tree version, the nested article by its modified time
+    validator_aggregates = {"last_modified": Max("article__modified")}
+    tree_structures = ("flat", "nested")
+    selection_actions = ("list", "retrieve", "resolve")
 
-    def get_serializer(self, *args, **kwargs):
-        if "many" in kwargs and kwargs["many"] is True:
-            kwargs["fields"] = ["id", "url", "article", "slug", "level", "parent", "path"]
+    def get_validator_version(self):
+        return TreeVersion.current()
 
-        return super().get_serializer(*args, **kwargs)
+    def get_queryset(self):
+        return self.optimise_queryset(super().get_queryset())
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None:
+            # One query for the paths of the whole page instead of one per row
+            attach_tree_paths(page)
+        return page
+
+    def get_tree_queryset(self):
+        return URLTreeSerializer.optimise_queryset(URLPath.objects.order_by("tree_id", "lft"))
+
+    def tree_response(self, request, nodes, structure="flat"):
+        data = URLTreeSerializer(nodes, many=True, context=self.get_serializer_context()).data
+        return Response(nest(data) if structure == "nested" else data)
+
+    @action(detail=True, methods=["GET"], name="Descendants")
+    def descendants(self, request, pk=None):
+        node = self.get_object()
+
+        depth = request.query_params.get("depth")
+        if depth is not None and (not depth.isdigit() or int(depth) < 1):
+            return Response({"error": "depth must be a positive integer"}, status=status.HTTP_400_BAD_REQUEST)
+        depth = int(depth) if depth else None
+
+        structure = request.query_params.get("structure", "flat")
+        if structure not in self.tree_structures:
+            return Response(
+                {"error": f"Unknown structure '{structure}'. Expected one of: {', '.join(self.tree_structures)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        return self.conditional_response(
+            request,
+            URLPath.objects.filter(descendants_filter(node, depth)),
+            lambda request: self.tree_response(request, get_subtree(self.get_tree_queryset(), node, depth), structure),
+        )
+
+    @action(detail=True, methods=["GET"], name="Children")
+    def children(self, request, pk=None):
+        node = self.get_object()
+        return self.conditional_response(
+            request,
+            URLPath.objects.filter(descendants_filter(node, 1)),
+            lambda request: self.tree_response(request, get_subtree(self.get_tree_queryset(), node, 1)),
+        )
+
+    @action(detail=True, methods=["GET"], name="Ancestors")
+    def ancestors(self, request, pk=None):
+        node = self.get_object()
+        return self.conditional_response(
+            request,
+            URLPath.objects.filter(ancestors_filter(node)),
+            lambda request: self.tree_response(request, get_ancestors(self.get_tree_queryset(), node)),
+        )
+
+    @action(detail=False, methods=["GET"], name="Resolve")
+    def resolve(self, request):
+        path = request.query_params.get("path")
+        if path is None:
+            return Response({"error": "A path is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        resolved = path_index.resolve(get_current_site(request), path)
+        urlpath = self.get_queryset().filter(pk=resolved[0]).first() if resolved else None
+        if urlpath is None:
+            return Response({"error": f"No article at path '{path}'"}, status=status.HTTP_404_NOT_FOUND)
+
+        # The index already knows the path, so the serializer does not walk the ancestors for it
+        urlpath.tree_path = resolved[1]
+        return Response(self.get_serializer(urlpath).data)